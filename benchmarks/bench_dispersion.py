@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the `~msaviz.MSA` dispersion curves.
+
+Run from the top level of the repository (this uses the msaviz package in
+the repository, whether or not it has been installed):
+
+    $ python benchmarks/bench_dispersion.py
+
+This compares the evaluation rate (wavelengths per second) of the compiled
+dispersion curves used by `~msaviz.MSA` with that of the astropy model
+(for a grating) and the scipy interpolator (for the prism) which they
+replace, for a single wavelength (as in each step of the ODE solver) and
+for larger arrays.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+from astropy.modeling import models
+from scipy.interpolate import interp1d
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+                                   os.path.abspath(__file__))))
+
+from msaviz.calibration import load_calibration
+from msaviz.msa import PolynomialDispersion, TabulatedDispersion
+
+
+def best_time(func, repeat=3, number=1):
+    """
+    Return the best wall-clock time (in seconds) per call of `repeat` runs
+    of `number` calls.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            func()
+        times.append((time.time() - start) / number)
+    return min(times)
+
+
+def bench_curves(dispname, reference, kernel, sizes=(1, 1000, 1000000)):
+    """
+    Time a reference dispersion curve and its kernel over a range of array
+    sizes.
+    """
+    for n in sizes:
+        wavelengths = np.random.RandomState(0).uniform(0.6, 5.3, n)
+        number = max(1, 100000 // n)
+        for name, func in (("reference", reference), ("kernel", kernel)):
+            t = best_time(lambda: func(wavelengths), number=number)
+            print("{:>8} {:>10} {:>8d} {:>14.3e}".format(dispname, name, n,
+                                                         n / t))
+
+
+def bench_dispersion(dispname='g235m'):
+    """
+    Time the grating and prism dispersion curves.
+    """
+    print("{:>8} {:>10} {:>8} {:>14}".format("disp", "curve", "size",
+                                             "evals per s"))
+    
+    calibration = load_calibration()
+    coeffs = calibration.dispersion_coeffs(dispname)
+    model = models.Polynomial1D(len(coeffs) - 1)
+    model.parameters = coeffs
+    bench_curves(dispname, model, PolynomialDispersion(coeffs))
+    
+    try:
+        dwav, dlds = calibration.dispersion_table('prism')
+    except (IOError, OSError): #no prism calibration file
+        return
+    bench_curves('prism', interp1d(dwav, dlds, fill_value='extrapolate'),
+                 TabulatedDispersion(dwav, dlds))
+
+
+if __name__ == "__main__":
+    bench_dispersion()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the `~msaviz.MSA` wavelength solvers.
+
+Run from the top level of the repository (this uses the msaviz package in
+the repository, whether or not it has been installed):
+
+    $ python benchmarks/bench_msa.py
+
+For each solver (including 'traces', if a trace model has been built with
+``python -m msaviz.traces``), this times a full `MSA.__call__` for 
+increasing numbers of (randomly chosen) shutters. The time per shutter 
+should stay roughly constant from 10 to 10,000 shutters, i.e. the runtime
+should be linear in the number of shutters.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+                                   os.path.abspath(__file__))))
+
+from msaviz import MSA
+
+
+def random_shutters(n, seed=0):
+    """
+    Choose `n` random (0-based) shutter coordinates from the whole MSA.
+    """
+    rs = np.random.RandomState(seed)
+    return np.vstack((rs.randint(0, 4, n), rs.randint(0, 365, n),
+                      rs.randint(0, 171, n)))
+
+
+def best_time(func, repeat=3):
+    """
+    Return the best wall-clock time (in seconds) of `repeat` calls.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def bench_scaling(filtname='f170lp', dispname='g235m',
+                  sizes=(10, 100, 1000, 10000)):
+    """
+    Time each grating solver over a range of shutter counts.
+    """
+    print("Solver scaling for {}/{}".format(filtname, dispname))
+    print("{:>8} {:>8} {:>12} {:>16}".format("solver", "shutters",
+                                              "time (s)", "us per shutter"))
+    for solver in ('odeint', 'master', 'traces'):
+        try:
+            msa = MSA(filtname, dispname, solver=solver)
+        except ValueError: #no trace model has been built
+            continue
+        msa(random_shutters(10)) #warm up (e.g. tabulate master curves)
+        for n in sizes:
+            coords = random_shutters(n)
+            t = best_time(lambda: msa(coords))
+            print("{:>8} {:>8d} {:>12.4f} {:>16.2f}".format(solver, n, t,
+                                                            1e6 * t / n))
+
+
+if __name__ == "__main__":
+    bench_scaling()
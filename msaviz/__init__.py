@@ -7,11 +7,11 @@ Created on Tue Jan 24 13:55:41 2017
 from __future__ import absolute_import
 
 
-from .msa import (parse_msa_config, MSAConfig, wavelength_table, 
-                  check_wavelengths, MSA)
+from .msa import (parse_msa_config, parse_msa_status, MSAConfig, 
+                  wavelength_table, check_wavelengths, MSA)
 
-__all__ = ['run', 'MSAConfig', 'parse_msa_config', 'wavelength_table', 
-           'check_wavelengths', 'MSA']
+__all__ = ['run', 'MSAConfig', 'parse_msa_config', 'parse_msa_status',
+           'wavelength_table', 'check_wavelengths', 'MSA']
 
 def run():
     """Entry point for the MSA Visualization Tool script."""
@@ -5,8 +5,9 @@ Created on Tue May 16 12:37:06 2017
 @author: gkanarek
 """
 
+from copy import copy
 from os import path
-from threading import Thread
+import time
 
 home_dir = path.dirname(path.realpath(__file__))
 base_dir = path.realpath(path.join(home_dir, '..'))
@@ -30,6 +31,7 @@ from kivy.clock import Clock
 from .screens import InitScreen, SpectrumScreen, ShutterScreen
 from ..msa import MSAConfig
 from .widgets.popups import WaitPopup
+from .scheduler import Scheduler
 
 kv = """
 ScreenManager:
@@ -92,32 +94,87 @@ class WaveTool(App):
         if (self.filtname, self.gratname) not in self.filt_grating:
             return
         
-        self.waiting = WaitPopup(num_shutters=0,
-                                 current_shutter=0)
-        self.waiting.open()
+        if self.waiting is None: #one popup, however many requests
+            self.waiting = WaitPopup(num_shutters=0,
+                                     current_shutter=0)
+            self.waiting.open()
         
-        t = Thread(target=self.init_msa)
-        t.start()
+        #supersede (and cancel) anything which is still being calculated
+        self.scheduler.submit(self.init_msa, self.msa, self.filtname, 
+                              self.gratname, self.msa_file)
     
-    def init_msa(self):
-        msa = MSAConfig(self.filtname, self.gratname, self.msa_file)
-        Clock.schedule_once(lambda dt: self.proceed(msa), 0.1)
+    def init_msa(self, generation, cancel, msa, filtname, gratname, 
+                 msa_file):
+        start = time.time()
+        def progress(done, total):
+            #called (throttled) from this thread; show it on the UI thread
+            elapsed = time.time() - start
+            Clock.schedule_once(lambda dt: self.show_progress(generation, 
+                                                              done, total,
+                                                              elapsed))
+        
+        if msa is not None and (msa.fname, msa.dname) == (filtname, 
+                                                          gratname):
+            #just a new config file; update a copy (so the current one can
+            #still be displayed) and only calculate the changed shutters
+            msa = copy(msa)
+            msa.cancel = cancel
+            msa.progress = progress
+            msa.update_config(msa_file)
+        else:
+            #show a preview first, and refine it in the background
+            msa = MSAConfig(filtname, gratname, msa_file, compact=True, 
+                            preview=True, cancel=cancel, progress=progress)
+        if not msa.preview:
+            msa.raster #build the trace index here, not on the UI thread
+        msa.cancel = None #the UI thread may still calculate (lazily)
+        msa.progress = None
+        Clock.schedule_once(lambda dt: self.proceed(generation, msa), 0.1)
+    
+    def refine_msa(self, generation, cancel, preview):
+        #build the trace index of the preview on display, which the copy
+        #then shares; a selection made meanwhile waits for it
+        preview.build_raster(cancel)
+        msa = copy(preview)
+        msa.cancel = cancel
+        msa.refine()
+        msa.cancel = None
+        Clock.schedule_once(lambda dt: self.refined(generation, msa), 0)
     
-    def proceed(self, msa):
+    def show_progress(self, generation, done, total, elapsed):
+        if self.waiting and self.scheduler.current(generation):
+            self.waiting.update_progress(done, total, elapsed)
+    
+    def proceed(self, generation, msa):
         """
-        Dismiss the popup to unblock the app.
+        Dismiss the popup to unblock the app, unless the results have 
+        already been superseded.
         """
+        if not self.scheduler.current(generation):
+            return
         self.msa = msa
         
         if self.waiting:
             self.waiting.dismiss()
             self.waiting = None
         
+        if msa.preview:
+            self.scheduler.submit(self.refine_msa, msa)
+    
+    def refined(self, generation, msa):
+        """
+        Replace the preview with the refined results, unless another 
+        config has been loaded in the meantime.
+        """
+        if self.scheduler.current(generation):
+            self.msa = msa
+    
     
     def build(self):
         self.title = "MSA Spectral Visualization Tool"
         self.icon = path.join(base_dir, 'data', 'nirspec.png')
         self.fglist = ["{}/{}".format(f,g) for f,g in self.filt_grating]
+        self.scheduler = Scheduler() #calculates the MSAConfigs
         WaitPopup() #to pre-load animation
         import pdb, traceback, sys
         try:
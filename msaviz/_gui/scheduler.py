@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+A single-worker job scheduler for the GUI, in which each new job
+supersedes (and cancels) any earlier ones, so that only the result of the
+latest request is ever delivered.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+import traceback
+
+from ..msa import Cancelled
+
+
+class Scheduler(object):
+    """
+    Run jobs one at a time in a background thread, where only the latest
+    job matters.
+    
+    Each job is numbered with a generation counter. Submitting a job
+    drops any job still waiting to run, and sets the cancel event of the
+    running job, which the `~msaviz.MSAConfig` calculations check between
+    tasks (see `~msaviz.MSA.__call__`). A job should only deliver its
+    result (on the UI thread) if its generation is still `current`.
+    
+    Attributes
+    ----------
+    generation : int
+        The generation of the latest job.
+    """
+    
+    def __init__(self):
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._job = None
+        self._cancel = None
+        self._thread = None
+    
+    def submit(self, func, *args):
+        """
+        Schedule a job, superseding all earlier ones.
+        
+        Parameters
+        ----------
+        func : callable
+            The job, which is called in the worker thread as
+            ``func(generation, cancel, *args)``, where `cancel` is the
+            `threading.Event` which will be set once the job has been
+            superseded. If the job raises `~msaviz.msa.Cancelled`, it is
+            silently dropped.
+        args
+            Any other arguments for `func`.
+        
+        Returns
+        -------
+        generation : int
+            The generation of the new job.
+        """
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel.set()
+            self.generation += 1
+            self._cancel = threading.Event()
+            self._job = (self.generation, self._cancel, func, args)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._ready.notify()
+            return self.generation
+    
+    def current(self, generation):
+        """
+        Whether a job is the latest one, i.e. its result should be
+        delivered.
+        """
+        with self._lock:
+            return generation == self.generation
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._job is None:
+                    self._ready.wait()
+                generation, cancel, func, args = self._job
+                self._job = None
+            try:
+                func(generation, cancel, *args)
+            except Cancelled:
+                pass
+            except Exception:
+                traceback.print_exc() #keep the worker alive
@@ -7,12 +7,13 @@ Created on Wed Jan 25 12:40:32 2017
 from __future__ import absolute_import, division, print_function
 
 import os
+import numpy as np
 
 from kivy.lang import Builder
 from kivy.uix.screenmanager import Screen
 from kivy.properties import (ListProperty, DictProperty, StringProperty)
 
-from ...msa import parse_msa_config
+from ...msa import parse_msa_status, STATUS_FLAGS
 from ..widgets.popups import WarningPopup, MSAFilePopup, WorkDirPopup
 
 Builder.load_string("""
@@ -213,12 +214,11 @@ class InitScreen(Screen):
             return
         try:
             self.msa_file = self._msa_file
-            alls = parse_msa_config(self.msa_file, open_only=False)
-            tmp = [{}, {}, {}, {}]
-            for q,i,j in alls:
-                tmp[q][(i,j)] = alls[(q,i,j)]
-            self.all_shutters = tmp
-        except (OSError, EOFError):
+            status = parse_msa_status(self.msa_file).status
+            flags = STATUS_FLAGS[status].reshape(4, -1).tolist()
+            ij = list(zip(*np.indices(status.shape[1:]).reshape(2, -1).tolist()))
+            self.all_shutters = [dict(zip(ij, f)) for f in flags]
+        except (OSError, EOFError, ValueError):
             popup = WarningPopup(text="Error when parsing MSA config file!\nPlease verify file name and format!")
             popup.open()
             return
\ No newline at end of file
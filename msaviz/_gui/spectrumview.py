@@ -264,25 +264,15 @@ class SpectrumLayout(FloatLayout):
         self.nrs = self.msa._nrs
         
     def get_select_bounds(self, q, i, j):
-        top = 1 - q % 2
-        nrs1, nrs2 = self.nrs[:,top,170-j]
-        
-        fin1, = np.isfinite(nrs1).nonzero()
-        fin2, = np.isfinite(nrs2).nonzero()
-        
-        x1 = fin1[np.logical_and(nrs1[fin1] >= self.sci_min, 
-                                 nrs1[fin1] <= self.sci_max)]
-        x2 = fin2[np.logical_and(nrs2[fin2] >= self.sci_min, 
-                                 nrs2[fin2] <= self.sci_max)]
-        if x1.size < 1:
-            b1 = []
-        else:
-            b1 = [x1[0], j, x1[-1]+1, j+1]
-        if x2.size < 1:
-            b2 = []
-        else:
-            b2 = [x2[0], j, x2[-1]+1, j+1]
-        return [b1, b2]
+        #the wavelength arrays only hold one spectrum per row, so find this
+        #shutter's own trace
+        bounds = []
+        for span in self.msa.raster.span(q, i, j):
+            if span is None:
+                bounds.append([])
+            else:
+                bounds.append([span[0], j, span[1], j+1])
+        return bounds
     
     def on_selected(self, instance, value):
         #prune de-selected shutters
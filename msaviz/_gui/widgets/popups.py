@@ -260,6 +260,8 @@ Builder.load_string("""#:import os os
         ProgressBar:
             max: root.num_shutters
             value: root.current_shutter
+        Label:
+            text: root.eta
         Widget:
 """)
     
@@ -510,10 +512,23 @@ class WarningPopup(Popup):
 class WaitPopup(Popup):
     current_shutter = NumericProperty(0)
     num_shutters = NumericProperty(0)
+    eta = StringProperty('')
     
     def __init__(self, **kw):
         super(WaitPopup, self).__init__(**kw)
         Clock.schedule_once(self.set_height, 0.1)
     
     def set_height(self, dt):
-        self.ids.prism.height = 0.5 * self.ids.prism.width
\ No newline at end of file
+        self.ids.prism.height = 0.5 * self.ids.prism.width
+    
+    def update_progress(self, done, total, elapsed):
+        """
+        Show the progress of a calculation, with an estimate of the time
+        remaining (assuming the rest goes as fast as it has so far).
+        """
+        self.num_shutters = total
+        self.current_shutter = done
+        self.eta = "{} of {} shutters".format(done, total)
+        if 0 < done < total:
+            left = elapsed * (total - done) / done
+            self.eta += ", about {:.0f} s left".format(left)
\ No newline at end of file
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+A command-line tool to write wavelength tables (and, optionally, target
+wavelength flag tables) for many MSA config files and filter + disperser
+combinations at once, without the GUI:
+
+    $ msaviz-batch configs/*.csv -c f170lp/g235m -c f290lp/g395m -w 1.8 2.2
+
+Each config file is parsed once and then run through every combination;
+the files are shared out over a pool of worker processes, each of which
+keeps its own cache of `~msaviz.MSA` models. Errors in one file (or one
+combination) are reported and skipped, and the tool exits with a non-zero
+status if there were any.
+
+The output files are named after the config file and combination, e.g.
+``msa_config1_f170lp_g235m_wave.txt`` and
+``msa_config1_f170lp_g235m_flags.txt``. Config files with the same name
+in different directories are told apart by their parent directories, e.g.
+``night1_msa_config1_f170lp_g235m_wave.txt``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+from .msa import MSAConfig
+from .calibration import load_calibration
+
+
+def expand_configs(patterns):
+    """
+    Expand a list of config file paths and glob patterns.
+    
+    Patterns which match nothing are kept as-is, so that the missing file
+    is reported as an error rather than silently skipped.
+    
+    Parameters
+    ----------
+    patterns : list of str
+        File paths and/or glob patterns.
+    
+    Returns
+    -------
+    configs : list of str
+        The matching file paths, in order and without duplicates.
+    """
+    configs = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path not in configs:
+                configs.append(path)
+    return configs
+
+
+def parse_combos(combos):
+    """
+    Parse filter/disperser combination strings.
+    
+    Parameters
+    ----------
+    combos : list of str
+        Strings of the form "filter/disperser", or "all" for every
+        combination in the calibration data.
+    
+    Returns
+    -------
+    combos : list of tuple
+        A list of (filter, disperser) pairs.
+    """
+    if 'all' in combos:
+        return list(load_calibration().combos())
+    pairs = []
+    for combo in combos:
+        pair = tuple(combo.lower().split('/'))
+        if len(pair) != 2 or not all(pair):
+            raise ValueError("Invalid combination {!r}; expected "
+                             "'filter/disperser'".format(combo))
+        pairs.append(pair)
+    return pairs
+
+
+def output_names(configs):
+    """
+    Choose the output file name prefix for each config file.
+    
+    The prefix is the name of the config file without its extension, and
+    for config files with the same name, as many of their parent directory
+    names as are needed to tell them apart, e.g. "night1_msa_config1".
+    
+    Parameters
+    ----------
+    configs : list of str
+        The paths to the MSA config files.
+    
+    Returns
+    -------
+    names : list of str
+        The prefix for each config file, in the same order.
+    
+    Raises
+    ------
+    ValueError
+        If two of the paths are the same file, so that their names can't
+        be told apart.
+    """
+    parts = [[part for part in
+              os.path.splitext(os.path.abspath(config))[0].split(os.sep)
+              if part] for config in configs]
+    depth = [1] * len(configs)
+    while True:
+        names = ["_".join(path[-n:]) for path, n in zip(parts, depth)]
+        clashes = [i for i, name in enumerate(names)
+                       if names.count(name) > 1]
+        if not clashes:
+            return names
+        #lengthen the shortest of each set of clashing names
+        shortest = {}
+        for i in clashes:
+            shortest[names[i]] = min(depth[i],
+                                     shortest.get(names[i], depth[i]))
+        grown = False
+        for i in clashes:
+            if depth[i] == shortest[names[i]] and depth[i] < len(parts[i]):
+                depth[i] += 1
+                grown = True
+        if not grown:
+            raise ValueError("The output tables of {} would overwrite each "
+                             "other".format(", ".join(configs[i]
+                                                      for i in clashes)))
+
+
+def process_config(task):
+    """
+    Write the output tables for one config file and every combination.
+    
+    Parameters
+    ----------
+    task : tuple
+        (config_file, name, combos, wavelengths, outdir, cache), where
+        name is the output file name prefix (see `output_names`) and the
+        rest are as described in `run_batch`.
+    
+    Returns
+    -------
+    results : list of tuple
+        A (config_file, combo, seconds, error) tuple for each combination
+        (or a single tuple with a combo of None if the file could not be
+        parsed), where error is None on success or else a message.
+    """
+    config_file, base, combos, wavelengths, outdir, cache = task
+    
+    start = time.time()
+    try:
+        msaconf = MSAConfig(config_file=config_file, cache=cache,
+                            lazy=True)
+    except Exception as err:
+        return [(config_file, None, time.time() - start,
+                 "{}: {}".format(type(err).__name__, err))]
+    
+    results = []
+    for filtname, dispname in combos:
+        start = time.time()
+        error = None
+        try:
+            msaconf.update_instrument(filtname, dispname)
+            prefix = os.path.join(outdir, "_".join([base, filtname,
+                                                    dispname]))
+            msaconf.write_wavelength_table(prefix + "_wave.txt")
+            if wavelengths:
+                flags = msaconf.verify_wavelength(wavelengths, verbose=False)
+                if flags is not None:
+                    flags.write(prefix + "_flags.txt",
+                                format='ascii.fixed_width_two_line')
+        except Exception as err:
+            error = "{}: {}".format(type(err).__name__, err)
+        results.append((config_file, "/".join([filtname, dispname]),
+                        time.time() - start, error))
+    return results
+
+
+def run_batch(configs, combos, wavelengths=None, outdir=".", jobs=None,
+              cache=None, stream=sys.stdout):
+    """
+    Process config files over a pool of worker processes.
+    
+    Parameters
+    ----------
+    configs : list of str
+        The paths to the MSA config files.
+    combos : list of tuple
+        The (filter, disperser) pairs to run for each config file.
+    wavelengths : list of float, optional
+        Target wavelengths (in microns); if given, a flag table is written
+        as well, as by `~msaviz.check_wavelengths`.
+    outdir : str, optional
+        The directory in which to write the output tables.
+    jobs : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+        If 1, the files are processed in this process.
+    cache : str, optional
+        A result cache directory; see `~msaviz.resultcache.ResultCache`.
+    stream : file, optional
+        Where to report the timing (and any error) for each file and
+        combination, as the results arrive.
+    
+    Returns
+    -------
+    nerrors : int
+        The number of failed files and combinations.
+    
+    Raises
+    ------
+    ValueError
+        If the output tables of two config files would overwrite each
+        other; see `output_names`.
+    """
+    tasks = [(config, name, combos, wavelengths, outdir, cache)
+                 for config, name in zip(configs, output_names(configs))]
+    jobs = min(jobs or multiprocessing.cpu_count(), len(tasks)) or 1
+    
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(process_config, tasks)
+    else:
+        results = (process_config(task) for task in tasks)
+    
+    nerrors = 0
+    start = time.time()
+    try:
+        for file_results in results:
+            for config_file, combo, seconds, error in file_results:
+                status = "ok" if error is None else "FAILED ({})".format(error)
+                print("{} {} {:.2f}s {}".format(config_file, combo or "-",
+                                                seconds, status), file=stream)
+                nerrors += error is not None
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    
+    print("Processed {} file(s) x {} combination(s) in {:.2f}s with {} "
+          "error(s)".format(len(configs), len(combos), time.time() - start,
+                            nerrors), file=stream)
+    return nerrors
+
+
+def main(argv=None):
+    """Entry point for the msaviz-batch script."""
+    parser = argparse.ArgumentParser(prog='msaviz-batch',
+                                     description="Write wavelength tables "
+                                     "for MSA config files.")
+    parser.add_argument('configs', nargs='+',
+                        help="MSA config files (or glob patterns)")
+    parser.add_argument('-c', '--combo', action='append', required=True,
+                        help="a filter/disperser combination, e.g. "
+                        "f170lp/g235m, or 'all'; may be repeated")
+    parser.add_argument('-w', '--wavelengths', nargs='+', type=float,
+                        metavar='MICRON',
+                        help="target wavelengths to check for each shutter")
+    parser.add_argument('-o', '--outdir', default='.',
+                        help="output directory (default: current)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument('--cache', default=None,
+                        help="result cache directory")
+    args = parser.parse_args(argv)
+    
+    try:
+        combos = parse_combos(args.combo)
+    except ValueError as err:
+        parser.error(str(err))
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+    
+    configs = expand_configs(args.configs)
+    try:
+        output_names(configs)
+    except ValueError as err:
+        parser.error(str(err))
+    
+    nerrors = run_batch(configs, combos, wavelengths=args.wavelengths,
+                        outdir=args.outdir, jobs=args.jobs, cache=args.cache)
+    return 1 if nerrors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
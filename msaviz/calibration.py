@@ -0,0 +1,579 @@
+# -*- coding: utf-8 -*-
+"""
+This module provides access to the calibration data used by `~msaviz.MSA`:
+the science wavelength range for each filter + disperser, the polynomial
+initial-condition (IC) models for each MSA quadrant (and the ICs they give
+for every shutter), the dispersion curve for each disperser, and the 
+lookup-table of prism ICs.
+
+The source data are spread over several JSON and FITS files, which take
+some time to parse (and, for the gratings, a polynomial fit to the
+dispersion curve). For quick startup, they can instead be precompiled into
+a single versioned binary calibration bundle with `build_bundle`:
+
+    $ python -m msaviz.calibration
+
+The bundle holds all of the calibration data as fixed-dtype arrays, which
+are memory-mapped at runtime (so that processes sharing the bundle also
+share its pages). Whenever the bundle is present, `load_calibration` uses
+it; otherwise, it falls back to the source files.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+#Use namedtuple to define the container for each quadrant of each reference
+#file, in a format which is very easily serializable to JSON.
+QuadrantModel = namedtuple('QuadrantBase', ['filter','grating','quadrant',
+                                           'type1', 'param1', 'pix1',
+                                           'type2', 'param2', 'pix2'])
+
+base_dir = os.path.dirname(os.path.realpath(__file__))
+
+edges_file = os.path.join(base_dir, 'data', 'edges.json')
+range_file = os.path.join(base_dir, 'data', 'ranges.json')
+prism_file = os.path.join(base_dir, 'data',
+                          'jwst_nirspec_prism_mos_wavelengths.fits')
+prism_lut_file = os.path.join(base_dir, 'data', 'jwst_nirspec_prism_lut.npy')
+disp_files = os.path.join(base_dir, 'data', 'jwst_nirspec_{}_disp.fits')
+bundle_file = os.path.join(base_dir, 'data', 'msaviz_calibration.bundle')
+
+#The prism ICs are stored (per detector) in these LUT columns.
+PRISM_FIELDS = [('PIX49{}', (2,)), ('WAV49{}', ()), ('PAR49{}', (4,))]
+
+#The calibration bundle layout: an 8-byte magic string, the format version
+#and the length of the JSON header (as little-endian uint32s), the header,
+#and then each array, aligned to BUNDLE_ALIGN bytes.
+BUNDLE_MAGIC = b'MSAVIZCB'
+BUNDLE_VERSION = 1
+BUNDLE_ALIGN = 64
+
+
+def read_prism_lut(filename=prism_file):
+    """
+    Read the prism initial-condition LUT into a dense array.
+    
+    The LUT file has one table HDU per quadrant, with a row for each
+    shutter which has been modeled. Here, those rows are scattered into
+    a single structured array indexed by the (0-based) shutter coordinates,
+    so that the initial conditions for any set of shutters can be looked
+    up with a single fancy-indexing operation.
+    
+    Parameters
+    ----------
+    filename : str, optional
+        The path to the prism LUT FITS file.
+    
+    Returns
+    -------
+    lut : array
+        A (4, 365, 171) structured array, with the PIX491, WAV491, PAR491,
+        PIX492, WAV492, and PAR492 fields of the LUT. Shutters which are
+        missing from the LUT are filled with NaN.
+    """
+    #astropy is only needed (and only imported) to read the source files,
+    #which keeps loading from the bundle quick
+    from astropy.table import Table
+    
+    dtype = [(name.format(n), float, shape) for n in (1, 2)
+                                           for name, shape in PRISM_FIELDS]
+    lut = np.empty((4, 365, 171), dtype=dtype)
+    for name in lut.dtype.names:
+        lut[name] = np.nan
+    
+    for q in range(4):
+        tab = Table.read(filename, q+1)
+        i = np.asarray(tab['I']) - 1
+        j = np.asarray(tab['J']) - 1
+        for name in lut.dtype.names:
+            lut[name][q, i, j] = tab[name]
+    
+    return lut
+
+def build_prism_lut(filename=prism_file, outfile=prism_lut_file):
+    """
+    Convert the prism LUT FITS file into a dense .npy file.
+    
+    This only needs to be run once (e.g. whenever the LUT is updated);
+    afterwards, `load_prism_lut` will memory-map the .npy file instead of
+    reading and scattering the FITS tables.
+    
+    Parameters
+    ----------
+    filename : str, optional
+        The path to the prism LUT FITS file.
+    outfile : str, optional
+        The path to which the dense LUT will be written.
+    """
+    np.save(outfile, read_prism_lut(filename))
+
+def load_prism_lut():
+    """
+    Load the dense prism LUT, as described in `read_prism_lut`.
+    
+    If the dense .npy version of the LUT has been built (see
+    `build_prism_lut`), it is memory-mapped, so that loading is nearly
+    instantaneous and only the shutters which are actually used are ever
+    read from disk. Otherwise, the LUT is read from the FITS file.
+    
+    Returns
+    -------
+    lut : array
+        A (4, 365, 171) structured array of prism initial conditions.
+    """
+    if os.path.exists(prism_lut_file):
+        return np.load(prism_lut_file, mmap_mode='r')
+    return read_prism_lut(prism_file)
+
+def read_dispersion(dispname):
+    """
+    Read the tabulated dispersion curve for a disperser.
+    
+    Parameters
+    ----------
+    dispname : str
+        The name of the disperser.
+    
+    Returns
+    -------
+    wavelength, dlds : array
+        The wavelengths, and the dispersion at each wavelength.
+    """
+    from astropy.io import fits
+    
+    dtable = fits.getdata(disp_files.format(dispname.lower()), 1)
+    return (np.array(dtable['WAVELENGTH'], dtype=float),
+            np.array(dtable['DLDS'], dtype=float))
+
+def fit_dispersion(dispname):
+    """
+    Fit the tabulated dispersion curve for a grating with a 6th-degree
+    polynomial.
+    
+    Parameters
+    ----------
+    dispname : str
+        The name of the grating.
+    
+    Returns
+    -------
+    coeffs : array
+        The 7 polynomial coefficients, in order of increasing degree.
+    """
+    from astropy.modeling import models, fitting
+    
+    dwav, dlds = read_dispersion(dispname)
+    fitter = fitting.LinearLSQFitter()
+    return np.array(fitter(models.Polynomial1D(6), dwav, dlds).parameters)
+
+def ic_surface(params):
+    """
+    Evaluate a quadrant's 2D polynomial IC model at every shutter.
+    
+    Parameters
+    ----------
+    params : list
+        The 6 parameters of the model, a 2nd-degree polynomial in the 
+        shutter row (x) and column (y), in the order of astropy's
+        `~astropy.modeling.models.Polynomial2D`: c0_0, c1_0, c2_0, c0_1,
+        c0_2, c1_1.
+    
+    Returns
+    -------
+    surface : array
+        A (365, 171) array of the wavelength IC of each shutter, indexed
+        by (0-based) column and row.
+    """
+    c00, c10, c20, c01, c02, c11 = params
+    i, j = np.mgrid[0:365, 0:171].astype(float)
+    return c00 + j * (c10 + j * c20 + i * c11) + i * (c01 + i * c02)
+
+def _dtype_from_descr(descr):
+    """
+    Rebuild a (possibly structured) dtype from a JSON-decoded descriptor,
+    as produced by `numpy.lib.format.dtype_to_descr`.
+    """
+    if not isinstance(descr, list):
+        return np.dtype(str(descr))
+    fields = []
+    for field in descr:
+        spec = [str(field[0]), _dtype_from_descr(field[1])]
+        if len(field) > 2:
+            spec.append(tuple(field[2]))
+        fields.append(tuple(spec))
+    return np.dtype(fields)
+
+def _align(n):
+    return -(-n // BUNDLE_ALIGN) * BUNDLE_ALIGN
+
+def write_bundle(filename, arrays, meta=None):
+    """
+    Write a set of arrays to a calibration bundle file.
+    
+    The file is written atomically (via a temporary file in the same
+    directory), so that processes which have the old bundle mapped are
+    not affected.
+    
+    Parameters
+    ----------
+    filename : str
+        The path of the bundle file.
+    arrays : dict
+        The arrays to include, keyed by name.
+    meta : dict, optional
+        Any additional (JSON-serializable) metadata.
+    """
+    layout = OrderedDict()
+    checksum = hashlib.sha1()
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        layout[name] = {'dtype': np.lib.format.dtype_to_descr(arr.dtype),
+                        'shape': list(arr.shape),
+                        'offset': offset}
+        checksum.update(name.encode('utf-8'))
+        checksum.update(arr.tobytes())
+        offset = _align(offset + arr.nbytes)
+    
+    header = json.dumps({'arrays': layout, 'meta': meta or {},
+                         'checksum': checksum.hexdigest()}).encode('utf-8')
+    preamble = BUNDLE_MAGIC + struct.pack('<II', BUNDLE_VERSION, len(header))
+    start = _align(len(preamble) + len(header))
+    
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(
+                                                       filename)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(preamble + header)
+            for name, arr in arrays.items():
+                f.seek(start + layout[name]['offset'])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        umask = os.umask(0) #mkstemp creates the file as owner-only
+        os.umask(umask)
+        os.chmod(tmpname, 0o666 & ~umask)
+        getattr(os, 'replace', os.rename)(tmpname, filename)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+
+
+class CalibrationBundle(object):
+    """
+    A read-only, memory-mapped view of a calibration bundle file.
+    
+    Parameters
+    ----------
+    filename : str
+        The path to the bundle file.
+    
+    Attributes
+    ----------
+    filename : str
+        The path to the bundle file.
+    version : str
+        A string identifying both the bundle format and its contents,
+        which changes whenever the bundle is rebuilt with different data.
+    meta : dict
+        Any additional metadata stored in the bundle.
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            preamble = f.read(len(BUNDLE_MAGIC) + 8)
+            if preamble[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+                raise IOError("{} is not a calibration bundle".format(
+                              filename))
+            fmt, nheader = struct.unpack('<II', preamble[len(BUNDLE_MAGIC):])
+            if fmt != BUNDLE_VERSION:
+                raise IOError("{} has bundle format {}, but format {} is "
+                              "required; please rebuild it.".format(
+                              filename, fmt, BUNDLE_VERSION))
+            header = json.loads(f.read(nheader).decode('utf-8'))
+        
+        self._start = _align(len(preamble) + nheader)
+        self._layout = header['arrays']
+        self._arrays = {}
+        self.meta = header['meta']
+        self.version = "{}-{}".format(fmt, header['checksum'])
+    
+    def __contains__(self, name):
+        return name in self._layout
+    
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            spec = self._layout[name]
+            self._arrays[name] = np.memmap(self.filename, mode='r',
+                                           dtype=_dtype_from_descr(
+                                               spec['dtype']),
+                                           offset=self._start+spec['offset'],
+                                           shape=tuple(spec['shape']))
+        return self._arrays[name]
+    
+    def keys(self):
+        return list(self._layout)
+
+
+def build_bundle(outfile=bundle_file):
+    """
+    Precompile all of the calibration data into a single bundle file.
+    
+    This includes the science ranges, quadrant IC models, and IC surfaces
+    for every filter + disperser, the fitted polynomial coefficients for each
+    grating dispersion curve, the tabulated prism dispersion curve, and
+    (if it is available) the dense prism LUT.
+    
+    Parameters
+    ----------
+    outfile : str, optional
+        The path to which the bundle will be written. By default, this is
+        where `load_calibration` will look for it.
+    """
+    source = Calibration()
+    combos = source.combos()
+    arrays = OrderedDict()
+    
+    arrays['ranges'] = np.array([source.science_range(*fg) for fg in combos])
+    
+    #Quadrant IC models; missing detectors get NaN params and pixel -1.
+    params = np.full((len(combos), 4, 2, 6), np.nan, dtype=float)
+    pixels = np.full((len(combos), 4, 2), -1, dtype=np.int16)
+    types = []
+    for g, fg in enumerate(combos):
+        if fg[1] == "prism": #the prism uses its LUT instead
+            types.append(None)
+            continue
+        quads = source.quadrants(*fg)
+        types.append([[quads[q].type1, quads[q].type2] for q in range(4)])
+        for q in range(4):
+            for n, (pix0, par) in enumerate([(quads[q].pix1, quads[q].param1),
+                                             (quads[q].pix2, quads[q].param2)]):
+                if pix0 is not None:
+                    params[g, q, n] = par
+                    pixels[g, q, n] = pix0
+    arrays['ic_params'] = params
+    arrays['ic_pixels'] = pixels
+    for fg in combos:
+        if fg[1] != "prism":
+            arrays['ic_surfaces/'+"/".join(fg)] = source.ic_surfaces(*fg)
+    
+    for dispname in sorted(set(d for f, d in combos)):
+        if dispname == "prism":
+            arrays['dispersion/prism'] = np.vstack(read_dispersion(dispname))
+        else:
+            arrays['dispersion/'+dispname] = fit_dispersion(dispname)
+    
+    if os.path.exists(prism_lut_file) or os.path.exists(prism_file):
+        arrays['prism_lut'] = load_prism_lut()
+    
+    write_bundle(outfile, arrays, meta={'combos': ["/".join(fg)
+                                                   for fg in combos],
+                                        'ic_types': types})
+
+
+class Calibration(object):
+    """
+    Access to the calibration data, from a calibration bundle if one is
+    given, or else directly from the source files.
+    
+    Parameters
+    ----------
+    bundle : `CalibrationBundle`, optional
+        The bundle from which to read the calibration data.
+    
+    Attributes
+    ----------
+    bundle : `CalibrationBundle` or None
+        The bundle in use, if any.
+    version : str
+        A string identifying the calibration data in use.
+    """
+    
+    def __init__(self, bundle=None):
+        self.bundle = bundle
+        self._edges = None
+        self._ranges = None
+        self._quadrants = {}
+        self._surfaces = {}
+        self._checksums = {}
+        self._combos = None
+        if bundle is not None:
+            self._combos = [tuple(fg.split("/"))
+                                for fg in bundle.meta['combos']]
+    
+    @property
+    def version(self):
+        if self.bundle is None:
+            return "source"
+        return self.bundle.version
+    
+    def source_checksum(self, filtname, dispname):
+        """
+        A checksum of the source files from which the calibration data
+        for a filter + disperser are derived (the IC models, science
+        ranges, dispersion curve and, for the prism, the IC LUT).
+        
+        This identifies the source data even when a bundle is in use, so
+        that products derived from them (such as trace models) can tell
+        when the source files have changed.
+        """
+        key = (filtname.lower(), dispname.lower())
+        if key not in self._checksums:
+            files = [edges_file, range_file, disp_files.format(key[1])]
+            if key[1] == "prism":
+                files.append(prism_file)
+            sha = hashlib.sha1()
+            for filename in files:
+                sha.update(os.path.basename(filename).encode())
+                if os.path.exists(filename):
+                    with open(filename, 'rb') as f:
+                        sha.update(f.read())
+            self._checksums[key] = sha.hexdigest()
+        return self._checksums[key]
+    
+    def _source_ranges(self):
+        if self._ranges is None:
+            with open(range_file) as f:
+                self._ranges = json.load(f)
+        return self._ranges
+    
+    def combos(self):
+        """
+        List the available (filter, disperser) combinations.
+        """
+        if self._combos is None:
+            self._combos = sorted(tuple(fg.split("/"))
+                                      for fg in self._source_ranges())
+        return self._combos
+    
+    def science_range(self, filtname, dispname):
+        """
+        The minimum and maximum wavelength of the filter transmission.
+        """
+        key = (filtname.lower(), dispname.lower())
+        if self.bundle is None:
+            return self._source_ranges()["/".join(key)]
+        return [float(x) for x in
+                self.bundle['ranges'][self.combos().index(key)]]
+    
+    def quadrants(self, filtname, dispname):
+        """
+        The IC models for each quadrant, as a dictionary of
+        `QuadrantModel` instances keyed by (0-based) quadrant.
+        """
+        key = (filtname.lower(), dispname.lower())
+        if key in self._quadrants:
+            return self._quadrants[key]
+        
+        quads = {}
+        if self.bundle is None:
+            if self._edges is None:
+                with open(edges_file) as f:
+                    self._edges = json.load(f)
+            for q, sca in self._edges["/".join(key)].items():
+                quads[int(q)] = QuadrantModel._make(sca)
+        else:
+            g = self.combos().index(key)
+            params = self.bundle['ic_params'][g]
+            pixels = self.bundle['ic_pixels'][g]
+            types = self.bundle.meta['ic_types'][g]
+            for q in range(4):
+                model = list(key) + [q]
+                for n in (0, 1):
+                    if pixels[q, n] < 0:
+                        model += [types[q][n], None, None]
+                    else:
+                        model += [types[q][n], params[q, n].tolist(),
+                                  int(pixels[q, n])]
+                quads[q] = QuadrantModel._make(model)
+        self._quadrants[key] = quads
+        return quads
+    
+    def ic_surfaces(self, filtname, dispname):
+        """
+        The wavelength IC of every shutter on each detector, for a 
+        grating, as a (4, 2, 365, 171) array indexed by (0-based) 
+        quadrant, detector, column, and row. Detectors which a quadrant's
+        spectra don't reach are NaN. See `ic_surface`.
+        """
+        key = (filtname.lower(), dispname.lower())
+        name = 'ic_surfaces/' + "/".join(key)
+        if self.bundle is not None and name in self.bundle:
+            return self.bundle[name]
+        if key in self._surfaces:
+            return self._surfaces[key]
+        
+        surfaces = np.full((4, 2, 365, 171), np.nan, dtype=float)
+        for q, quad in self.quadrants(*key).items():
+            for n, (pix0, par) in enumerate([(quad.pix1, quad.param1),
+                                             (quad.pix2, quad.param2)]):
+                if pix0 is not None:
+                    surfaces[q, n] = ic_surface(par)
+        surfaces.setflags(write=False)
+        self._surfaces[key] = surfaces
+        return surfaces
+    
+    def dispersion_coeffs(self, dispname):
+        """
+        The polynomial coefficients of a grating's dispersion curve, in
+        order of increasing degree.
+        """
+        name = 'dispersion/' + dispname.lower()
+        if self.bundle is None or name not in self.bundle:
+            return fit_dispersion(dispname)
+        return np.array(self.bundle[name])
+    
+    def dispersion_table(self, dispname):
+        """
+        The tabulated (wavelength, dispersion) curve of a disperser.
+        """
+        name = 'dispersion/' + dispname.lower()
+        if self.bundle is None or name not in self.bundle:
+            return read_dispersion(dispname)
+        wav, dlds = self.bundle[name]
+        return np.array(wav), np.array(dlds)
+    
+    def prism_lut(self):
+        """
+        The dense prism LUT, as described in `read_prism_lut`.
+        """
+        if self.bundle is None or 'prism_lut' not in self.bundle:
+            return load_prism_lut()
+        return self.bundle['prism_lut']
+
+
+_calibration = None
+
+def load_calibration():
+    """
+    Retrieve the process-wide calibration data.
+    
+    The calibration bundle is used if it has been built (see
+    `build_bundle`); otherwise, the data are read from the source files
+    as they are needed.
+    
+    Returns
+    -------
+    calibration : `Calibration`
+        The calibration data.
+    """
+    global _calibration
+    if _calibration is None:
+        bundle = None
+        if os.path.exists(bundle_file):
+            bundle = CalibrationBundle(bundle_file)
+        _calibration = Calibration(bundle)
+    return _calibration
+
+
+if __name__ == "__main__":
+    build_bundle()
+    print("Wrote calibration bundle to {}".format(bundle_file))
@@ -22,50 +22,557 @@ the API for the msaviz package.
 
 from __future__ import absolute_import, division, print_function
 
-import json
-from collections import namedtuple
-import csv
-import os
+from collections import namedtuple, OrderedDict
+import atexit
+import hashlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
+import time
 
-from astropy.io import fits
-from astropy.table import Table, QTable, Row
 from scipy.integrate import odeint
-from astropy.modeling import models, fitting
-import astropy.units as u
-from scipy.interpolate import interp1d
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import numpy.polynomial.polynomial as P
 
-from .shuttercoord import ShutterCoord
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError: #Python 2, without the futures backport
+    ThreadPoolExecutor = None
 
-#Use namedtuple to define the container for each quadrant of each reference
-#file, in a format which is very easily serializable to JSON.
-QuadrantModel = namedtuple('QuadrantBase', ['filter','grating','quadrant',
-                                           'type1', 'param1', 'pix1', 
-                                           'type2', 'param2', 'pix2'])
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError: #Python < 3.8; process pools are unavailable
+    resource_tracker = shared_memory = None
 
-base_dir = os.path.dirname(os.path.realpath(__file__))
+from .raster import TraceRaster
+from .resultcache import ResultCache
+from .traces import load_trace_model
+from .calibration import QuadrantModel, load_calibration
 
-edges_file = os.path.join(base_dir, 'data', 'edges.json')
-range_file = os.path.join(base_dir, 'data', 'ranges.json')
-prism_file = os.path.join(base_dir, 'data', 
-                          'jwst_nirspec_prism_mos_wavelengths.fits')
-disp_files = os.path.join(base_dir, 'data', 'jwst_nirspec_{}_disp.fits')
+#astropy is only imported where its tables and units are needed, so that
+#importing this module (e.g. in each worker process) stays quick.
 
-with open(edges_file) as f:
-    edge_data = json.load(f)
+__all__ = ['MSA', 'MSAConfig', 'DetectorRows', 'MasterCurve', 
+           'PolynomialDispersion', 'TabulatedDispersion', 'Cancelled', 
+           'get_executor', 'parse_msa_status', 'parse_msa_config', 
+           'wavelength_table', 'check_wavelengths', 'MSAStatus', 
+           'ShutterChanges', 'CacheInfo', 'SOLVERS', 'STATUS_FLAGS',
+           'CLOSED', 'OPEN', 'STUCK_OPEN', 'INACTIVE', 'NEAR_EDGE_PIXELS',
+           'PREVIEW_STEP', 'PROGRESS_INTERVAL',
+           #defined in msaviz.calibration since the calibration bundle was
+           #added; re-exported here for backward compatibility
+           'QuadrantModel']
 
-quadrant_data = {}
-for fg, edge in edge_data.items():
-    f,g = fg.split("/")
-    filtgrat = {}
-    for q, sca in edge.items():
-        filtgrat[int(q)] = QuadrantModel._make(sca)
-    quadrant_data[(f,g)] = filtgrat
+#Available strategies for solving the dispersion ODE; see MSA for details.
+SOLVERS = ('traces', 'master', 'odeint')
 
-with open(range_file) as f:
-    range_data = json.load(f)
+#Shutter status codes, as stored in the arrays returned by parse_msa_status.
+CLOSED, OPEN, STUCK_OPEN, INACTIVE = range(4)
+
+#The config file flag for each status code, and the inverse lookup table
+#(unrecognized flags are treated as closed).
+STATUS_FLAGS = np.array(['1', '0', 's', 'x'])
+_STATUS_LUT = np.full(256, CLOSED, dtype=np.uint8)
+for _code, _flag in enumerate(STATUS_FLAGS):
+    _STATUS_LUT[ord(_flag)] = _code
+del _code, _flag
+
+#Shape of the shutter grid in an MSA config file (see parse_msa_config).
+_CSV_SHAPE = (730, 342)
+
+#Parsed MSA config file; see parse_msa_status.
+MSAStatus = namedtuple('MSAStatus', ['status', 'open', 'stuck'])
+
+#The shutters which let light through (open or stuck open) after a config
+#update but didn't before, and vice versa; see MSAConfig.update_config.
+ShutterChanges = namedtuple('ShutterChanges', ['opened', 'closed'])
+
+#Flags for where a target wavelength falls for a shutter; see
+#MSAConfig.verify_wavelength.
+RIGHT_OF_NRS2, LEFT_OF_NRS1, IN_GAP, ON_NRS1, ON_NRS2 = -2, -1, 0, 1, 2
+NEAR_NRS1_EDGE, NEAR_NRS2_EDGE = 3, 4
+
+#How close (in pixels) a target must be to the end of a spectrum to be
+#flagged as near the edge of the detector.
+NEAR_EDGE_PIXELS = 20
+
+#The pixel spacing of the coarse wavelength grid of a preview; see 
+#MSA.preview.
+PREVIEW_STEP = 32
+
+#The minimum time (in seconds) between progress reports; see 
+#MSA.__call__.
+PROGRESS_INTERVAL = 0.1
+
+#Shared worker pools for MSA.__call__; see get_executor.
+_executors = {}
+_executors_lock = threading.Lock()
+
+#Statistics for the MSA instance cache, in the style of functools.lru_cache.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class PolynomialDispersion(object):
+    """
+    A grating dispersion curve, evaluated directly from its polynomial 
+    coefficients.
+    
+    The ODE solvers evaluate the dispersion curve many thousands of times,
+    often for only a few wavelengths at once, so this avoids the per-call
+    overhead of an astropy model. The arithmetic is the same as that of
+    `~astropy.modeling.models.Polynomial1D`, so the results are identical.
+    
+    Parameters
+    ----------
+    coeffs : array-like
+        The polynomial coefficients, in increasing order of degree.
+    
+    Attributes
+    ----------
+    coeffs : tuple
+        The polynomial coefficients.
+    deriv : tuple
+        The coefficients of the derivative of the polynomial.
+    """
+    
+    def __init__(self, coeffs):
+        self.coeffs = tuple(float(c) for c in coeffs)
+        self.deriv = tuple(float(c) for c in P.polyder(self.coeffs))
+    
+    @staticmethod
+    def _horner(x, coeffs):
+        result = coeffs[-1]
+        for c in coeffs[-2::-1]:
+            result = c + result * x
+        return result
+    
+    def __call__(self, wavelengths):
+        """
+        Evaluate the dispersion at the given wavelengths.
+        """
+        return self._horner(np.asarray(wavelengths, dtype=float), 
+                            self.coeffs)
+    
+    def derivative(self, wavelengths):
+        """
+        Evaluate the derivative of the dispersion at the given 
+        wavelengths.
+        """
+        return self._horner(np.asarray(wavelengths, dtype=float), 
+                            self.deriv)
+
+class TabulatedDispersion(object):
+    """
+    A tabulated (prism) dispersion curve, linearly interpolated between
+    the tabulated points, and extrapolated linearly beyond them.
+    
+    This reproduces `~scipy.interpolate.interp1d` (with linear 
+    extrapolation), but the tabulated wavelengths are (very nearly) 
+    uniformly spaced, so each wavelength's interval is found directly by
+    scaling (and a comparison with its ends) rather than by a search, and
+    the interpolation is a single multiply-add with a precomputed slope.
+    
+    Parameters
+    ----------
+    wavelengths : array-like
+        The (increasing) tabulated wavelengths.
+    dispersion : array-like
+        The dispersion at each wavelength.
+    
+    Attributes
+    ----------
+    wavelengths, dispersion : array
+        The tabulated curve.
+    
+    Notes
+    -----
+    The tabulated wavelengths are single-precision values, so they stray
+    from a uniform grid by up to ~1e-7 microns, and scaling can give the
+    neighboring interval for wavelengths that close to a tabulated point;
+    the interval is then moved by one to contain the wavelength.
+    """
+    
+    def __init__(self, wavelengths, dispersion):
+        self.wavelengths = np.asarray(wavelengths, dtype=float)
+        self.dispersion = np.asarray(dispersion, dtype=float)
+        self._origin = self.wavelengths[0]
+        self._scale = (self.wavelengths.size - 1) / (self.wavelengths[-1] - 
+                                                     self.wavelengths[0])
+        self._slope = np.diff(self.dispersion) / np.diff(self.wavelengths)
+    
+    def __call__(self, wavelengths):
+        """
+        Evaluate the dispersion at the given wavelengths.
+        """
+        wavelengths = np.asarray(wavelengths, dtype=float)
+        last = self._slope.size - 1
+        idx = ((wavelengths - self._origin) * self._scale).astype(np.intp)
+        idx = np.clip(idx, 0, last)
+        idx -= (wavelengths < self.wavelengths[idx]) & (idx > 0)
+        idx += (wavelengths >= self.wavelengths[idx + 1]) & (idx < last)
+        result = wavelengths - self.wavelengths[idx]
+        result *= self._slope[idx]
+        result += self.dispersion[idx]
+        return result
+
+class MasterCurve(object):
+    """
+    A dense, tabulated solution of the dispersion ODE.
+    
+    The dispersion curves depend only on wavelength, not on pixel, so the
+    ODE d(lambda)/d(pixel) = D(lambda) is autonomous: every solution is a
+    pixel-shifted copy of a single "master" solution. This class tabulates
+    that master solution once, over a range of wavelengths, so that any
+    individual solution can be recovered by inverting the master curve at
+    the initial condition and shifting.
+    
+    Parameters
+    ----------
+    dispersion : callable
+        The dispersion curve, as used by `~msaviz.MSA`.
+    lo, hi : float
+        The range of initial-condition wavelengths which the curve must
+        be able to invert.
+    margin : int or (int, int), optional
+        The number of extra pixels tabulated beyond either end of the
+        wavelength range, so that solutions can be followed across an
+        entire detector in either direction. A pair gives the margins
+        before and after the range separately.
+    oversample : int, optional
+        The number of grid points per pixel.
+    
+    Attributes
+    ----------
+    origin : int
+        The master pixel corresponding to the first grid point.
+    curve : array
+        The wavelength of the master solution on the grid. This is stored
+        phase-major, so ``curve[p, k]`` is the wavelength at master pixel
+        ``origin + k + p / oversample``.
+    slope : array
+        The dispersion at each grid point, in the same layout as `curve`.
+    
+    Notes
+    -----
+    Between grid points, the curve is evaluated with a first-order Taylor
+    expansion about the nearest grid point. With the default oversampling
+    this reproduces a tightly-converged ODEINT solution to ~1e-9 microns
+    for the gratings (~1e-7 microns for the piecewise-linear prism curve),
+    which is well inside ODEINT's default tolerance.
+    """
+    
+    def __init__(self, dispersion, lo, hi, margin=2048, oversample=32):
+        before, after = [int(m) for m in np.broadcast_to(margin, 2)]
+        self.dispersion = dispersion
+        self.oversample = oversample
+        self.origin = -before
+        
+        #estimate how many pixels it takes to get from lo to hi
+        lam = np.linspace(lo, hi, 1001)
+        disp = dispersion(lam)
+        if np.any(disp <= 0):
+            raise ValueError("The dispersion curve is not positive over "
+                             "[{}, {}].".format(lo, hi))
+        inv = 1. / disp
+        span = np.sum(0.5 * (inv[1:] + inv[:-1]) * np.diff(lam))
+        span = int(np.ceil(span)) + 1 #allow for the error in the estimate
+        
+        forward = np.arange((span + after) * oversample + 1, 
+                            dtype=float) / oversample
+        backward = -np.arange(before * oversample + 1, 
+                              dtype=float) / oversample
+        func = lambda y, x: dispersion(y)
+        fcurve = odeint(func, lo, forward, rtol=1e-10, atol=1e-12)
+        bcurve = odeint(func, lo, backward, rtol=1e-10, atol=1e-12)
+        curve = np.concatenate((bcurve[:0:-1, 0], fcurve[:, 0]))
+        
+        #Far outside the IC range, an extrapolated dispersion curve can
+        #reach zero, where the solution stalls; suppress any rounding 
+        #noise there so that the curve can always be inverted.
+        curve = np.maximum.accumulate(curve)
+        
+        npix = curve.size // oversample
+        curve = curve[:npix * oversample].reshape(npix, oversample)
+        self.curve = np.ascontiguousarray(curve.T)
+        self.slope = np.asarray(dispersion(self.curve), dtype=float)
+    
+    def _locate(self, pixels, width=1):
+        """
+        Find the nearest grid point (phase p, pixel k) to each of the given
+        master pixels, leaving room for `width` consecutive pixels, and 
+        the offset of each pixel from its grid point.
+        
+        Raises a `ValueError` if any (finite) pixel falls outside the
+        table; NaN pixels give NaN offsets.
+        """
+        finite = np.isfinite(pixels)
+        nodes = np.rint(np.where(finite, pixels - self.origin, 0.) * 
+                        self.oversample).astype(int)
+        k, p = np.divmod(nodes, self.oversample)
+        if np.any((k < 0) | (k > self.curve.shape[1] - width)):
+            raise ValueError("Master pixels outside of the tabulated range "
+                             "[{}, {}].".format(self.origin, self.origin + 
+                                                self.curve.shape[1] - width))
+        delta = pixels - (self.origin + k + p / self.oversample)
+        return p, k, delta
+    
+    def __call__(self, pixels):
+        """
+        Evaluate the master curve at the given (fractional) master pixels.
+        """
+        pixels = np.asarray(pixels, dtype=float)
+        p, k, delta = self._locate(pixels)
+        return self.curve[p, k] + delta * self.slope[p, k]
+    
+    def invert(self, wavelengths):
+        """
+        Find the (fractional) master pixels at which the master curve 
+        takes the given wavelengths.
+        """
+        grid = self.origin + np.arange(self.curve.shape[1], dtype=float)
+        pixels = np.interp(wavelengths, self.curve[0], grid)
+        for _ in range(2): #Newton refinement of the linear estimate
+            wav = self(pixels)
+            pixels -= (wav - wavelengths) / self.dispersion(wav)
+        return pixels
+    
+    def track(self, start, npix=2048):
+        """
+        Evaluate the master curve over `npix` consecutive pixels from each
+        of the given (fractional) starting master pixels.
+        
+        Since the pixels of each row share a grid phase, each row is a 
+        contiguous slice of the table, which makes this much faster than
+        evaluating the same pixels with `__call__`.
+        
+        Returns
+        -------
+        wavelengths : array
+            An Nx`npix` array of wavelengths.
+        """
+        start = np.atleast_1d(np.asarray(start, dtype=float))
+        p, k, delta = self._locate(start, npix)
+        
+        shape = (self.oversample, self.curve.shape[1] - npix + 1, npix)
+        strides = self.curve.strides + self.curve.strides[1:]
+        
+        wavelengths = as_strided(self.curve, shape, strides)[p, k]
+        correction = as_strided(self.slope, shape, strides)[p, k]
+        correction *= delta[:, None]
+        wavelengths += correction
+        return wavelengths
+    
+def get_executor(kind, workers=None):
+    """
+    Retrieve a shared pool of worker threads or processes, for use with
+    `~msaviz.MSA.__call__`.
+    
+    The pools are created when first needed, and kept for the life of the
+    process, so that their start-up cost (and, for worker processes, that
+    of setting up their own `~msaviz.MSA` instances) is only paid once.
+    
+    Parameters
+    ----------
+    kind : {'threads', 'processes'}
+        The kind of pool.
+    workers : int, optional
+        The number of workers; defaults to the number of CPUs.
+    
+    Returns
+    -------
+    pool : `multiprocessing.pool.Pool`
+        The pool.
+    """
+    if kind not in ('threads', 'processes'):
+        raise ValueError("Unknown executor '{}'; choose 'threads' or "
+                         "'processes'".format(kind))
+    with _executors_lock:
+        if (kind, workers) not in _executors:
+            pool = ThreadPool if kind == 'threads' else multiprocessing.Pool
+            _executors[kind, workers] = pool(workers)
+        return _executors[kind, workers]
+
+
+@atexit.register
+def _close_executors():
+    """
+    Shut down the shared pools at exit, while the modules they use to
+    clean up are still available.
+    """
+    with _executors_lock:
+        pools = list(_executors.values())
+        _executors.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+
+def _is_threaded(pool):
+    """
+    Whether a pool's workers are threads (rather than processes).
+    """
+    return isinstance(pool, ThreadPool) or (ThreadPoolExecutor is not None 
+                                            and isinstance(pool, 
+                                                           ThreadPoolExecutor))
+
+
+class Cancelled(Exception):
+    """
+    Raised when a calculation is abandoned because its ``cancel`` event
+    has been set; see `~msaviz.MSA.__call__`.
+    """
+
+
+def _checkpoint(cancel):
+    """
+    Abandon a calculation, by raising `Cancelled`, if its ``cancel`` 
+    event has been set.
+    """
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+class _ProgressCounter(object):
+    """
+    Count the work done in a calculation, and report it to a progress 
+    callback as a number of shutters, at most every `PROGRESS_INTERVAL`
+    seconds (and once all of the work is done).
+    
+    Parameters
+    ----------
+    callback : callable or None
+        Called as ``callback(done, total)``.
+    total : int
+        The number of shutters in the calculation.
+    work : int, optional
+        The amount of work in the calculation, in the units passed to 
+        `add`, if that isn't the number of shutters.
+    """
+    
+    def __init__(self, callback, total, work=None):
+        self.callback = callback
+        self.total = total
+        self.work = total if work is None else work
+        self.done = 0
+        self._last = None
+        self._lock = threading.Lock()
+    
+    def add(self, work):
+        """
+        Count some more work as done, and report it if it's time.
+        """
+        if self.callback is None:
+            return
+        with self._lock: #tasks may finish in several threads at once
+            self.done += work
+            now = time.time()
+            if (self.done < self.work and self._last is not None and 
+                    now - self._last < PROGRESS_INTERVAL):
+                return
+            self._last = now
+            done = self.total
+            if self.done < self.work:
+                done = self.total * self.done // self.work
+            self.callback(done, self.total)
+
+
+def _offset_progress(progress, start, total):
+    """
+    Wrap a progress callback for one part of a calculation, which starts
+    with the `start`-th of `total` shutters.
+    """
+    if progress is None:
+        return None
+    return lambda done, _: progress(start + done, total)
+
+
+def _tracker_pid():
+    """
+    The process ID of the resource tracker started by this process (or 
+    inherited from the parent of a forked process), if any.
+    """
+    return getattr(resource_tracker._resource_tracker, '_pid', None)
+
+
+def _solve_shared(task):
+    """
+    Solve one task of `~msaviz.MSA.__call__` in a worker process, writing
+    the results into the shared memory block of the output array.
+    """
+    filtname, dispname, solver, name, shape, tracker, n, q, idx, coords = task
+    shm = shared_memory.SharedMemory(name=name)
+    #The parent process owns (and will unlink) the block, but attaching 
+    #registers it with this process's resource tracker. Spawned workers,
+    #and those forked after the parent's tracker started, share that
+    #tracker, which the parent's unlink will notify; otherwise, the worker
+    #has started its own, which would unlink the block when it exits.
+    if _tracker_pid() not in (None, tracker):
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    try:
+        out = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        MSA.get(filtname, dispname, solver)._solve(out, n, q, idx, coords)
+        del out
+    finally:
+        shm.close()
+
+
+def parse_msa_status(filename):
+    """
+    Parse an MSA config file into arrays of shutter status codes.
+    
+    The whole file is read at once and converted to status codes with a
+    lookup table, then reshaped into native (quadrant, column, row) order
+    with pure array operations; no per-shutter Python objects are created.
+    
+    Parameters
+    ----------
+    filename : str
+        The path to the MSA config file
+        
+    Returns
+    -------
+    result : MSAStatus
+        A namedtuple with fields:
+            status : `~numpy.ndarray`
+                A (4, 365, 171) uint8 array of status codes (`CLOSED`,
+                `OPEN`, `STUCK_OPEN` or `INACTIVE`), indexed by the 
+                0-based quadrant, column and row of each shutter.
+            open : `~numpy.ndarray`
+                A (3, N) array of the (Q, I, J) coordinates of the N
+                open shutters, sorted by quadrant, column, then row.
+            stuck : `~numpy.ndarray`
+                A (3, M) array of the coordinates of the M stuck-open
+                shutters, in the same order.
+    
+    Raises
+    ------
+    ValueError
+        If the file does not contain exactly one status flag per shutter.
+    
+    Notes
+    -----
+    See `~msaviz.parse_msa_config` for the file format and the mapping
+    between CSV and native MSA coordinates. Unrecognized status flags are
+    treated as closed.
+    """
+    with open(filename, 'rb') as csvfile:
+        #the first row is a comment; splitlines handles any line endings
+        rows = csvfile.read().splitlines()[1:]
+    flags = b''.join(rows).translate(None, b', \t')
+    
+    flags = np.frombuffer(flags, dtype=np.uint8)
+    if flags.size != _CSV_SHAPE[0] * _CSV_SHAPE[1]:
+        raise ValueError("{} has {} shutter flags; expected {}".format(
+                         filename, flags.size, _CSV_SHAPE[0] * _CSV_SHAPE[1]))
+    
+    #CSV row x = 365 * (Q // 2) + I, CSV column y = 171 * (Q % 2) + J
+    status = _STATUS_LUT[flags].reshape(2, 365, 2, 171)
+    status = status.transpose(0, 2, 1, 3).reshape(4, 365, 171)
+    
+    return MSAStatus(status, np.array(np.nonzero(status == OPEN)),
+                     np.array(np.nonzero(status == STUCK_OPEN)))
 
-#The prism requires some special handling, and has its own dedicated file.
 
 def parse_msa_config(filename, open_only=True):
     """
@@ -111,6 +618,9 @@ def parse_msa_config(filename, open_only=True):
         - Q3 = col 000-364, row 000-170
         - Q4 = col 000-364, row 171-341
     
+    This is a compatibility wrapper around `~msaviz.parse_msa_status`,
+    which should be preferred when the dictionary is not needed.
+    
     Example
     -------
     
@@ -119,23 +629,17 @@ def parse_msa_config(filename, open_only=True):
     [(0, 34, 29)]
 
     """
+    parsed = parse_msa_status(filename)
     
-    shutters = []
-    
-    with open(filename) as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader) #the first row is a comment
-        for x, column in enumerate(reader):
-            for y, shutter in enumerate(column):
-                cc = ShutterCoord.from_xy(x, y)
-                shutters.append((cc.qij, shutter))
-                
     if open_only: #only keep the open  & stuck-open shutters, and convert
                   #status to a boolean (True for stuck-open)
-        return {qij: (status == 's') for (qij, status) in shutters \
-                    if status in '0s'}
+        result = dict.fromkeys(zip(*parsed.open.tolist()), False)
+        result.update(dict.fromkeys(zip(*parsed.stuck.tolist()), True))
+        return result
     
-    return dict(shutters)
+    qij = np.indices(parsed.status.shape).reshape(3, -1).tolist()
+    flags = STATUS_FLAGS[parsed.status].ravel().tolist()
+    return dict(zip(zip(*qij), flags))
 
 
 class MSA(object):
@@ -154,6 +658,16 @@ class MSA(object):
     dispname : str
         The name of the disperser, chosen from the list of NIRSpec
         dispersers; must be paired with the chosen filter.
+    solver : {'traces', 'master', 'odeint'}, optional
+        How to solve the dispersion ODE. With 'traces', the solutions are
+        evaluated from a precomputed `~msaviz.traces.TraceModel` of the
+        whole MSA. With 'master', a single `~msaviz.msa.MasterCurve` is
+        tabulated per detector, and every shutter's solution is found by
+        shifting it, so that all of the shutters are solved at once; with
+        'odeint', every call integrates the requested shutters directly
+        (one at a time, for the prism). By default, 'traces' is used if
+        an up-to-date trace model has been built for this filter and
+        disperser, and 'master' otherwise.
     
     Attributes
     ----------
@@ -161,6 +675,8 @@ class MSA(object):
         The name of the filter.
     disperser : str
         The name of the disperser.
+    solver : str
+        The solver in use.
     sci_range : list (float, float)
         The minimum and maximum wavelength of the filter transmission.
     dispersion : object
@@ -180,36 +696,149 @@ class MSA(object):
     correction (determined by comparison with the instrument model output)
     is applied to the solution.
     
+    Because the dispersion ODE is autonomous, the 'master' solver costs
+    roughly one integration per detector (on first use) plus an inverse
+    lookup per shutter, regardless of the number of shutters; its results
+    agree with 'odeint' to within ODEINT's own tolerance. The 'traces'
+    solver does no integration at all, and agrees with 'master' to within
+    the maximum error recorded in the trace model (see `~msaviz.traces`).
+    
     Examples
     --------
     >>> msa = MSA('f170lp', 'g235m')
     >>> msa([1, 150, 39])
+    
+    Since MSA objects are expensive to construct, but never change once 
+    they have been constructed, a process-wide cache of instances is 
+    available through `MSA.get`:
+    
+    >>> msa = MSA.get('f170lp', 'g235m')
+    >>> msa is MSA.get('F170LP', 'G235M')
+    True
     """
     
-    def __init__(self, filtname, dispname):
+    #The maximum number of shutters integrated together by ODEINT.
+    chunk_size = 1000
+    
+    #The process-wide instance cache (see MSA.get); one entry for each
+    #filter/disperser combination fits by default.
+    cache_size = 9
+    _cache = OrderedDict()
+    _cache_lock = threading.RLock()
+    _cache_hits = 0
+    _cache_misses = 0
+    
+    @classmethod
+    def get(cls, filtname, dispname, solver=None):
+        """
+        Retrieve a (possibly cached) MSA instance.
+        
+        Instances are kept in a thread-safe, least-recently-used cache of
+        at most `MSA.cache_size` entries, keyed by filter, disperser, and
+        solver, so that switching between instrument setups doesn't 
+        repeat the setup work (reading the calibration files, fitting the
+        dispersion curve, tabulating master curves, etc.).
+        
+        Parameters
+        ----------
+        filtname, dispname, solver
+            As for `~msaviz.MSA`.
+        
+        Returns
+        -------
+        msa : `~msaviz.MSA`
+            The MSA instance for this filter, disperser, and solver.
+        """
+        key = (filtname.lower(), dispname.lower(), solver)
+        with cls._cache_lock:
+            if key in cls._cache:
+                cls._cache_hits += 1
+                msa = cls._cache.pop(key) #re-insert as most recently used
+            else:
+                cls._cache_misses += 1
+                msa = cls(*key)
+            cls._cache[key] = msa
+            while len(cls._cache) > max(cls.cache_size, 0):
+                cls._cache.popitem(last=False)
+        return msa
+    
+    @classmethod
+    def evict(cls, filtname=None, dispname=None, solver=None):
+        """
+        Remove instances from the `MSA.get` cache.
+        
+        Parameters
+        ----------
+        filtname, dispname, solver : str, optional
+            Only remove instances matching these values; by default, the
+            entire cache is cleared.
+        
+        Returns
+        -------
+        evicted : int
+            The number of instances removed.
+        """
+        match = [None if x is None else x.lower() 
+                        for x in (filtname, dispname, solver)]
+        with cls._cache_lock:
+            keys = [key for key in cls._cache 
+                    if all(m is None or m == k for m, k in zip(match, key))]
+            for key in keys:
+                del cls._cache[key]
+        return len(keys)
+    
+    @classmethod
+    def cache_info(cls):
+        """
+        Report statistics for the `MSA.get` cache.
+        
+        Returns
+        -------
+        info : `CacheInfo`
+            A named tuple of (hits, misses, maxsize, currsize).
+        """
+        with cls._cache_lock:
+            return CacheInfo(cls._cache_hits, cls._cache_misses, 
+                             cls.cache_size, len(cls._cache))
+    
+    def __init__(self, filtname, dispname, solver=None):
+        if solver is not None and solver not in SOLVERS:
+            raise ValueError("Unknown solver '{}'; choose from {}".format(
+                             solver, SOLVERS))
         self.filter = filtname.lower()
         self.disperser = dispname.lower()
-        self.sci_range = range_data["{}/{}".format(self.filter, 
-                                                   self.disperser)]
-        
-        dtable = fits.getdata(disp_files.format(self.disperser),1)
-        dwav = dtable['WAVELENGTH']
-        dlds = dtable['DLDS']
+        self._masters = {}
+        
+        self._traces = None
+        if solver in (None, "traces"):
+            self._traces = load_trace_model(self.filter, self.disperser)
+            if self._traces is None and solver == "traces":
+                raise ValueError("No up-to-date trace model for {}/{}; "
+                                 "build one with msaviz.traces".format(
+                                 self.filter, self.disperser))
+            solver = "master" if self._traces is None else "traces"
+        self.solver = solver
+        
+        calibration = load_calibration()
+        self.sci_range = calibration.science_range(self.filter, 
+                                                   self.disperser)
         
         if self.disperser == "prism":
-            self._quadrants = []
-            for q in range(1,5):
-                tab = Table.read(prism_file, q)
-                tab.add_index('I')
-                tab.add_index('J')
-                self._quadrants.append(tab)
-            self.dispersion = interp1d(dwav, dlds, fill_value='extrapolate')
+            #The prism requires some special handling, and has its own
+            #dedicated LUT of initial conditions.
+            self._lut = calibration.prism_lut()
+            dwav, dlds = calibration.dispersion_table(self.disperser)
+            self.dispersion = TabulatedDispersion(dwav, dlds)
         else:
-            self._quadrants = quadrant_data[(self.filter, self.disperser)]
-            fitter = fitting.LinearLSQFitter()
-            self.dispersion = fitter(models.Polynomial1D(6), dwav, dlds)
+            self._quadrants = calibration.quadrants(self.filter, 
+                                                    self.disperser)
+            #The IC at every shutter, precomputed from the quadrant models
+            self._ic_surfaces = calibration.ic_surfaces(self.filter, 
+                                                        self.disperser)
+            coeffs = calibration.dispersion_coeffs(self.disperser)
+            self.dispersion = PolynomialDispersion(coeffs)
     
-    def __call__(self, coords):
+    def __call__(self, coords, executor=None, cancel=None, progress=None):
         """
         Determine the wavelengths for the given set of shutter 
         coordinates.
@@ -219,52 +848,448 @@ class MSA(object):
         coords : array-like
             A 3xN array of shutter coordinates, indicating the shutters
             for which wavelengths should be calculated.
+        executor : str or pool, optional
+            How to share out the work: None (the default) to solve 
+            everything in this thread; 'threads' or 'processes' for a 
+            shared pool of worker threads or processes (see 
+            `get_executor`); or any thread or process pool with a ``map``
+            method (e.g. a `multiprocessing.Pool` or a
+            `concurrent.futures.Executor`). Ignored for the 'traces'
+            solver.
+        cancel : `threading.Event`, optional
+            If given, this is checked before each task (and, with a 
+            process pool, as each task finishes); once it has been set, 
+            the calculation is abandoned by raising `Cancelled`.
+        progress : callable, optional
+            If given, this is called as ``progress(done, total)`` with 
+            the number of shutters solved so far, and in all, as the 
+            tasks finish; at most every `PROGRESS_INTERVAL` seconds, to
+            keep it off the hot path, but always at the end.
         
         Returns
         -------
         wavelengths : array
             A 2xNx2048 array of wavelengths on each detector for each
             shutter, over the entire 2048 pixels of that detector.
+        
+        Notes
+        -----
+        The work is split by detector, quadrant (for the gratings), and 
+        chunks of `chunk_size` shutters, which are exactly the sets of 
+        shutters that are solved together anyway, so the results are the
+        same (bit for bit) whichever executor is used. Each task writes 
+        its results directly into the output array, which is placed in 
+        shared memory for process pools.
         """
         coords = np.array(coords)
         if coords.ndim == 1: #enforce 3x1 for a single set of coordinates
             coords = coords[:, None] 
         
+        _checkpoint(cancel)
         ns = coords.shape[1]
+        if self.solver == "traces":
+            wavelengths = self._traces(coords)
+            _ProgressCounter(progress, ns).add(ns)
+            return wavelengths
+        
         #we'll leave 0s wherever the spectrum doesn't fall on the detector
-        wavelengths = np.zeros((2, ns, 2048), dtype=float)
+        shape = (2, ns, 2048)
+        tasks = [(n, q, idx, coords[:, idx]) 
+                     for n, q, idx in self._tasks(coords)]
+        #most shutters are solved for both detectors, in separate tasks
+        counter = _ProgressCounter(progress, ns, 
+                                   sum(task[2].size for task in tasks))
+        
+        if executor is None or len(tasks) < 2:
+            wavelengths = np.zeros(shape, dtype=float)
+            for task in tasks:
+                _checkpoint(cancel)
+                self._solve(wavelengths, *task)
+                counter.add(task[2].size)
+            return wavelengths
+        
+        pool = get_executor(executor) if isinstance(executor, str) \
+                   else executor
+        if _is_threaded(pool):
+            if self.solver == "master": #tabulate before sharing out
+                for n in set(task[0] for task in tasks):
+                    self._master_curve(n)
+            wavelengths = np.zeros(shape, dtype=float)
+            def solve(task):
+                _checkpoint(cancel)
+                self._solve(wavelengths, *task)
+                counter.add(task[2].size)
+            list(pool.map(solve, tasks))
+            return wavelengths
+        
+        if shared_memory is None:
+            raise ValueError("Process pools require Python 3.8 or later")
+        shm = shared_memory.SharedMemory(create=True, 
+                                         size=int(np.prod(shape)) * 8)
+        try:
+            out = np.ndarray(shape, dtype=float, buffer=shm.buf)
+            out[...] = 0.
+            header = (self.filter, self.disperser, self.solver, shm.name, 
+                      shape, _tracker_pid())
+            #the workers can't see the cancel event, so check it between
+            #results (Pool.imap yields them, in order, as they arrive)
+            results = getattr(pool, 'imap', pool.map)(_solve_shared, 
+                                                      [header + task 
+                                                       for task in tasks])
+            for task, _ in zip(tasks, results):
+                _checkpoint(cancel)
+                counter.add(task[2].size)
+            wavelengths = out.copy()
+            del out
+        finally:
+            shm.close()
+            shm.unlink()
+        return wavelengths
+    
+    def _tasks(self, coords):
+        """
+        Split the work of `__call__` into independent tasks.
         
+        Parameters
+        ----------
+        coords : array
+            A 3xN array of shutter coordinates.
+        
+        Yields
+        ------
+        n : int
+            The detector.
+        q : int or None
+            The quadrant, for the gratings.
+        idx : array
+            The indices of the shutters (into `coords`) to solve.
+        """
+        def chunks(idx):
+            for c in range(0, idx.size, self.chunk_size):
+                yield idx[c:c + self.chunk_size]
+        
+        if self.disperser == "prism":
+            for n in (0,1):
+                for idx in chunks(np.arange(coords.shape[1])):
+                    yield n, None, idx
+            return
+        
+        for q, quad in self._quadrants.items():
+            #which shutters are in this quadrant?
+            idx, = (coords[0] == q).nonzero()
+            for n, pix0 in enumerate([quad.pix1, quad.pix2]):
+                if pix0 is None or idx.size == 0: 
+                    continue #this detector isn't illuminated
+                for chunk in chunks(idx):
+                    yield n, q, chunk
+    
+    def _solve(self, out, n, q, idx, coords):
+        """
+        Solve one task from `_tasks`, writing the results into `out`.
+        
+        Parameters
+        ----------
+        out : array
+            The 2xNx2048 output array.
+        n, q, idx
+            As yielded by `_tasks`.
+        coords : array
+            The coordinates of the task's shutters, ``coords[:, idx]``.
+        """
         if self.disperser == "prism":
             #Unlike for the gratings, the prism is not integrated over 
-            #the same set of pixels for each shutter. Therefore, we need 
-            #to integrate each shutter individually.
+            #the same set of pixels for each shutter. Therefore, with 
+            #ODEINT we need to integrate each shutter individually; the
+            #master solver handles them all at once.
             
-            for idx,(q,c,r) in enumerate(coords.T):
-                for n in (0,1):
-                    wavelengths[n,idx] = self._prism_integrate(q,c,r,n)
+            ics = self._lut[coords[0], coords[1], coords[2]]
+            if self.solver == "master":
+                out[n, idx] = self._prism_master(n, ics)
+            else:
+                for i, ic in zip(idx, ics):
+                    out[n, i] = self._prism_integrate(ic, n)
+            return
+        
+        #For gratings, we only have two possible paths of integration: 
+        #left-to-right, and right-to-left. Using the magic of ODEINT, 
+        #we can integrate all of the shutters in each set of these
+        #simultaneously, then combine the results. Or, with the master
+        #solver, we can skip integrating them at all.
+        
+        quad = self._quadrants[q]
+        pix0 = [quad.pix1, quad.pix2][n]
+        wav0 = self._grating_ic(q, n, coords[1], coords[2])
+        if self.solver == "master":
+            waves = self._grating_master(n, pix0, wav0)
+        else:
+            waves = self._grating_integrate(pix0, wav0)
+        out[n, idx] = waves.T
+    
+    def limits(self, coords, executor=None, cancel=None, progress=None):
+        """
+        Determine the minimum and maximum wavelength on each detector for
+        the given set of shutter coordinates.
+        
+        This only evaluates the solutions at the ends of each spectrum
+        (pixels 0 and 2047 for the gratings, or the ends of the 
+        illuminated span for the prism), so it is much faster than 
+        `__call__`, and uses O(N) memory, with the 'master' and 'traces'
+        solvers. With 'odeint', the full solutions are calculated in 
+        chunks.
+        
+        Parameters
+        ----------
+        coords : array-like
+            A 3xN array of shutter coordinates.
+        executor : str or pool, optional
+            As for `__call__`; only used with 'odeint'.
+        cancel, progress : optional
+            As for `__call__`.
+        
+        Returns
+        -------
+        limits : array
+            A 2xNx2 array of the minimum and maximum wavelength on each
+            detector for each shutter. These are NaN if the spectrum 
+            doesn't fall on that detector, or there are no ICs for the 
+            shutter.
+        """
+        coords = np.array(coords)
+        if coords.ndim == 1:
+            coords = coords[:, None]
         
+        _checkpoint(cancel)
+        ns = coords.shape[1]
+        if self.solver == "traces":
+            limits = self._traces.limits(coords)
+            _ProgressCounter(progress, ns).add(ns)
+        elif self.solver == "master":
+            limits = np.empty((2, ns, 2), dtype=float)
+            counter = _ProgressCounter(progress, ns, 2 * ns)
+            for n in (0,1):
+                _checkpoint(cancel)
+                spans = self._trace_spans(n, coords)
+                limits[n] = self._trace_samples(n, coords, 
+                                                spans.astype(float))
+                limits[n, spans[:, 0] > spans[:, 1]] = np.nan
+                counter.add(ns)
         else:
-            #For gratings, we only have two possible paths of integration: 
-            #left-to-right, and right-to-left. Using the magic of ODEINT, 
-            #we can integrate all of the shutters in each set of these
-            #simultaneously, then combine the results.
+            limits = np.empty((2, ns, 2), dtype=float)
+            for c in range(0, ns, self.chunk_size):
+                chunk = slice(c, c + self.chunk_size)
+                waves = self(coords[:, chunk], executor=executor, 
+                             cancel=cancel, 
+                             progress=_offset_progress(progress, c, ns))
+                waves[waves == 0] = np.nan
+                limits[:, chunk, 0] = np.fmin.reduce(waves, axis=2)
+                limits[:, chunk, 1] = np.fmax.reduce(waves, axis=2)
+        
+        limits[limits == 0] = np.nan #the spectrum isn't on the detector
+        limits.sort(axis=2)
+        return limits
+    
+    @property
+    def approximate_preview(self):
+        """
+        Whether `preview` approximates the wavelengths, rather than just
+        calculating them as `__call__` does.
+        """
+        return self.solver == "odeint" and self.disperser == "prism"
+    
+    def preview(self, coords, step=PREVIEW_STEP, cancel=None, 
+                progress=None):
+        """
+        Quickly approximate the wavelengths for the given set of shutter 
+        coordinates, for display while `__call__` is run.
+        
+        With the 'odeint' solver, the prism spectra are integrated one 
+        shutter at a time, which is orders of magnitude slower than 
+        anything else. In that case, the master-curve solution for each 
+        shutter is instead only evaluated on a coarse grid of every 
+        `step`-th pixel (and the ends of its illuminated span), and then 
+        interpolated linearly to every pixel; this is accurate to a few
+        pixels at worst, at the blue end of the prism. Every other solver
+        is already about as fast as the interpolation, so otherwise this
+        is the same as `__call__`.
+        
+        Parameters
+        ----------
+        coords : array-like
+            A 3xN array of shutter coordinates.
+        step : int, optional
+            The spacing of the coarse pixel grid.
+        cancel, progress : optional
+            As for `__call__`.
+        
+        Returns
+        -------
+        wavelengths : array
+            A 2xNx2048 array of wavelengths, as for `__call__`.
+        """
+        coords = np.array(coords)
+        if coords.ndim == 1:
+            coords = coords[:, None]
+        
+        if not self.approximate_preview:
+            return self(coords, cancel=cancel, progress=progress)
+        
+        grid = np.unique(np.append(np.arange(0, 2048, step), 2047))
+        all_pix = np.arange(2048)
+        k = np.minimum(np.searchsorted(grid, all_pix, 'right'), 
+                       grid.size - 1) - 1 #the grid interval of each pixel
+        
+        ns = coords.shape[1]
+        wavelengths = np.empty((2, ns, 2048), dtype=float)
+        counter = _ProgressCounter(progress, ns, 2 * ns)
+        for n in (0,1):
+            _checkpoint(cancel)
+            #clip the grid to each span, so that the prism corrections 
+            #are never extrapolated
+            spans = self._trace_spans(n, coords)
+            samples = np.clip(grid, spans[:, :1], spans[:, 1:]).astype(float)
+            coarse = self._trace_samples(n, coords, samples)
             
-            for q, quad in self._quadrants.items():
-                if q not in coords[0]: #no shutters in this quadrant
-                    continue
-                #which shutters are in this quadrant?
-                idx, = (coords[0] == q).nonzero()
+            lo, hi = samples[:, k], samples[:, k+1]
+            frac = np.divide(all_pix - lo, hi - lo, out=np.zeros_like(lo),
+                             where=hi > lo)
+            waves = coarse[:, k+1] - coarse[:, k]
+            waves *= frac
+            waves += coarse[:, k]
+            waves[np.logical_or(all_pix < spans[:, :1], 
+                                all_pix > spans[:, 1:])] = 0.
+            wavelengths[n] = waves
+            counter.add(ns)
+        return wavelengths
+    
+    def pixels(self, coords, wavelengths, chunk_size=1000):
+        """
+        Find the (fractional) pixel at which each of the given wavelengths
+        falls on each detector, for each of the given shutters.
+        
+        This is the inverse of `__call__`: the master curve is inverted 
+        directly at each wavelength, so the cost is independent of the 
+        number of pixels, and shifted for each shutter. For the prism, 
+        whose solutions include a polynomial correction in pixel, this is
+        refined with Newton's method. The results agree with the
+        'traces' and 'odeint' solvers to within their own tolerances.
+        
+        Parameters
+        ----------
+        coords : array-like
+            A 3xN array of shutter coordinates.
+        wavelengths : array-like
+            The T wavelengths (in microns) to locate.
+        chunk_size : int, optional
+            The number of wavelengths to locate at once, to bound the 
+            memory used for large T.
+        
+        Returns
+        -------
+        pixels : array
+            A 2xNxT array of the pixel of each wavelength on each detector
+            for each shutter. This is NaN where the wavelength doesn't
+            fall on the detector (e.g. it falls in the gap), or there are
+            no ICs for the shutter.
+        """
+        coords = np.array(coords)
+        if coords.ndim == 1:
+            coords = coords[:, None]
+        wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+        
+        pixels = np.full((2, coords.shape[1], wavelengths.size), np.nan, 
+                         dtype=float)
+        for c in range(0, wavelengths.size, chunk_size):
+            chunk = slice(c, c + chunk_size)
+            for n in (0,1):
+                pixels[n, :, chunk] = self._pixels(n, coords, 
+                                                   wavelengths[chunk])
+        return pixels
+    
+    def _pixels(self, nrs, coords, wavelengths, max_iter=10, tol=1e-9):
+        """
+        Locate wavelengths on one detector; see `pixels`.
+        
+        Parameters
+        ----------
+        nrs : int
+            Which detector: NRS1 (0) or NRS2 (1).
+        coords : array
+            A 3xN array of shutter coordinates.
+        wavelengths : array
+            The T wavelengths to locate.
+        max_iter : int, optional
+            The maximum number of Newton iterations for the prism.
+        tol : float, optional
+            The convergence tolerance (in pixels) for the prism. Pixels
+            within this of the ends of the detector (or of the spectrum)
+            are clipped to them, rather than dropped as rounding errors.
+        
+        Returns
+        -------
+        pixels : array
+            An NxT array of pixels, as for `pixels`.
+        """
+        master = self._master_curve(nrs)
+        pixels = np.full((coords.shape[1], wavelengths.size), np.nan, 
+                         dtype=float)
+        
+        #the master curve only covers so many wavelengths
+        base = np.full(wavelengths.shape, np.nan, dtype=float)
+        cols, = np.logical_and(wavelengths >= master.curve[0, 0], 
+                               wavelengths <= master.curve[-1, -1]).nonzero()
+        base[cols] = master.invert(wavelengths[cols])
+        
+        if self.disperser == "prism":
+            pix, wav, par = self._prism_ics(self._lut[tuple(coords)], nrs)
+            ok, = np.isfinite(wav).nonzero()
+            start = master.invert(wav[ok]) - pix[ok, 0]
+            
+            #Solve master(start + p) + correction(p) = lambda by Newton's
+            #method, from the uncorrected solution; the derivative is
+            #the tabulated slope of the master curve, plus that of the
+            #correction.
+            par = par[ok]
+            pix_ok = base[cols] - start[:, None]
+            for _ in range(max_iter):
+                g, k, delta = master._locate(start[:, None] + pix_ok)
+                slope = master.slope[g, k]
+                resid = master.curve[g, k] - wavelengths[cols]
+                resid += delta * slope
                 
-                if quad.pix1 is not None: #include NRS1
-                    wavelengths[0, idx] = self._grating_integrate(
-                                           quad.pix1, quad.param1,
-                                           coords[1,idx], coords[2,idx]).T
+                #Horner, for the correction and its derivative at once
+                corr = np.zeros_like(pix_ok)
+                deriv = np.zeros_like(pix_ok)
+                for coeff in par.T[::-1]:
+                    deriv *= pix_ok
+                    deriv += corr
+                    corr *= pix_ok
+                    corr += coeff[:, None]
                 
-                if quad.pix2 is not None: #include NRS2
-                    wavelengths[1, idx] = self._grating_integrate(
-                                           quad.pix2, quad.param2,
-                                           coords[1,idx], coords[2,idx]).T
-        return wavelengths
+                resid += corr
+                deriv += slope
+                resid /= deriv
+                pix_ok -= resid
+                if np.max(np.abs(resid), initial=0.) < tol:
+                    break
+            
+            lo = np.maximum(pix[ok, :1], 0)
+            hi = np.minimum(pix[ok, 1:], 2047)
+            inside = np.logical_and(pix_ok >= lo - tol, pix_ok <= hi + tol)
+            pixels[np.ix_(ok, cols)] = np.where(inside, 
+                                                np.clip(pix_ok, lo, hi), 
+                                                np.nan)
+            return pixels
+        
+        for q, quad in self._quadrants.items():
+            idx, = (coords[0] == q).nonzero()
+            pix0 = [quad.pix1, quad.pix2][nrs]
+            if pix0 is None or idx.size == 0:
+                continue
+            ics = self._grating_ic(q, nrs, coords[1, idx], coords[2, idx])
+            pix_q = base - (master.invert(ics) - pix0)[:, None]
+            inside = np.logical_and(pix_q >= -tol, pix_q <= 2047 + tol)
+            pixels[idx] = np.where(inside, np.clip(pix_q, 0, 2047), np.nan)
+        return pixels
     
     def _integrate_func(self, y, x):
         """
@@ -275,120 +1300,441 @@ class MSA(object):
         
         Parameters
         ----------
-        y : float or array-like
-            The current wavelength.
-        x : float or array-like
-            The current pixel (not used, but passed by ODEINT).
+        y : float or array-like
+            The current wavelength.
+        x : float or array-like
+            The current pixel (not used, but passed by ODEINT).
+        
+        Returns
+        -------
+        dispersion : float or array-like
+            The dispersion at the given wavelength (and pixel), in the 
+            same format as y.
+        """
+        return self.dispersion(y)
+    
+    def _integrate_jac(self, y, x):
+        """
+        Determine the Jacobian of the (grating) integration function.
+        
+        Since each shutter's wavelength evolves independently of the
+        others, the Jacobian is diagonal; it is returned in the banded 
+        format ODEINT expects with ``ml = mu = 0``, so that LSODA never
+        has to estimate (or store) a dense NxN Jacobian.
+        
+        Parameters
+        ----------
+        y : array
+            The current wavelengths.
+        x : float
+            The current pixel (not used, but passed by ODEINT).
+        
+        Returns
+        -------
+        jac : array
+            A 1xN array of the derivative of the dispersion at each 
+            wavelength.
+        """
+        return self.dispersion.derivative(y)[None, :]
+        
+    def _prism_ics(self, ics, nrs):
+        """
+        Split the LUT records for a set of shutters into the pixel bounds,
+        wavelength IC, and correction coefficients for one detector.
+        """
+        return [ics[_+"49{}".format(nrs+1)] for _ in ['PIX','WAV','PAR']]
+    
+    def _prism_integrate(self, ic, nrs):
+        """
+        Solve for the wavelengths of the indicated shutter on one of the
+        detectors.
+        
+        To achieve this, we integrate over the prism dispersion curve, 
+        then apply a 3rd-order 1D polynomial correction.
+        
+        Parameters
+        ----------
+        ic : record
+            The prism LUT record for the shutter.
+        nrs : int
+            Which detector to solve for: NRS1 (0) or NRS2 (1).
+        
+        Returns
+        -------
+        wavelengths : array
+            A 2048-element array of the wavelength at each pixel.
+            Any pixel which is not illuminated by the spectrum is set 
+            to 0.
+        """
+        
+        pix, wav, par = self._prism_ics(ic, nrs)
+        
+        if ~np.isfinite(wav):
+            return None
+        
+        #Determine which pixels to integrate over
+        all_pix = np.arange(2048, dtype=float)
+        in_bounds = np.logical_and(all_pix >= pix[0], all_pix <= pix[1])
+        integrate_pixels = [pix[0]] + all_pix[in_bounds].tolist()
+        
+        #Actually integrate, and calculate the correction
+        base = odeint(self._integrate_func, wav, integrate_pixels)
+        correction = P.polyval(all_pix[in_bounds], par)
+        
+        #Construct and return the wavelengths array
+        wavelengths = np.zeros_like(all_pix)
+        wavelengths[in_bounds] = base[1:, 0] + correction
+        
+        return wavelengths
+    
+    def _prism_master(self, nrs, ics):
+        """
+        Solve for the wavelengths of a set of shutters on one of the 
+        detectors, all at once, by shifting the prism master curve and
+        applying each shutter's polynomial correction.
+        
+        Parameters
+        ----------
+        nrs : int
+            Which detector to solve for: NRS1 (0) or NRS2 (1).
+        ics : array
+            The prism LUT records for the shutters.
+        
+        Returns
+        -------
+        wavelengths : array
+            An Nx2048 array of the wavelength at each pixel for each 
+            shutter, as for `_prism_integrate`; shutters which are not in
+            the LUT are set to NaN.
+        """
+        pix, wav, par = self._prism_ics(ics, nrs)
+        
+        wavelengths = np.full((wav.size, 2048), np.nan, dtype=float)
+        ok, = np.isfinite(wav).nonzero()
+        if ok.size == 0:
+            return wavelengths
+        
+        pix, wav, par = pix[ok], wav[ok], par[ok]
+        all_pix = np.arange(2048, dtype=float)
+        
+        master = self._master_curve(nrs)
+        base = master.track(master.invert(wav) - pix[:, 0])
+        base += P.polyval(all_pix, par.T) #Horner, for all shutters at once
+        
+        base[np.logical_or(all_pix < pix[:, :1], all_pix > pix[:, 1:])] = 0.
+        wavelengths[ok] = base
+        
+        return wavelengths
+        
+    def _grating_integrate(self, pix0, wav0):
+        """
+        Solve for the wavelengths of the indicated shutters, using the
+        given ICs.
+        
+        To achieve this, we integrate over the grating dispersion curve.
+        
+        Parameters
+        ----------
+        pix0 : int
+            The starting pixel on the detector (either 0 or 2047).
+        wav0 : array
+            The wavelength IC of each shutter at the starting pixel, as
+            from `_grating_ic`.
+        
+        Returns
+        -------
+        wavelengths : array
+            A 2048xN array of the wavelength at each pixel for each
+            shutter. Any pixel which is not illuminated by the spectrum
+            is set to 0.
+        
+        Notes
+        -----
+        Large sets of shutters are integrated in chunks of `chunk_size`,
+        with an analytic banded Jacobian, so that the cost stays linear
+        in the number of shutters even if LSODA switches to stiff mode.
+        """
+        dx = [-1,1][pix0 == 0] #integration direction
+        pixels = np.arange(2048, dtype=float) #pixels at which to integrate
+        
+        wav0 = np.atleast_1d(wav0)
+        
+        #integrate
+        wavelengths = np.empty((2048, wav0.size), dtype=float)
+        for c in range(0, wav0.size, self.chunk_size):
+            chunk = slice(c, c + self.chunk_size)
+            wavelengths[:, chunk] = odeint(self._integrate_func, wav0[chunk],
+                                           pixels[::dx], 
+                                           Dfun=self._integrate_jac, 
+                                           ml=0, mu=0)
+        
+        return wavelengths[::dx] #go back to pixels 0->2047
+    
+    def _grating_master(self, nrs, pix0, wav0):
+        """
+        Solve for the wavelengths of the indicated shutters, using the
+        given ICs, by shifting the master curve for the detector.
+        
+        Parameters
+        ----------
+        nrs : int
+            Which detector to solve for: NRS1 (0) or NRS2 (1).
+        pix0, wav0
+            As for `_grating_integrate`.
+        
+        Returns
+        -------
+        wavelengths : array
+            A 2048xN array of the wavelength at each pixel for each
+            shutter, as for `_grating_integrate`.
+        """
+        master = self._master_curve(nrs)
+        start = master.invert(wav0) - pix0
+        return master.track(start).T
+    
+    def _master_curve(self, nrs):
+        """
+        Retrieve the master curve for a detector, tabulating it on first
+        use so that it covers the ICs of every shutter in the MSA.
+        
+        Parameters
+        ----------
+        nrs : int
+            Which detector: NRS1 (0) or NRS2 (1).
+        
+        Returns
+        -------
+        master : `~msaviz.msa.MasterCurve`
+            The master solution of the dispersion ODE for this detector.
+        """
+        if nrs not in self._masters:
+            margin = 2048
+            if self.disperser == "prism":
+                pix, ics, par = self._prism_ics(self._lut, nrs)
+                
+                #Each shutter starts tracking at its start pixel before 
+                #its IC, and must be followed over the whole detector, so
+                #the table has to reach the largest start pixel back, and
+                #2047 less the smallest (possibly negative) one forward.
+                pix0 = pix[np.isfinite(ics), 0]
+                margin = (max(margin, int(np.ceil(pix0.max())) + 1),
+                          max(margin, int(np.ceil(2047 - pix0.min())) + 2))
+            else:
+                ics = self._ic_surfaces[:, nrs]
+            self._masters[nrs] = MasterCurve(self.dispersion, np.nanmin(ics),
+                                             np.nanmax(ics), margin)
+        return self._masters[nrs]
+    
+    def _trace_spans(self, nrs, coords):
+        """
+        Find the range of pixels illuminated by each of the given shutters
+        on one detector, as used to build a `~msaviz.traces.TraceModel`.
+        
+        Parameters
+        ----------
+        nrs : int
+            Which detector: NRS1 (0) or NRS2 (1).
+        coords : array
+            A 3xN array of shutter coordinates.
         
         Returns
         -------
-        dispersion : float or array-like
-            The dispersion at the given wavelength (and pixel), in the 
-            same format as y.
+        spans : array
+            An Nx2 array of the first and last illuminated pixel. This is
+            the whole detector for the gratings, and for any shutter which
+            is not in the prism LUT. Prism spans are clipped to the 
+            detector; one which misses it altogether has its first pixel
+            after its last.
         """
-        return self.dispersion(y)
-        
-    def _prism_integrate(self, quadrant, i, j, nrs):
+        spans = np.zeros((coords.shape[1], 2), dtype=int)
+        spans[:, 1] = 2047
+        if self.disperser == "prism":
+            pix, wav, par = self._prism_ics(self._lut[tuple(coords)], nrs)
+            ok = np.isfinite(wav)
+            spans[ok, 0] = np.clip(np.ceil(pix[ok, 0]), 0, 2048)
+            spans[ok, 1] = np.clip(np.floor(pix[ok, 1]), -1, 2047)
+        return spans
+    
+    def _trace_samples(self, nrs, coords, pixels):
         """
-        Solve for the wavelengths of the indicated shutter on one of the
-        detectors.
-        
-        To achieve this, we integrate over the prism dispersion curve, 
-        then apply a 3rd-order 1D polynomial correction.
+        Evaluate the (master-curve) solution for each of the given
+        shutters on one detector at arbitrary, fractional pixels.
         
         Parameters
         ----------
-        quadrant : int
-            The (0-based) quadrant of the shutter.
-        i : int
-            The (0-based) column of the shutter in its quadrant.
-        j : int
-            The (0-based) row of the shutter in its quadrant.
         nrs : int
-            Which detector to solve for: NRS1 (0) or NRS2 (1).
+            Which detector: NRS1 (0) or NRS2 (1).
+        coords : array
+            A 3xN array of shutter coordinates.
+        pixels : array
+            An NxM array of the pixels at which to evaluate each shutter.
         
         Returns
         -------
         wavelengths : array
-            A 2048-element array of the wavelength at each pixel.
-            Any pixel which is not illuminated by the spectrum is set 
-            to 0.
+            An NxM array of wavelengths. Shutters whose spectra don't fall
+            on this detector are 0, and shutters without ICs are NaN;
+            unlike `__call__`, the prism spectra are not truncated to
+            their illuminated pixels.
         """
-        
-        #Grab the initial conditions from the LUT
-        data = self._quadrants[quadrant]
-        try:
-            d1 = data.loc['I', i+1]
-            if isinstance(d1, Row):
-                row = d1
-            else:
-                row = d1.loc['J', j+1]
-        except KeyError as key:
-            return None
-        pix, wav, par = [row[_+"49{}".format(nrs+1)] for _ in ['PIX','WAV','PAR']]
-        
-        if ~np.isfinite(wav):
-            return None
-        
-        #Determine which pixels to integrate over
-        all_pix = np.arange(2048, dtype=float)
-        in_bounds = np.logical_and(all_pix >= pix[0], all_pix <= pix[1])
-        integrate_pixels = [pix[0]] + all_pix[in_bounds].tolist()
-        
-        #Actually integrate, and calculate the correction
-        base, dinfo = odeint(self._integrate_func, wav, integrate_pixels, 
-                             full_output=True)
-        correction = models.Polynomial1D(degree=3, c0=par[0], c1=par[1], 
-                                         c2=par[2], c3=par[3])(all_pix[in_bounds])
-        
-        
-        #Construct and return the wavelengths array
-        try:
-            wavelengths = np.zeros_like(all_pix)
-            wavelengths[in_bounds] = base.squeeze()[1:] + correction
-        except IndexError:
-            import pdb; pdb.set_trace()
-        
+        master = self._master_curve(nrs)
+        if self.disperser == "prism":
+            pix, wav, par = self._prism_ics(self._lut[tuple(coords)], nrs)
+            wavelengths = np.full(pixels.shape, np.nan, dtype=float)
+            ok, = np.isfinite(wav).nonzero()
+            start = master.invert(wav[ok]) - pix[ok, 0]
+            correction = P.polyval(pixels[ok].T, par[ok].T, tensor=False).T
+            wavelengths[ok] = master(start[:, None] + pixels[ok]) + correction
+            return wavelengths
+        
+        wavelengths = np.zeros(pixels.shape, dtype=float)
+        for q, quad in self._quadrants.items():
+            idx, = (coords[0] == q).nonzero()
+            pix0 = [quad.pix1, quad.pix2][nrs]
+            if pix0 is None or idx.size == 0:
+                continue
+            ics = self._grating_ic(q, nrs, coords[1, idx], coords[2, idx])
+            start = master.invert(ics) - pix0
+            wavelengths[idx] = master(start[:, None] + pixels[idx])
         return wavelengths
-        
-    def _grating_integrate(self, pix0, params, i0, j0):
+    
+    def _grating_ic(self, q, nrs, i0, j0):
         """
-        Solve for the wavelengths of the indicated shutters, using the
-        given ICs.
-        
-        To achieve this, we integrate over the grating dispersion curve.
+        Look up the wavelength IC at the starting pixel for the given
+        shutters.
         
         Parameters
         ----------
-        pix0 : int
-            The starting pixel on the detector (either 0 or 2047).
-        params : list
-            The 2D polynomial model parameters for this filter, grating,
-            and MSA quadrant.
-        i0 : array
-            The (0-based) columns of the shutters in their quadrant.
-        j0 : int
-            The (0-based) rows of the shutters in their quadrant.
+        q : int
+            The (0-based) MSA quadrant of the shutters.
+        nrs : int
+            Which detector: NRS1 (0) or NRS2 (1).
+        i0, j0 : array
+            The (0-based) columns and rows of the shutters in their 
+            quadrant.
         
         Returns
         -------
-        wavelengths : array
-            A 2048xN array of the wavelength at each pixel for each
-            shutter. Any pixel which is not illuminated by the spectrum
-            is set to 0.
+        wav0 : array
+            The wavelength of each shutter at the starting pixel, from
+            the precomputed IC surfaces (see 
+            `~msaviz.calibration.Calibration.ic_surfaces`).
         """
-        dx = [-1,1][pix0 == 0] #integration direction
-        pixels = np.arange(2048, dtype=float) #pixels at which to integrate
+        return self._ic_surfaces[q, nrs, i0, j0]
+
+def _row_owners(idx):
+    """
+    Find which shutter's spectrum fills each row of the detector arrays
+    built by `MSAConfig._calculate_spectra`.
+    
+    Shutters in the same row and half (top or bottom) of the MSA share a 
+    row of the detector arrays, and the last of them (in order of 
+    quadrant, column, then row) is the one stored there.
+    
+    Parameters
+    ----------
+    idx : array
+        The sorted, flat (quadrant, column, row) indices of the shutters.
+    
+    Returns
+    -------
+    owners : array
+        A 342-element array (the top half's 171 rows, then the bottom 
+        half's, as flattened from the detector arrays) of the index of 
+        the shutter stored in each row, or -1 if there is none.
+    """
+    q, c, r = np.unravel_index(idx, (4, 365, 171))
+    owners = np.full(2*171, -1, dtype=np.intp)
+    owners[(1 - q % 2) * 171 + 170 - r] = idx
+    return owners
+
+class DetectorRows(object):
+    """
+    A compact form of the detector wavelength arrays, which only stores
+    the rows holding a spectrum.
+    
+    The dense arrays built by `MSAConfig._calculate_spectra` have shape
+    (2, 2, 171, 2048) (detector, half of the MSA, row, and pixel), but
+    only one row can hold each shutter's spectrum, and most configs open
+    far fewer shutters than there are rows.
+    
+    Parameters
+    ----------
+    rows : array
+        The sorted indices of the K occupied rows, in the flattened 
+        (half, row) axes of the dense arrays.
+    waves : array
+        A 2xKx2048 array of the wavelengths in each occupied row, on each
+        detector.
+    
+    Attributes
+    ----------
+    rows : array
+        The occupied rows.
+    waves : array
+        Their wavelengths.
+    shape : tuple
+        The shape of the dense arrays.
+    """
+    
+    shape = (2, 2, 171, 2048)
+    
+    def __init__(self, rows, waves):
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.waves = waves
+    
+    @property
+    def nbytes(self):
+        """
+        The memory used by the stored rows.
+        """
+        return self.rows.nbytes + self.waves.nbytes
+    
+    def toarray(self, dtype=None):
+        """
+        Build the dense array.
         
-        #Wavelength IC
-        model = models.Polynomial2D(2)
-        model.parameters = params
-        wav0 = model(j0, i0)
+        Parameters
+        ----------
+        dtype : dtype, optional
+            The data type of the array; by default, that of `waves`.
         
-        #integrate
-        wavelengths= odeint(self._integrate_func, wav0, pixels[::dx])
+        Returns
+        -------
+        arr : array
+            The dense (2, 2, 171, 2048) array, with 0 in unoccupied rows.
+        """
+        arr = np.zeros((2, 2*171, 2048), dtype=dtype or self.waves.dtype)
+        arr[:, self.rows] = self.waves
+        return arr.reshape(self.shape)
+    
+    def __array__(self, dtype=None, copy=None):
+        return self.toarray(dtype)
+    
+    def replace(self, changed, rows, waves):
+        """
+        Replace a set of rows.
         
-        return wavelengths[::dx] #go back to pixels 0->2047
+        Parameters
+        ----------
+        changed : array
+            The rows to clear.
+        rows : array
+            The rows (among those cleared) to fill with new spectra.
+        waves : array
+            A 2xMx2048 array of the new spectra for each of `rows`.
+        
+        Returns
+        -------
+        replaced : `DetectorRows`
+            A new instance with the rows replaced; this one is unchanged.
+        """
+        keep = ~np.isin(self.rows, changed)
+        new_rows = np.concatenate((self.rows[keep], rows))
+        new_waves = np.concatenate((self.waves[:, keep], 
+                                    waves.astype(self.waves.dtype)), axis=1)
+        order = np.argsort(new_rows)
+        return DetectorRows(new_rows[order], new_waves[:, order])
 
 class MSAConfig(object):
     """
@@ -414,10 +1760,63 @@ class MSAConfig(object):
         The path to the MSA config file. While this parameter is optional
         at instantiation, a config file must be provided before any
         calculations can be performed.
+    cache : `~msaviz.resultcache.ResultCache` or str, optional
+        An on-disk cache (or the path of a cache directory) in which to
+        look up and store the calculated wavelengths. By default, no
+        cache is used.
+    lazy : bool, optional
+        If True, only the wavelength limits of each shutter (as needed
+        for `wavelength_table` and `verify_wavelength`) are calculated 
+        up front; the full wavelength arrays are calculated when they 
+        are first needed. This is much faster, and uses much less memory,
+        for large configs.
+    compact : bool, optional
+        If True, the full wavelength arrays are stored in single 
+        precision, and only for the detector rows which hold a spectrum
+        (see `DetectorRows`); dense arrays are only built when needed for
+        display. This uses much less memory, particularly for configs 
+        with few open shutters.
+    executor : str or pool, optional
+        How to share out the wavelength calculations; see 
+        `~msaviz.MSA.__call__`. By default, they are done in the calling
+        thread.
+    preview : bool, optional
+        If True, the full wavelength arrays are only approximated at 
+        first (see `~msaviz.MSA.preview`), so that they can be displayed
+        sooner; call `refine` to calculate them at full accuracy.
+    cancel : `threading.Event`, optional
+        If given, any calculation in progress is abandoned (by raising
+        `Cancelled`) once this has been set; see `~msaviz.MSA.__call__`.
+        The MSAConfig should then be discarded.
+    progress : callable, optional
+        If given, this is called as ``progress(done, total)`` as the 
+        calculations go on (see `~msaviz.MSA.__call__`), with the number
+        of shutters calculated so far, and in all, since the filter, 
+        disperser, or config file was last updated. The total grows as
+        each calculation (of the wavelength limits, then the wavelength
+        arrays, and then the trace raster) starts.
     
     Attributes
     ----------
     wavelength_table
+    raster
+    changes : `ShutterChanges` or None
+        The shutters opened and closed by the last config file update;
+        see `update_config`.
+    cache : `~msaviz.resultcache.ResultCache` or None
+        The result cache in use, if any.
+    lazy : bool
+        Whether the full wavelength arrays are calculated on demand.
+    compact : bool
+        Whether the full wavelength arrays are stored compactly.
+    executor : str, pool or None
+        How the wavelength calculations are shared out.
+    preview : bool
+        Whether the full wavelength arrays are (still) approximate.
+    cancel : `threading.Event` or None
+        The event which cancels calculations in progress.
+    progress : callable or None
+        The progress callback.
     conf : str
         The path to the MSA config file.
     fname : str
@@ -431,13 +1830,36 @@ class MSAConfig(object):
         transmitted by the chosen filter.
     """
     
-    def __init__(self, filtname="", dispname="", config_file=""):
+    #The process-wide cache of stuck-open shutter spectra (see 
+    #MSAConfig._stuck_spectra); one entry for each filter/disperser 
+    #combination fits by default.
+    stuck_cache_size = 9
+    _stuck_cache = OrderedDict()
+    _stuck_cache_lock = threading.RLock()
+    
+    def __init__(self, filtname="", dispname="", config_file="", cache=None,
+                 lazy=False, compact=False, executor=None, preview=False,
+                 cancel=None, progress=None):
+        if isinstance(cache, str):
+            cache = ResultCache(cache)
+        self.cache = cache
+        self.lazy = lazy
+        self.compact = compact
+        self.executor = executor
+        self.preview = preview
+        self.cancel = cancel
+        self.progress = progress
+        self._counts = [0, 0]
         self._msa = None
+        self._idx = None
+        self._stuck = None
         self._oidx = None
-        self._nrs = None
-        self._stu = None
+        self._spectra = None
+        self._raster = None
+        self._raster_lock = threading.Lock()
         self._shutter_limits = None
-        self._open_shutters = {}
+        self._status = None
+        self.changes = None
         self.conf = ""
         self.fname = ""
         self.dname = ""
@@ -458,24 +1880,47 @@ class MSAConfig(object):
         ----------
         config_file : str
             The path to the MSA config file which will be parsed.
+        
+        Returns
+        -------
+        changes : `ShutterChanges`
+            A namedtuple of 3xN arrays of the (0-based) coordinates of the
+            shutters which were ``opened`` and ``closed`` by this update,
+            compared to the previous config file, if any. Stuck-open 
+            shutters count as open. This is also stored as `changes`.
             
         Notes
         -----
         This method can be used to change to a different config file
-        while keeping all other parameters the same.
+        while keeping all other parameters the same. In that case, the
+        results for shutters which were already open are reused, so only
+        the changed shutters need to be calculated.
         """
         if not config_file:
             return
+        previous = (self._status, self._idx, self._stuck, 
+                    self._shutter_limits, self._spectra)
         self.conf = config_file
-        self._open_shutters = parse_msa_config(self.conf)
-        
-        qrc,s = zip(*sorted(self._open_shutters.items()))
-        self._quads, self._cols, self._rows = np.vstack(list(zip(*qrc)))
-        self._stuck = np.array(s)
+        self._status = parse_msa_status(self.conf).status
+        
+        stuck = self._status == STUCK_OPEN
+        lit = stuck | (self._status == OPEN)
+        qrc = np.nonzero(lit)
+        self._quads, self._cols, self._rows = qrc
+        self._idx = np.ravel_multi_index(qrc, lit.shape)
+        self._stuck = stuck[qrc]
         self._opens = ~self._stuck
         self._oidx, = self._opens.nonzero()
         self.nopen = self._oidx.size
-        self._calculate()
+        
+        was_lit = np.zeros_like(lit)
+        if previous[0] is not None:
+            was_lit = (previous[0] == STUCK_OPEN) | (previous[0] == OPEN)
+        self.changes = ShutterChanges(np.array(np.nonzero(lit & ~was_lit)),
+                                      np.array(np.nonzero(was_lit & ~lit)))
+        
+        self._calculate(previous[1:])
+        return self.changes
     
     def update_instrument(self, filtname, dispname):
         """
@@ -503,10 +1948,39 @@ class MSAConfig(object):
         self.fname = filtname
         self.dname = dispname
         
-        self._msa = MSA(self.fname, self.dname)
+        self._msa = MSA.get(self.fname, self.dname)
         self.sci_range = self._msa.sci_range
         self._calculate()
     
+    def refine(self):
+        """
+        Recalculate the approximate wavelength arrays of a preview 
+        MSAConfig at full accuracy.
+        
+        Until then, the wavelength arrays (if they have been calculated
+        yet) are as from `~msaviz.MSA.preview`; the wavelength limits, 
+        and so `wavelength_table` and `verify_wavelength`, are always at 
+        full accuracy.
+        
+        If the preview was already at full accuracy (see 
+        `~msaviz.MSA.approximate_preview`), it is kept as it is.
+        
+        Notes
+        -----
+        As with `update_config`, to keep displaying the preview while it
+        is refined (e.g. in another thread), refine a copy of it.
+        """
+        if not self.preview:
+            return
+        self.preview = False
+        if not self._msa.approximate_preview:
+            return
+        spectra = self._spectra
+        self._counts = [0, 0]
+        if spectra is not None:
+            self._spectra = None
+            self._calculate_spectra()
+    
     def wavelength(self, quadrants, rows, columns):
         """
         Calculate the wavelength arrays for the given shutter coords.
@@ -528,49 +2002,365 @@ class MSAConfig(object):
         
         if not self.conf or not self.fname:
             return None
-        return self._msa(np.vstack((quadrants, rows, columns)))
+        coords = np.vstack((quadrants, rows, columns))
+        return self._msa(coords, executor=self.executor, cancel=self.cancel,
+                         progress=self._tracker(coords.shape[1]))
         
-    def _calculate(self):
+    def _cache_key(self, *extra):
         """
-        Calculate the wavelengths for all open shutters.
+        The result cache key for the current config and instrument, or
+        None if no result cache is in use.
+        """
+        if self.cache is None:
+            return None
+        return "-".join((self.cache.key(self._status, self._msa.filter, 
+                                        self._msa.disperser, 
+                                        self._msa.solver,
+                                        load_calibration().version),) + 
+                        extra)
+    
+    def _calculate(self, previous=None):
+        """
+        Calculate the wavelength limits on each detector for all open 
+        shutters.
         
         This method is called whenever the filter, disperser, or config
-        file are updated.
+        file are updated. Only the wavelengths at the ends of each 
+        spectrum are calculated; unless this is a lazy MSAConfig, the 
+        full wavelength arrays are then calculated as well. If a result
+        cache is in use, the results are read from (or else stored in) 
+        the cache.
         
         Parameters
         ----------
-        None
+        previous : tuple, optional
+            The ``_idx``, ``_stuck``, ``_shutter_limits`` and ``_spectra``
+            of the previous config file, for the same filter and 
+            disperser. Any of these results which are still valid are 
+            reused rather than calculated again.
         """
         
-        self._nrs = np.zeros((2,2,171,2048), dtype=float)
-        self._stu = np.zeros((2,2,171,2048), dtype=float)
         self._shutter_limits = None
+        self._spectra = None
+        self._raster = None
+        self._raster_lock = threading.Lock() #no longer shared with copies
+        self._counts = [0, 0]
         
         if not self.conf or not self.fname:
             return
         
-        o = self._opens
-        s = self._stuck
-        coords = np.vstack((self._quads, self._cols, self._rows))
-
-        lo, hi = self.sci_range
-        all_waves = self._msa(coords)
-        top = 1 - self._quads % 2
-        lims = np.full((self.nopen, 4), np.nan, dtype=float)
+        old_idx, old_stuck, old_limits, old_spectra = previous or [None]*4
         
-        for n, waves in enumerate(all_waves):
-            wopen = waves[o]
-            wstuck = waves[s]
+        key = self._cache_key()
+        cached = None if key is None else self.cache.get(key)
+        if cached is not None:
+            self._shutter_limits = cached['limits']
+        else:
+            lims = np.full((self.nopen, 4), np.nan, dtype=float)
+            todo = np.ones(self.nopen, dtype=bool)
             
-            self._stu[n, top[s], 170-coords[2,s]] = wstuck
-            self._nrs[n, top[o], 170-coords[2,o]] = wopen
+            if old_limits is not None and old_limits.shape[0] > 0:
+                #reuse the limits of the shutters which were already open
+                oidx = old_idx[~old_stuck]
+                nidx = self._idx[self._oidx]
+                pos = np.minimum(np.searchsorted(oidx, nidx), oidx.size - 1)
+                todo = oidx[pos] != nidx
+                lims[~todo] = old_limits[pos[~todo]]
             
-            fin, = np.any(np.isfinite(wopen), axis=1).nonzero() #ensure there's at least one good value
-            ok = fin[np.logical_and(np.nanmin(wopen[fin],axis=1) <= hi,
-                                    np.nanmax(wopen[fin],axis=1) >= lo)]
-            lims[ok,   n*2] = np.maximum(wopen[ok].min(axis=1), lo)
-            lims[ok, 1+n*2] = np.minimum(wopen[ok].max(axis=1), hi)
-        self._shutter_limits = lims
+            if todo.any():
+                lo, hi = self.sci_range
+                coords = np.vstack((self._quads, self._cols, self._rows))
+                limits = self._msa.limits(coords[:, self._oidx[todo]],
+                                          executor=self.executor, 
+                                          cancel=self.cancel,
+                                          progress=self._tracker(todo.sum()))
+                new = np.full((limits.shape[1], 4), np.nan, dtype=float)
+                
+                for n, (wmin, wmax) in enumerate(limits.transpose(0, 2, 1)):
+                    ok = np.logical_and(wmin <= hi, wmax >= lo) #False for NaN
+                    new[ok,   n*2] = np.maximum(wmin[ok], lo)
+                    new[ok, 1+n*2] = np.minimum(wmax[ok], hi)
+                lims[todo] = new
+            self._shutter_limits = lims
+            
+            if key is not None:
+                self.cache.put(key, {'limits': lims})
+        
+        if not self.lazy or old_spectra is not None:
+            self._calculate_spectra(previous)
+    
+    def _calculate_spectra(self, previous=None):
+        """
+        Calculate the full wavelength arrays for all open and stuck-open
+        shutters, as they fall on the detectors.
+        
+        Only one shutter's spectrum can be stored in each row of the 
+        detector arrays (see `_row_owners`), so only those shutters are
+        calculated. Given the results for a previous config file, only 
+        the rows whose shutter has changed are calculated. The 
+        stuck-open shutters are shared with other instances; see 
+        `_stuck_spectra`.
+        
+        Parameters
+        ----------
+        previous : tuple, optional
+            As for `_calculate`.
+        
+        Returns
+        -------
+        spectra : tuple
+            The open and stuck-open wavelength arrays, each of shape 
+            (2, 2, 171, 2048): detector, half of the MSA (top or bottom),
+            row, and pixel. For a compact MSAConfig, these are 
+            `DetectorRows` instead.
+        """
+        if self._spectra is not None:
+            return self._spectra
+        
+        if not self.conf or not self.fname:
+            return self._empty_spectra(), self._empty_spectra()
+        
+        stu = self._stuck_spectra()
+        
+        key = self._cache_key("spectra", *self._storage + self._accuracy)
+        cached = None if key is None else self.cache.get(key)
+        if cached is not None:
+            self._spectra = self._from_rows(cached), stu
+            return self._spectra
+        
+        old_idx, old_stuck, old_limits, old_spectra = previous or [None]*4
+        owners = _row_owners(self._idx[self._opens])
+        if old_spectra is None:
+            nrs = self._empty_spectra()
+            changed, = (owners >= 0).nonzero()
+        else:
+            nrs = old_spectra[0]
+            if not self.compact:
+                nrs = np.array(nrs)
+            changed, = (owners != _row_owners(old_idx[~old_stuck])).nonzero()
+        nrs = self._fill_rows(nrs, owners, changed)
+        self._spectra = nrs, stu
+        
+        if key is not None:
+            self.cache.put(key, self._to_rows(nrs, owners))
+        return self._spectra
+    
+    def _stuck_spectra(self):
+        """
+        Retrieve the wavelength arrays for the stuck-open shutters.
+        
+        Stuck-open shutters are a property of the MSA rather than of the
+        config, so their spectra are kept in a process-wide, least-
+        recently-used cache of at most `stuck_cache_size` entries (and in
+        the result cache, if one is in use), keyed by filter, disperser,
+        solver and the set of stuck-open shutters. They are only
+        calculated the first time they are needed.
+        
+        Returns
+        -------
+        stu : array or `DetectorRows`
+            The (read-only) stuck-open wavelength arrays; see 
+            `_calculate_spectra`.
+        """
+        sidx = self._idx[self._stuck]
+        owners = _row_owners(sidx)
+        key = (self._msa.filter, self._msa.disperser, self._msa.solver,
+               hashlib.sha1(sidx.astype(np.int64).tobytes()).hexdigest())
+        key += self._storage + self._accuracy
+        with self._stuck_cache_lock:
+            stu = self._stuck_cache.pop(key, None)
+            if stu is not None:
+                self._stuck_cache[key] = stu #re-insert as most recently used
+                return stu
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self._status == STUCK_OPEN, *key[:3] + 
+                                       (load_calibration().version,))
+            cache_key = "-".join((cache_key, "stuck") + self._storage + 
+                                 self._accuracy)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                stu = self._from_rows(cached)
+        
+        if stu is None:
+            stu = self._fill_rows(self._empty_spectra(), owners, 
+                                  (owners >= 0).nonzero()[0])
+            if cache_key is not None:
+                self.cache.put(cache_key, self._to_rows(stu, owners))
+        if self.compact:
+            stu.waves.setflags(write=False) #shared between instances
+        else:
+            stu.setflags(write=False)
+        
+        with self._stuck_cache_lock:
+            self._stuck_cache[key] = stu
+            while len(self._stuck_cache) > max(self.stuck_cache_size, 0):
+                self._stuck_cache.popitem(last=False)
+        return stu
+    
+    def _fill_rows(self, arr, owners, changed):
+        """
+        Calculate the given rows of a set of detector arrays.
+        
+        Parameters
+        ----------
+        arr : array or `DetectorRows`
+            The detector arrays, which are updated in place (or, for 
+            `DetectorRows`, replaced).
+        owners : array
+            The shutter in each row, as from `_row_owners`.
+        changed : array
+            The (flattened) rows to calculate; rows without a shutter are
+            cleared.
+        
+        Returns
+        -------
+        arr : array or `DetectorRows`
+            The updated detector arrays.
+        """
+        lit = changed[owners[changed] >= 0]
+        waves = np.zeros((2, 0, 2048), dtype=float)
+        if lit.size > 0:
+            coords = np.array(np.unravel_index(owners[lit], (4, 365, 171)))
+            progress = self._tracker(lit.size)
+            if self.preview:
+                waves = self._msa.preview(coords, cancel=self.cancel, 
+                                          progress=progress)
+            else:
+                waves = self._msa(coords, executor=self.executor, 
+                                  cancel=self.cancel, progress=progress)
+        
+        if self.compact:
+            return arr.replace(changed, lit, waves)
+        dense = arr.reshape(2, 2*171, 2048)
+        dense[:, changed] = 0.
+        dense[:, lit] = waves
+        return arr
+    
+    def _tracker(self, total):
+        """
+        A progress callback for one calculation of `total` shutters, 
+        which reports the running totals of all of the calculations since
+        the last update to `progress`, or None if there is no `progress`.
+        """
+        if self.progress is None:
+            return None
+        start = self._counts[0]
+        self._counts[1] += int(total)
+        def report(done, _):
+            self._counts[0] = start + done
+            self.progress(*self._counts)
+        return report
+    
+    @property
+    def _storage(self):
+        """
+        A tuple tagging cache keys with the storage mode.
+        """
+        return ("compact",) if self.compact else ()
+    
+    @property
+    def _accuracy(self):
+        """
+        A tuple tagging cache keys for approximate (preview) results.
+        """
+        if self.preview and self._msa.approximate_preview:
+            return ("preview",)
+        return ()
+    
+    def _empty_spectra(self):
+        """
+        Empty detector arrays, in the storage mode of this instance.
+        """
+        if self.compact:
+            return DetectorRows([], np.zeros((2, 0, 2048), dtype=np.float32))
+        return np.zeros(DetectorRows.shape, dtype=float)
+    
+    def _to_rows(self, arr, owners):
+        """
+        The occupied rows of a set of detector arrays, as stored in the 
+        result cache.
+        """
+        if self.compact:
+            return {'rows': arr.rows, 'waves': arr.waves}
+        rows, = (owners >= 0).nonzero()
+        return {'rows': rows, 'waves': arr.reshape(2, 2*171, 2048)[:, rows]}
+    
+    def _from_rows(self, cached):
+        """
+        Detector arrays, in the storage mode of this instance, from the 
+        rows stored in the result cache.
+        """
+        spectra = DetectorRows(cached['rows'], cached['waves'])
+        return spectra if self.compact else spectra.toarray()
+    
+    @property
+    def _nrs(self):
+        """
+        The wavelength arrays for the open shutters; see 
+        `_calculate_spectra`. For a lazy MSAConfig, these are only
+        calculated when first needed; for a compact MSAConfig, this is a
+        new dense (single-precision) view each time.
+        """
+        nrs = self._calculate_spectra()[0]
+        return nrs.toarray() if self.compact else nrs
+    
+    @property
+    def _stu(self):
+        """
+        The wavelength arrays for the stuck-open shutters; see 
+        `_calculate_spectra`.
+        """
+        stu = self._calculate_spectra()[1]
+        return stu.toarray() if self.compact else stu
+    
+    @property
+    def raster(self):
+        """
+        The traces of all of the open and stuck-open shutters, as pixel
+        intervals on each detector row.
+        
+        Unlike the wavelength arrays, which only hold one spectrum per 
+        row, this includes every shutter, so it can be used to find 
+        overlapping spectra. It is calculated when first needed (see
+        `build_raster`).
+        
+        Returns
+        -------
+        raster : `~msaviz.raster.TraceRaster`
+            The rasterized traces, or None if there is no config file or
+            instrument yet.
+        """
+        return self.build_raster(self.cancel)
+    
+    def build_raster(self, cancel=None):
+        """
+        Calculate `raster`, unless it has been already.
+        
+        If another thread is already calculating it, this waits for that
+        result rather than calculating it again; so, for instance, the 
+        raster of a preview which is on display can be calculated in the
+        background. Copies (e.g. for `refine`) share the raster until the
+        config file or instrument is updated.
+        
+        Parameters
+        ----------
+        cancel : `threading.Event`, optional
+            Abandons the calculation, as for the `cancel` attribute (which
+            is used by default), without setting that for other threads.
+        
+        Returns
+        -------
+        raster : `~msaviz.raster.TraceRaster`
+            As for `raster`.
+        """
+        if self._raster is None and self.conf and self.fname:
+            with self._raster_lock:
+                if self._raster is None:
+                    self._raster = TraceRaster.from_config(self, 
+                                                           cancel=cancel)
+        return self._raster
     
     @property
     def _table_meta(self):
@@ -609,6 +2399,8 @@ class MSAConfig(object):
             A table of coordinates and wavelength limits on each detector
             for each shutter.
         """
+        from astropy.table import QTable
+        import astropy.units as u
         
         limits = self._shutter_limits * u.micron
         lo1, hi1, lo2, hi2 = limits.T
@@ -649,6 +2441,109 @@ class MSAConfig(object):
         self.wavelength_table.write(outfile, 
                                     format='ascii.fixed_width_two_line')
     
+    def _targets(self, target):
+        """
+        Convert target wavelengths to an array in microns, dropping any 
+        which fall outside the filter's science range.
+        """
+        import astropy.units as u
+        
+        targets = np.atleast_1d(target)
+        if isinstance(targets, u.Quantity):
+            targets = targets.to(u.micron).value
+        targets = np.asarray(targets, dtype=float)
+        
+        lo, hi = self.sci_range
+        return targets[np.logical_and(targets >= lo, targets <= hi)]
+    
+    def pixel_table(self, target, chunk_size=1000):
+        """
+        Generate a QTable of the pixel at which each target wavelength 
+        falls on the detectors, for each open shutter.
+        
+        Parameters
+        ----------
+        target : float or array-like
+            A scalar wavelength or array of wavelengths in microns (units
+            need not be included). Any which fall outside the filter's 
+            science range are dropped.
+        chunk_size : int, optional
+            As for `~msaviz.MSA.pixels`.
+        
+        Returns
+        -------
+        pixels : `~astropy.table.QTable`
+            A table where each row is associated with an open shutter in
+            the MSA (with coordinates included), with an NRS1 and an NRS2
+            column for each target wavelength, giving its (fractional, 
+            0-based) pixel on that detector. These are masked where the
+            target doesn't fall on the detector.
+        """
+        from astropy.table import QTable
+        
+        targets = self._targets(target)
+        coords = np.vstack((self._quads[self._oidx], self._cols[self._oidx],
+                            self._rows[self._oidx]))
+        pixels = self._msa.pixels(coords, targets, chunk_size=chunk_size)
+        
+        columns = OrderedDict([('Quadrant', coords[0] + 1),
+                               ('Column', coords[1] + 1),
+                               ('Row', coords[2] + 1)])
+        for i, t in enumerate(targets):
+            for n, name in enumerate(['NRS1', 'NRS2']):
+                columns["{} {:0.03f} micron".format(name, t)] = pixels[n,:,i]
+        table = QTable(list(columns.values()), names=list(columns), 
+                       meta=self._table_meta, masked=True)
+        for name in list(columns)[3:]:
+            table[name].info.format = '7.2f'
+            table[name].mask = ~np.isfinite(columns[name])
+        return table
+    
+    def wavelength_flags(self, target):
+        """
+        Determine where the input wavelengths fall with respect to each
+        open shutter, as a compact array of flags.
+        
+        All shutters and targets are flagged at once, directly from the
+        wavelength limits, so this scales to large configs and dense line
+        lists; see `verify_wavelength` for a table of the same flags.
+        
+        Parameters
+        ----------
+        target : float or array-like
+            A scalar wavelength or array of wavelengths in microns (units
+            need not be included). Any which fall outside the filter's
+            science range are dropped.
+        
+        Returns
+        -------
+        targets : array
+            The T target wavelengths (in microns) inside the science 
+            range.
+        flags : array
+            An NxT int8 array with a flag for each open shutter and 
+            target, as described in `verify_wavelength`.
+        """
+        targets = self._targets(target)
+        
+        #NxT comparisons; NaN limits compare False, so a detector which
+        #the spectrum doesn't reach never claims a target
+        lo1, hi1, lo2, hi2 = [lim[:, None] for lim in self._shutter_limits.T]
+        t = targets[None, :]
+        edge = NEAR_EDGE_PIXELS * self._msa.dispersion(targets)[None, :]
+        
+        flags = np.full((self.nopen, targets.size), IN_GAP, dtype=np.int8)
+        flags[t < np.fmin(lo1, lo2)] = LEFT_OF_NRS1
+        flags[t >= np.fmax(hi1, hi2)] = RIGHT_OF_NRS2
+        for on, near, lmin, lmax in [(ON_NRS1, NEAR_NRS1_EDGE, lo1, hi1),
+                                     (ON_NRS2, NEAR_NRS2_EDGE, lo2, hi2)]:
+            inside = np.logical_and(t >= lmin, t < lmax)
+            flags[inside] = on
+            close = np.logical_or(lmax - t <= edge, t - lmin <= edge)
+            flags[np.logical_and(inside, close)] = near
+        
+        return targets, flags
+    
     def verify_wavelength(self, target, verbose=True):
         """
         Determine generally where the input wavelengths fall with respect
@@ -683,29 +2578,29 @@ class MSAConfig(object):
                   and may require special attention
              4 -> the target wavelength appears near the edge of NRS2, 
                   and may require special attention
+        
+        Notes
+        -----
+        A target is near the edge of a detector if it is within 
+        `NEAR_EDGE_PIXELS` pixels (at the dispersion for that wavelength)
+        of the end of the spectrum on that detector. The flags themselves
+        are calculated by `wavelength_flags`; this method just presents 
+        them as a table.
         """
-        targets = np.atleast_1d(target)
-        if not isinstance(targets, u.Quantity):
-            targets = targets * u.micron
+        from astropy.table import QTable
         
-        ok = np.logical_and(targets >= self.sci_range[0] * u.micron,
-                            targets <= self.sci_range[1] * u.micron)
+        ntarget = np.atleast_1d(target).size
+        targets, flag = self.wavelength_flags(target)
         
-        if np.count_nonzero(ok) == 0:
+        if targets.size == 0:
             print("No target wavelength falls inside the filter " \
                   "transmission range.")
             return
         
-        if np.count_nonzero(ok) != targets.size:
+        if targets.size != ntarget:
             if verbose:
                 print("Trimming target wavelengths outside the filter " \
                       "transmission range...")
-            targets = targets[ok]
-        
-        nt = targets.size
-        
-        #Grab input table
-        table = self.wavelength_table
         
         #Create output table
         meta = self._table_meta
@@ -721,54 +2616,28 @@ class MSAConfig(object):
                 "   4 : the target wavelength appears near the edge of " \
                     "NRS2, and may require special attention"
                     ])
-        flags = QTable(meta=meta, masked=True)
-        
-        flags['Quadrant'] = table['Quadrant']
-        flags['Column'] = table['Column']
-        flags['Row'] = table['Row']
-        
-        flag = np.zeros((self.nopen, nt), dtype=int)
         
-        dwav = self._msa.dispersion(targets.value) * u.micron
-        fvalues = np.array([-1, 1, 0, 2, -2])
-        
-        for i, row in enumerate(table):
-            #can't create an array from individual Quantity objects...
-            bounds = np.array([row['NRS{}-{}'.format(d,x)].value for d in '12' \
-                                   for x in ['min','max']]) * u.micron
-            
-            #locate the targets w/r/t the detector bounds
-            f = np.searchsorted(bounds, targets, side='right')
-            flag[i] = fvalues[f]
-            
-            on1, = np.nonzero(f == 1)
-            on2, = np.nonzero(f == 3)
-            
-            if np.count_nonzero(on1) > 0:
-                close = np.logical_or((bounds[1] - targets[on1]) / dwav[on1] <= 20,
-                                      (targets[on1] - bounds[0]) / dwav[on1] <= 20)
-                flag[i, on1][close] = 3
-            if np.count_nonzero(on2) > 0:
-                if np.count_nonzero(~np.isfinite(bounds[2:])) > 0 or np.count_nonzero(~np.isfinite(targets[on2])) > 0:
-                    import pdb; pdb.set_trace()
-                close = np.logical_or((bounds[3] - targets[on2]) / dwav[on2] <= 20,
-                                      (targets[on2] - bounds[2]) / dwav[on2] <= 20)
-                flag[i, on2][close] = 3
-        
-        flag = flag.T
-        
-        for i,t in enumerate(targets):
-            flags["{0:0.03f}".format(t)] = flag[i]
+        #one column per target; as before, targets which round to the
+        #same name share a column, and the last one wins
+        columns = OrderedDict([('Quadrant', self._quads[self._oidx] + 1),
+                               ('Column', self._cols[self._oidx] + 1),
+                               ('Row', self._rows[self._oidx] + 1)])
+        for i, t in enumerate(targets):
+            columns["{0:0.03f} micron".format(t)] = flag[:, i]
+        flags = QTable(list(columns.values()), names=list(columns), 
+                       meta=meta, masked=True)
         
         if verbose:
             txt = ['in the detector gap', 'on NRS1', 'on NRS2', 
                    'near the edge of NRS1', 'near the edge of NRS2',
                    'to the right of NRS2', 'to the left of NRS1']
+            counts = [np.count_nonzero(flag == x, axis=0) 
+                          for x in range(-2,5)]
             
-            for f,t in zip(flag, targets):
-                print("Target wavelength {}:".format(t))
+            for i, t in enumerate(targets):
+                print("Target wavelength {} micron:".format(t))
                 for x in range(-2,5):
-                    nf = np.count_nonzero(f == x)
+                    nf = counts[x+2][i]
                     if  nf > 0:
                         print(" -> falls {} for {:.1%} of shutters".format(txt[x], 
                                           nf / self.nopen))
@@ -801,7 +2670,7 @@ def wavelength_table(config_file, filtname, dispname, outfile=None):
             for each shutter.
     """
     
-    msaconf = MSAConfig(filtname, dispname, config_file)
+    msaconf = MSAConfig(filtname, dispname, config_file, lazy=True)
     
     if outfile:
         msaconf.write_wavelength_table(outfile)
@@ -856,7 +2725,7 @@ def check_wavelengths(wavelengths, config_file, filtname, dispname,
             A table of coordinates and wavelength limits on each detector
             for each shutter.
     """
-    msaconf = MSAConfig(filtname, dispname, config_file)
+    msaconf = MSAConfig(filtname, dispname, config_file, lazy=True)
     flag_table = msaconf.verify_wavelength(wavelengths, verbose=verbose)
     
     if outfile:
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the rasterization of every lit shutter's spectrum
+onto the detectors, keeping track of shutters whose spectra share a row.
+
+The wavelength arrays of `~msaviz.MSAConfig` can only hold one spectrum
+per detector row, so when two open shutters in the same half of the MSA
+share a row, only the last of them is stored there. A `TraceRaster`
+instead records each trace as an interval of pixels on its detector row,
+sorted by detector, row and first pixel. From these intervals, it can
+find the traces on any row, the number of traces falling on each pixel,
+and every pair of overlapping spectra:
+
+    >>> from msaviz import MSAConfig
+    >>> msa = MSAConfig('f170lp', 'g235m', 'msa_config1.csv')
+    >>> raster = msa.raster
+    >>> counts = raster.multiplicity() #(2, 2, 171, 2048)
+    >>> overlaps = raster.overlap_table()
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+#Number of detector rows (half of the MSA x row) and pixels per row.
+NROWS = 2*171
+NPIX = 2048
+
+
+def _expand(first, counts):
+    """
+    Expand ranges of indices: for each i, the `counts[i]` consecutive
+    indices starting from `first[i]`.
+    
+    Returns
+    -------
+    owner, index : array
+        For every expanded index, which range (i) it came from, and the
+        index itself.
+    """
+    owner = np.repeat(np.arange(counts.size), counts)
+    offsets = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+    return owner, first[owner] + offsets
+
+
+def trace_spans(msa, coords, sci_range, chunk_size=1000, executor=None,
+                cancel=None, progress=None):
+    """
+    Find the pixels over which each shutter's spectrum falls inside the
+    filter's science range, on each detector.
+    
+    Parameters
+    ----------
+    msa : `~msaviz.MSA`
+        The MSA model for the filter and disperser.
+    coords : array
+        A 3xN array of shutter coordinates.
+    sci_range : list
+        The minimum and maximum wavelength of the filter transmission.
+    chunk_size : int, optional
+        The number of shutters to evaluate at once, to bound the memory
+        used.
+    executor, cancel, progress : optional
+        As for `~msaviz.MSA.__call__`.
+    
+    Returns
+    -------
+    spans : array
+        A 2xNx2 array of the first pixel and one past the last pixel of
+        each trace on each detector. Both are 0 if the spectrum doesn't
+        fall on that detector.
+    
+    Notes
+    -----
+    The traces are monotonic, so the pixels inside the science range are
+    contiguous.
+    """
+    lo, hi = sci_range
+    ns = coords.shape[1]
+    spans = np.zeros((2, ns, 2), dtype=np.intp)
+    for c in range(0, ns, chunk_size):
+        chunk = slice(c, c + chunk_size)
+        report = None
+        if progress is not None:
+            report = lambda done, _, c=c: progress(c + done, ns)
+        waves = msa(coords[:, chunk], executor=executor, cancel=cancel,
+                    progress=report)
+        lit = np.logical_and(waves >= lo, waves <= hi) #False for NaN
+        on = lit.any(axis=2)
+        spans[:, chunk, 0] = np.where(on, lit.argmax(axis=2), 0)
+        spans[:, chunk, 1] = np.where(on, NPIX - lit[..., ::-1].argmax(axis=2),
+                                      0)
+    return spans
+
+
+class TraceRaster(object):
+    """
+    The pixel intervals covered by the spectra of a set of shutters, on
+    each detector row.
+    
+    Parameters
+    ----------
+    coords : array
+        A 3xN array of the (0-based) coordinates of the shutters, as
+        quadrant, column and row.
+    spans : array
+        A 2xNx2 array of the pixel span of each shutter's trace on each
+        detector, as from `trace_spans`.
+    stuck : array, optional
+        An N-element boolean array marking the stuck-open shutters.
+    msa : `~msaviz.MSA`, optional
+        The MSA model for the filter and disperser, which is needed to 
+        find the wavelengths along the traces.
+    
+    Attributes
+    ----------
+    coords : array
+        The shutter coordinates.
+    stuck : array
+        The stuck-open flags.
+    detector, row, start, stop, shutter : array
+        For each of the T traces (with a non-empty span), the detector
+        (0 for NRS1, 1 for NRS2), the row (in the flattened (half, row)
+        axes of the `~msaviz.MSAConfig` wavelength arrays), the first
+        pixel and one past the last pixel, and the index of the shutter
+        in `coords`. The traces are sorted by detector, row, then first
+        pixel.
+    """
+    
+    def __init__(self, coords, spans, stuck=None, msa=None):
+        self._msa = msa
+        self.coords = np.asarray(coords)
+        if stuck is None:
+            stuck = np.zeros(self.coords.shape[1], dtype=bool)
+        self.stuck = np.asarray(stuck, dtype=bool)
+        
+        q, c, r = self.coords
+        nrs, shutter = (spans[..., 1] > spans[..., 0]).nonzero()
+        row = (1 - q[shutter] % 2) * 171 + 170 - r[shutter]
+        start = spans[nrs, shutter, 0]
+        
+        #sort on a single key: the first pixel within the detector row
+        self._keys = (nrs * NROWS + row) * NPIX + start
+        order = np.argsort(self._keys, kind='mergesort')
+        self._keys = self._keys[order]
+        self.detector = nrs[order]
+        self.row = row[order]
+        self.start = start[order]
+        self.stop = spans[nrs, shutter, 1][order]
+        self.shutter = shutter[order]
+    
+    @classmethod
+    def from_config(cls, msaconfig, chunk_size=1000, cancel=None):
+        """
+        Rasterize all of the open and stuck-open shutters of an MSA
+        config.
+        
+        Parameters
+        ----------
+        msaconfig : `~msaviz.MSAConfig`
+            The MSA config, with a filter, disperser and config file.
+        chunk_size : int, optional
+            As for `trace_spans`.
+        cancel : `threading.Event`, optional
+            As for `trace_spans`; by default, that of `msaconfig`.
+        
+        Returns
+        -------
+        raster : `TraceRaster`
+            The rasterized traces, where `coords` are all of the open and
+            stuck-open shutters, in the order of the config.
+        """
+        if cancel is None:
+            cancel = msaconfig.cancel
+        coords = np.vstack((msaconfig._quads, msaconfig._cols,
+                            msaconfig._rows))
+        spans = trace_spans(msaconfig._msa, coords, msaconfig.sci_range,
+                            chunk_size=chunk_size, 
+                            executor=msaconfig.executor,
+                            cancel=cancel, 
+                            progress=msaconfig._tracker(coords.shape[1]))
+        return cls(coords, spans, msaconfig._stuck, msaconfig._msa)
+    
+    def __len__(self):
+        return self.shutter.size
+    
+    def intervals(self, detector, row):
+        """
+        Find the traces on one detector row.
+        
+        Parameters
+        ----------
+        detector : int
+            NRS1 (0) or NRS2 (1).
+        row : int
+            The row, in the flattened (half, row) axes of the wavelength
+            arrays.
+        
+        Returns
+        -------
+        start, stop, shutter : array
+            The span and shutter index of each trace on the row, sorted
+            by first pixel.
+        """
+        base = (detector * NROWS + row) * NPIX
+        i, j = np.searchsorted(self._keys, [base, base + NPIX])
+        return self.start[i:j], self.stop[i:j], self.shutter[i:j]
+    
+    def span(self, quadrant, column, row):
+        """
+        Find the pixel span of one shutter's trace on each detector.
+        
+        Parameters
+        ----------
+        quadrant, column, row : int
+            The (0-based) coordinates of the shutter.
+        
+        Returns
+        -------
+        spans : list
+            The (first pixel, one past the last pixel) on NRS1 and NRS2,
+            or None where the spectrum doesn't fall on the detector (or
+            the shutter isn't in the raster).
+        """
+        match = (self.coords[0] == quadrant) & (self.coords[1] == column) \
+                    & (self.coords[2] == row)
+        spans = [None, None]
+        for n in np.isin(self.shutter, match.nonzero()[0]).nonzero()[0]:
+            spans[self.detector[n]] = (int(self.start[n]), int(self.stop[n]))
+        return spans
+    
+    def find(self, detector, row, pixel):
+        """
+        Find the traces covering one pixel.
+        
+        A binary search finds the traces on the row which start at or 
+        before the pixel, and those which haven't yet stopped are kept,
+        so this takes O(log T) time for T traces (plus the number of
+        traces on the row).
+        
+        Parameters
+        ----------
+        detector : int
+            NRS1 (0) or NRS2 (1).
+        row : int
+            The row, in the flattened (half, row) axes of the wavelength
+            arrays.
+        pixel : int
+            The pixel along the row.
+        
+        Returns
+        -------
+        traces : array
+            The indices of the traces covering the pixel; the shutters are
+            ``coords[:, shutter[traces]]``.
+        """
+        base = (detector * NROWS + row) * NPIX
+        i = np.searchsorted(self._keys, base, side='left')
+        j = np.searchsorted(self._keys, base + pixel, side='right')
+        traces = np.arange(i, j)
+        return traces[self.stop[i:j] > pixel]
+    
+    def find_all(self, detector, row, pixel):
+        """
+        Find the traces covering each of a set of pixels, all at once.
+        
+        Parameters
+        ----------
+        detector, row, pixel : array-like
+            The detector, row and pixel of each of the P points, as for 
+            `find`.
+        
+        Returns
+        -------
+        point, traces : array
+            For every trace covering one of the points, the index of the
+            point and the index of the trace.
+        """
+        detector, row, pixel = np.broadcast_arrays(detector, row, pixel)
+        base = ((detector * NROWS + row) * NPIX).ravel()
+        pixel = pixel.ravel()
+        i = np.searchsorted(self._keys, base, side='left')
+        j = np.searchsorted(self._keys, base + pixel, side='right')
+        point, traces = _expand(i, j - i)
+        covered = self.stop[traces] > pixel[point]
+        return point[covered], traces[covered]
+    
+    def wavelengths(self, traces, pixels):
+        """
+        Find the wavelengths along the given traces.
+        
+        Parameters
+        ----------
+        traces : array-like
+            The indices of the traces.
+        pixels : array-like
+            The (possibly fractional) pixel along each trace.
+        
+        Returns
+        -------
+        wavelengths : array
+            The wavelength at each pixel; these are evaluated with the 
+            MSA model's master curve, whatever its solver.
+        """
+        traces, pixels = np.broadcast_arrays(traces, 
+                                             np.asarray(pixels, dtype=float))
+        wavelengths = np.full(traces.shape, np.nan, dtype=float)
+        for n in (0, 1):
+            sel = self.detector[traces] == n
+            if not sel.any():
+                continue
+            coords = self.coords[:, self.shutter[traces[sel]]]
+            samples = self._msa._trace_samples(n, coords, pixels[sel, None])
+            wavelengths[sel] = samples[:, 0]
+        return wavelengths
+    
+    def pixels(self, traces, wavelengths, chunk_size=1000):
+        """
+        Find the (fractional) pixels at which the given traces reach the
+        given wavelengths.
+        
+        Each distinct trace is evaluated over its span; as the traces are
+        monotonic, a vectorized binary search then brackets each 
+        wavelength between two pixels; the pixel is interpolated linearly
+        between them, then refined with a secant step.
+        
+        Parameters
+        ----------
+        traces : array-like
+            The indices of the traces.
+        wavelengths : array-like
+            The wavelength to find along each trace.
+        chunk_size : int, optional
+            The number of distinct traces to evaluate at once, to bound
+            the memory used.
+        
+        Returns
+        -------
+        pixels : array
+            The pixel of each wavelength, or NaN if it falls outside the
+            span of the trace.
+        """
+        traces, wavelengths = np.broadcast_arrays(traces, wavelengths)
+        pixels = np.full(traces.shape, np.nan, dtype=float)
+        unique, which = np.unique(traces, return_inverse=True)
+        which = which.reshape(traces.shape)
+        all_pix = np.arange(NPIX, dtype=float)
+        
+        for c in range(0, unique.size, chunk_size):
+            chunk = unique[c:c + chunk_size]
+            waves = np.empty((chunk.size, NPIX), dtype=float)
+            for n in (0, 1):
+                sel = self.detector[chunk] == n
+                coords = self.coords[:, self.shutter[chunk[sel]]]
+                if sel.any():
+                    waves[sel] = self._msa._trace_samples(
+                                n, coords, np.tile(all_pix, (sel.sum(), 1)))
+            
+            query = (which >= c) & (which < c + chunk.size)
+            query, = query.ravel().nonzero()
+            t = which.ravel()[query] - c
+            wav = wavelengths.ravel()[query]
+            lo = self.start[chunk][t]
+            hi = self.stop[chunk][t] - 1
+            ok = (wav >= waves[t, lo]) & (wav <= waves[t, hi])
+            
+            #the last pixel of the span at or below each wavelength
+            for _ in range(int(np.log2(NPIX)) + 1):
+                mid = (lo + hi + 1) // 2
+                below = waves[t, mid] <= wav
+                lo = np.where(below, mid, lo)
+                hi = np.where(below, hi, mid - 1)
+            nxt = np.minimum(lo + 1, self.stop[chunk][t] - 1)
+            step = waves[t, nxt] - waves[t, lo]
+            frac = np.where(step > 0, (wav - waves[t, lo]) / 
+                            np.where(step > 0, step, 1.), 0.)
+            
+            #one secant step, to correct for the curvature of the trace
+            guess = (lo + frac)[ok]
+            slope = step[ok]
+            slope[slope <= 0] = np.inf
+            guess -= (self.wavelengths(chunk[t[ok]], guess) - wav[ok]) / slope
+            span = chunk[t[ok]]
+            pixels.ravel()[query[ok]] = np.clip(guess, self.start[span],
+                                                self.stop[span] - 1)
+        return pixels
+    
+    def multiplicity(self):
+        """
+        Count the traces falling on each pixel of the detectors.
+        
+        Returns
+        -------
+        counts : array
+            A (2, 2, 171, 2048) array (as for the `~msaviz.MSAConfig`
+            wavelength arrays) of the number of traces on each pixel.
+        """
+        #+1 where each trace starts and -1 after it stops, then integrate
+        width = NPIX + 1
+        base = (self.detector * NROWS + self.row) * width
+        size = 2 * NROWS * width
+        edges = np.bincount(base + self.start, minlength=size) - \
+                    np.bincount(base + self.stop, minlength=size)
+        counts = np.cumsum(edges.reshape(2, NROWS, width), axis=2)
+        return counts[..., :NPIX].reshape(2, 2, 171, NPIX).astype(np.int32)
+    
+    def overlaps(self):
+        """
+        Find every pair of overlapping traces.
+        
+        The traces are already sorted by row and first pixel, so each
+        trace overlaps exactly the traces after it on its row which start
+        before it stops; these are found for all traces at once with a
+        binary search.
+        
+        Returns
+        -------
+        first, second : array
+            The indices (into the traces, e.g. `shutter`) of the earlier
+            and later trace of each overlapping pair.
+        start, stop : array
+            The pixel span of each overlap.
+        """
+        later = np.arange(len(self)) + 1
+        stop_keys = self._keys - self.start + self.stop
+        last = np.searchsorted(self._keys, stop_keys, side='left')
+        
+        first, second = _expand(later, last - later)
+        start = self.start[second]
+        stop = np.minimum(self.stop[first], self.stop[second])
+        return first, second, start, stop
+    
+    def overlap_table(self):
+        """
+        Generate a QTable of the overlapping spectra.
+        
+        Returns
+        -------
+        overlaps : `~astropy.table.QTable`
+            A table with a row for each pair of overlapping traces, with
+            the detector, the (1-based) coordinates and stuck-open flags
+            of both shutters, and the first and last overlapping pixel.
+        """
+        from astropy.table import QTable
+        
+        first, second, start, stop = self.overlaps()
+        columns = [np.array(['NRS1', 'NRS2'])[self.detector[first]]]
+        names = ['Detector']
+        for n, trace in enumerate((first, second)):
+            shutter = self.shutter[trace]
+            columns.extend(list(self.coords[:, shutter] + 1) +
+                           [self.stuck[shutter]])
+            names.extend([x + str(n + 1) for x in ('Quadrant', 'Column',
+                                                   'Row', 'Stuck')])
+        columns.extend([start, stop - 1])
+        names.extend(['First pixel', 'Last pixel'])
+        return QTable(columns, names=names)
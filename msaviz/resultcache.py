@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements an optional on-disk cache of `~msaviz.MSAConfig`
+results, so that re-opening the same MSA config file with the same filter
+and disperser does not repeat the wavelength calculations.
+
+Each entry is a directory of .npy files (and a manifest listing them),
+named for a hash of everything which determines the results: the shutter
+status array parsed from the config file, the filter, disperser and 
+solver, and the version of the calibration data. Entries are written to a
+temporary directory and then renamed into place, so concurrent writers 
+cannot corrupt the cache. When the cache grows beyond its size limit, the
+least recently used entries are removed; an entry which is removed while
+it is being read is treated as missing.
+
+The cache is opt-in; to use it, pass a `ResultCache` (or a directory) as
+the ``cache`` argument of `~msaviz.MSAConfig`:
+
+    >>> from msaviz import MSAConfig
+    >>> from msaviz.resultcache import ResultCache
+    >>> cache = ResultCache('~/.msaviz_cache', max_bytes=2**30)
+    >>> msa = MSAConfig('f170lp', 'g235m', 'msa_config1.csv', cache=cache)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+#Bump this whenever the stored arrays change meaning or layout.
+CACHE_FORMAT = 3
+
+#The file in each entry which lists the names of its arrays.
+MANIFEST = 'manifest.txt'
+
+
+class ResultCache(object):
+    """
+    A directory of cached `~msaviz.MSAConfig` results.
+    
+    Parameters
+    ----------
+    directory : str
+        The cache directory, which is created if necessary.
+    max_bytes : int, optional
+        The maximum total size of the cache entries. Least recently used
+        entries are evicted to stay below this limit. If None, the cache
+        is unbounded.
+    
+    Attributes
+    ----------
+    directory : str
+        The absolute path of the cache directory.
+    max_bytes : int or None
+        The size limit.
+    """
+    
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+    
+    @staticmethod
+    def key(status, filtname, dispname, solver, version):
+        """
+        The cache key for a given set of calculation inputs.
+        
+        Parameters
+        ----------
+        status : array
+            The shutter status array, as from `~msaviz.parse_msa_status`.
+        filtname, dispname : str
+            The filter and disperser names.
+        solver : str
+            The `~msaviz.MSA` solver.
+        version : str
+            The calibration data version, as from
+            `~msaviz.calibration.Calibration.version`.
+        
+        Returns
+        -------
+        key : str
+            A hexadecimal digest.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(status,
+                                                   dtype=np.uint8).tobytes())
+        for part in (filtname, dispname, solver, version, str(CACHE_FORMAT)):
+            digest.update(b'\0' + part.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+    
+    def get(self, key):
+        """
+        Look up a cache entry.
+        
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        
+        Returns
+        -------
+        arrays : dict or None
+            The cached arrays, keyed by name and memory-mapped
+            (copy-on-write), or None if the entry is missing, incomplete
+            or unreadable.
+        """
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, MANIFEST)) as manifest:
+                names = manifest.read().split()
+            #every array in the manifest, or none (e.g. if the entry is 
+            #evicted by another process while reading)
+            arrays = {name: np.load(os.path.join(path, name + '.npy'), 
+                                    mmap_mode='c')
+                      for name in names}
+            os.utime(path, None) #mark as recently used
+        except (IOError, OSError, ValueError):
+            return None
+        return arrays or None
+    
+    def put(self, key, arrays):
+        """
+        Store a cache entry, then evict old entries if necessary.
+        
+        If another process stores the same entry first, its entry is kept.
+        
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        arrays : dict
+            The arrays to store, keyed by name.
+        """
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmpdir, name + '.npy'), arr)
+            with open(os.path.join(tmpdir, MANIFEST), 'w') as manifest:
+                manifest.write("\n".join(sorted(arrays)))
+            os.rename(tmpdir, self._path(key))
+        except OSError:
+            pass #lost the race to a concurrent writer
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.evict()
+    
+    def _entries(self):
+        """
+        A list of (last use, size, path) for each complete entry.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f))
+                               for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue #removed by another process
+        return entries
+    
+    def size(self):
+        """
+        The total size of all cache entries, in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+    
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used entries until the cache is small enough.
+        
+        Parameters
+        ----------
+        max_bytes : int, optional
+            The size limit to enforce; defaults to ``self.max_bytes``.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+    
+    def clear(self):
+        """
+        Remove all cache entries.
+        """
+        self.evict(0)
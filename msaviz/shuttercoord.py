@@ -22,11 +22,10 @@ class ShutterCoord(object):
     The internal representation is MSA coordinates; to create a ShutterCoord
     object from one of the other systems, use the classmethods defined below.
     Access is through properties.
-    """
     
-    _xy_cache = {}
-    _qij_cache = {}
-    _idx_cache = {}
+    The conversions are simple integer arithmetic, so nothing is cached.
+    Arrays of coordinates are converted all at once.
+    """
     
     def __init__(self, quad=0, col=0, row=0):
         """
@@ -38,8 +37,7 @@ class ShutterCoord(object):
     @property
     def _msa(self):
         """
-        Quick access to the MSA representation tuple, primarily used for 
-        convenience when working with caches.
+        Quick access to the MSA representation tuple.
         
         For internal use only.
         """
@@ -61,7 +59,6 @@ class ShutterCoord(object):
         """
         arrays = self._test_array(*args)
         if any(arrays):
-            self.cache = False
             if not all(arrays):
                 warn("Broadcasting scalar arguments to arrays...", 
                      RuntimeWarning)
@@ -78,7 +75,6 @@ class ShutterCoord(object):
                                 for arg,arr in zip(args, arrays)]
         else:
             out = list(map(int, args)) #just in case we have any int16s thrown in
-            self.cache = True
         
         return out
         
@@ -112,10 +108,9 @@ class ShutterCoord(object):
     
     @staticmethod
     def _to_xy(q, c, r):
-        qcol = [1,1,0,0]
-        qrow = [1,0,1,0]
-        x = (365-c) + 365*qcol[q-1]
-        y = (171-r) + 171*qrow[q-1]
+        #the inverse of _from_xy, which defines the x/y layout
+        x = 365 * ((q - 1) // 2) + (c - 1)
+        y = 171 * ((q - 1) % 2) + (r - 1)
         return (x, y)
     
     @staticmethod
@@ -145,11 +140,7 @@ class ShutterCoord(object):
     
     @property
     def qij(self):
-        if not self.cache:
-            return self._to_qij(*self._msa)
-        if self._msa not in self._qij_cache:
-            self._qij_cache[self._msa] = self._to_qij(*self._msa)
-        return self._qij_cache[self._msa]
+        return self._to_qij(*self._msa)
     
     @qij.setter
     def qij(self, qij):
@@ -158,11 +149,7 @@ class ShutterCoord(object):
     
     @property
     def xy(self):
-        if not self.cache:
-            return self._to_xy(*self._msa)
-        if self._msa not in self._xy_cache:
-            self._xy_cache[self._msa] = self._to_xy(*self._msa)
-        return self._xy_cache[self._msa]
+        return self._to_xy(*self._msa)
     
     @xy.setter
     def xy(self, xy):
@@ -171,15 +158,11 @@ class ShutterCoord(object):
         
     @property
     def idx(self):
-        if not self.cache:
-            return self._to_idx(*self._msa)
-        if self._msa not in self._idx_cache:
-            self._idx_cache[self._msa] = self._to_idx(*self._msa)
-        return self._idx_cache[self._msa]
+        return self._to_idx(*self._msa)
     
     @idx.setter
     def idx(self, idx):
-        idx, = self.standardize_inputs(idx)
+        idx, = self._standardize_inputs(idx)
         self.quad, self.col, self.row = self._from_idx(idx)
     
     #Constructor methods!
@@ -200,4 +183,5 @@ class ShutterCoord(object):
     def from_idx(cls, idx):
         new = cls()
         new.idx = idx
-        return new
\ No newline at end of file
+        return new
+
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements precomputed trace models: compact representations
+of the wavelength solution of every shutter in the MSA, for a single
+filter + disperser combination.
+
+Every shutter's solution depends only on the filter, disperser and shutter
+coordinates, so it can be solved once for the whole MSA. Storing the full
+2x2048 wavelengths for all 249,660 shutters would take ~8 GB per
+combination; instead, each shutter's trace on each detector is split into
+a few equal segments over its illuminated pixels, and each segment is
+stored as a low-order Chebyshev series. The models are built with
+`build_trace_model`, or for every combination at once with:
+
+    $ python -m msaviz.traces
+
+They are memory-mapped at runtime, so that `~msaviz.MSA` (with the
+'traces' solver) only has to gather and evaluate the coefficients for the
+requested shutters.
+
+The number of segments and the Chebyshev order are chosen separately for
+each combination, to reach the requested tolerance against the master
+curve solution. When a model is built, its maximum error is measured
+against the master curve solution over every pixel of every shutter, and
+against the ODEINT solution for a random sample of shutters; both are
+recorded in the model (see `TraceModel.max_error`). The model also
+records the calibration version and a checksum of the source calibration
+files it was built from, and `load_trace_model` ignores it if either has
+changed since. The grating solutions
+are very smooth, and a single segment of order 8-10 reproduces them to
+better than 1e-9 microns; evaluating them is then a single matrix product
+per detector, several times faster than the master curve solver.
+
+The prism dispersion curve is tabulated (and interpolated linearly), so
+its solutions are only piecewise smooth and converge slowly: reaching
+~1e-7 microns takes 32 segments, which makes the model ~1.5 GB and slower
+to evaluate than the master curve solver. By default, models are
+therefore only built for the gratings.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import numpy as np
+import numpy.polynomial.chebyshev as C
+
+from .calibration import (base_dir, load_calibration, write_bundle,
+                          CalibrationBundle)
+
+traces_dir = os.path.join(base_dir, 'data', 'traces')
+trace_files = os.path.join(traces_dir, '{}_{}.traces')
+
+#Bump this whenever the trace model layout or fitting changes.
+TRACE_FORMAT = 2
+
+#The (segments, order) pairs tried by build_trace_model, smallest first.
+TRACE_CANDIDATES = [(1, 8), (1, 10), (1, 12), (1, 16), (2, 12), (4, 12),
+                    (8, 12), (16, 12), (32, 12)]
+
+
+def chebyshev_nodes(order):
+    """
+    The Chebyshev nodes of the first kind on [-1, 1], and the matrix which
+    converts a function's values at those nodes into the coefficients of
+    its interpolating Chebyshev series.
+    
+    Parameters
+    ----------
+    order : int
+        The number of nodes (and coefficients).
+    
+    Returns
+    -------
+    nodes : array
+        The `order` nodes.
+    transform : array
+        An `order` x `order` matrix, such that ``values.dot(transform)``
+        gives the coefficients.
+    """
+    nodes = np.cos(np.pi * (np.arange(order) + 0.5) / order)
+    transform = C.chebvander(nodes, order - 1) * (2. / order)
+    transform[:, 0] /= 2.
+    return nodes, transform
+
+
+def _segment_coordinates(spans, pixels, nseg):
+    """
+    Locate pixels within the segments of each trace.
+    
+    Parameters
+    ----------
+    spans : array
+        An Nx2 array of the first and last pixel of each trace.
+    pixels : array
+        The pixels at which to evaluate (broadcast against N x 1).
+    nseg : int
+        The number of segments per trace.
+    
+    Returns
+    -------
+    segment : array
+        The segment of each pixel.
+    x : array
+        The position of each pixel within its segment, on [-1, 1].
+    """
+    width = np.maximum(spans[:, 1:] - spans[:, :1], 1)
+    t = (pixels - spans[:, :1]) * nseg / width
+    segment = np.clip(np.floor(t), 0, nseg - 1).astype(int)
+    return segment, 2. * (t - segment) - 1.
+
+
+def fit_traces(msa, nrs, coords, nseg, order):
+    """
+    Fit the solutions for a set of shutters on one detector with
+    piecewise Chebyshev series.
+    
+    Each segment is interpolated at its Chebyshev nodes, which gives
+    nearly the best possible polynomial approximation of that order.
+    
+    Parameters
+    ----------
+    msa : `~msaviz.MSA`
+        The MSA whose solutions to fit.
+    nrs : int
+        Which detector: NRS1 (0) or NRS2 (1).
+    coords : array
+        A 3xN array of shutter coordinates.
+    nseg, order : int
+        The number of segments per trace and the number of Chebyshev
+        coefficients per segment.
+    
+    Returns
+    -------
+    coeffs : array
+        An N x `nseg` x `order` array of coefficients.
+    spans : array
+        An Nx2 array of the first and last illuminated pixel.
+    """
+    nodes, transform = chebyshev_nodes(order)
+    spans = msa._trace_spans(nrs, coords)
+    width = np.maximum(spans[:, 1:] - spans[:, :1], 1)
+    local = (np.arange(nseg)[:, None] + (nodes + 1.) / 2.).ravel() / nseg
+    pixels = spans[:, :1] + width * local
+    values = msa._trace_samples(nrs, coords, pixels)
+    coeffs = values.reshape(-1, nseg, order).dot(transform)
+    return coeffs, spans
+
+
+def evaluate_traces(coeffs, spans, npix=2048, out=None):
+    """
+    Evaluate piecewise Chebyshev traces over a detector.
+    
+    Parameters
+    ----------
+    coeffs : array
+        An N x nseg x order array of coefficients, as from `fit_traces`.
+    spans : array
+        An Nx2 array of the first and last illuminated pixel of each
+        trace; pixels outside of this range are set to 0.
+    npix : int, optional
+        The number of detector pixels.
+    out : array, optional
+        A C-contiguous N x `npix` array in which to place the result.
+    
+    Returns
+    -------
+    wavelengths : array
+        An N x `npix` array of wavelengths.
+    """
+    n, nseg, order = coeffs.shape
+    pixels = np.arange(npix, dtype=float)
+    
+    if n and np.all(spans == spans[0]):
+        #Every trace has the same segments (as for the gratings), so each
+        #segment is a single matrix product with the Chebyshev basis.
+        first, last = spans[0]
+        segment, x = _segment_coordinates(spans[:1], pixels, nseg)
+        bounds = np.searchsorted(segment[0], np.arange(nseg + 1))
+        wavelengths = np.empty((n, npix), dtype=float) if out is None else out
+        wavelengths[:, :max(first, 0)] = 0.
+        wavelengths[:, last+1:] = 0.
+        for s in range(nseg):
+            on = slice(max(bounds[s], first), min(bounds[s+1], last + 1))
+            if on.start >= on.stop:
+                continue
+            basis = C.chebvander(x[0, on], order - 1)
+            if on.stop - on.start == npix: #write straight into the output
+                np.dot(coeffs[:, s], basis.T, out=wavelengths)
+            else:
+                wavelengths[:, on] = coeffs[:, s].dot(basis.T)
+        return wavelengths
+    
+    #Clenshaw's recurrence, with each trace's coefficients gathered for
+    #the segment containing each pixel.
+    segment, x = _segment_coordinates(spans, pixels, nseg)
+    rows = np.arange(n)[:, None]
+    b1 = np.zeros((n, npix), dtype=float)
+    b2 = np.zeros((n, npix), dtype=float)
+    for k in range(order - 1, 0, -1):
+        b1, b2 = coeffs[rows, segment, k] + 2. * x * b1 - b2, b1
+    wavelengths = coeffs[rows, segment, 0] + x * b1 - b2
+    
+    outside = (pixels < spans[:, :1]) | (pixels > spans[:, 1:])
+    wavelengths[outside] = 0.
+    if out is not None:
+        out[...] = wavelengths
+        return out
+    return wavelengths
+
+
+def _all_shutters():
+    """
+    A 3xN array of the coordinates of every shutter in the MSA.
+    """
+    return np.indices((4, 365, 171)).reshape(3, -1)
+
+
+def _max_error(msa, nrs, coords, nseg, order):
+    """
+    The maximum difference between the fitted traces and the master
+    curve solution, over all pixels of the given shutters.
+    """
+    coeffs, spans = fit_traces(msa, nrs, coords, nseg, order)
+    return _nanmax(np.abs(evaluate_traces(coeffs, spans) - msa(coords)[nrs]))
+
+
+def _nanmax(error):
+    """
+    The maximum of an array of errors, ignoring NaNs (from shutters
+    without ICs).
+    """
+    return float(np.nanmax(error)) if np.isfinite(error).any() else 0.
+
+
+def build_trace_model(filtname, dispname, outfile=None, tol=1e-8,
+                      nsample=2000, ncheck=200, chunk_size=5000, 
+                      verbose=False):
+    """
+    Solve every shutter in the MSA for a filter + disperser, and store
+    the solutions as a trace model.
+    
+    Parameters
+    ----------
+    filtname, dispname : str
+        The filter and disperser.
+    outfile : str, optional
+        The path of the model file; by default, the standard location
+        used by `load_trace_model`.
+    tol : float, optional
+        The target maximum error (in microns) against the master curve
+        solution. The first entry of `TRACE_CANDIDATES` which reaches it
+        on a random sample of shutters is used; if none do, the last
+        (most accurate) is used.
+    nsample : int, optional
+        The number of shutters in the random sample used to choose the
+        segments and order.
+    ncheck : int, optional
+        The number of those shutters used to measure the error against
+        ODEINT.
+    chunk_size : int, optional
+        The number of shutters fitted at a time.
+    verbose : bool, optional
+        Whether to print the chosen fit and its errors.
+    
+    Returns
+    -------
+    model : `TraceModel`
+        The new trace model.
+    """
+    from .msa import MSA
+    
+    filtname, dispname = filtname.lower(), dispname.lower()
+    if outfile is None:
+        outfile = trace_files.format(filtname, dispname)
+        if not os.path.isdir(traces_dir):
+            os.makedirs(traces_dir)
+    
+    msa = MSA(filtname, dispname, solver="master")
+    coords = _all_shutters()
+    rs = np.random.RandomState(0)
+    sample = coords[:, rs.choice(coords.shape[1], nsample, replace=False)]
+    
+    for nseg, order in TRACE_CANDIDATES:
+        if max(_max_error(msa, n, sample, nseg, order) for n in (0,1)) <= tol:
+            break
+    
+    coeffs = np.empty((coords.shape[1], 2, nseg, order), dtype=float)
+    spans = np.empty((coords.shape[1], 2, 2), dtype=np.int16)
+    max_error = 0.
+    for c in range(0, coords.shape[1], chunk_size):
+        chunk = coords[:, c:c+chunk_size]
+        reference = msa(chunk)
+        for n in (0,1):
+            cn, sn = fit_traces(msa, n, chunk, nseg, order)
+            coeffs[c:c+chunk_size, n] = cn
+            spans[c:c+chunk_size, n] = sn
+            max_error = max(max_error, _nanmax(np.abs(evaluate_traces(
+                                                cn, sn) - reference[n])))
+    
+    check = sample[:, :ncheck]
+    flat = np.ravel_multi_index(tuple(check), (4, 365, 171))
+    odeint_error = _nanmax(np.abs(TraceModel._evaluate(coeffs[flat], 
+                                                       spans[flat]) -
+                          MSA(filtname, dispname, solver="odeint")(check)))
+    
+    shape = (4, 365, 171, 2)
+    calibration = load_calibration()
+    meta = {'filter': filtname, 'disperser': dispname,
+            'calibration': calibration.version,
+            'source': calibration.source_checksum(filtname, dispname),
+            'format': TRACE_FORMAT, 'segments': nseg, 'order': order,
+            'max_error': max_error, 'max_error_odeint': odeint_error}
+    write_bundle(outfile, {'coeffs': coeffs.reshape(shape + (nseg, order)),
+                           'spans': spans.reshape(shape + (2,))}, meta)
+    if verbose:
+        print("{}/{}: {} segment(s) of order {}; max error {:.2g} micron "
+              "(master), {:.2g} micron (ODEINT sample)".format(filtname,
+              dispname, nseg, order, max_error, odeint_error))
+    return TraceModel(outfile)
+
+
+class TraceModel(object):
+    """
+    A memory-mapped trace model for one filter + disperser, as written by
+    `build_trace_model`.
+    
+    Parameters
+    ----------
+    filename : str
+        The path of the model file.
+    
+    Attributes
+    ----------
+    filter, disperser : str
+        The filter and disperser.
+    calibration : str
+        The version of the calibration data used to build the model.
+    source : str
+        The checksum of the source calibration files used to build the
+        model; see `~msaviz.calibration.Calibration.source_checksum`.
+    max_error : float
+        The maximum error (in microns) of the model against the master
+        curve solution, over every pixel of every shutter.
+    max_error_odeint : float
+        The maximum error (in microns) of the model against the ODEINT
+        solution, over a random sample of shutters.
+    """
+    
+    def __init__(self, filename):
+        bundle = CalibrationBundle(filename)
+        meta = bundle.meta
+        if meta.get('format') != TRACE_FORMAT:
+            raise IOError("{} has trace format {}, but format {} is "
+                          "required; please rebuild it.".format(
+                          filename, meta.get('format'), TRACE_FORMAT))
+        self.filename = filename
+        self.filter = meta['filter']
+        self.disperser = meta['disperser']
+        self.calibration = meta['calibration']
+        self.source = meta['source']
+        self.max_error = meta['max_error']
+        self.max_error_odeint = meta['max_error_odeint']
+        self._coeffs = bundle['coeffs']
+        self._spans = bundle['spans']
+    
+    def __call__(self, coords):
+        """
+        Determine the wavelengths for the given shutters, as for
+        `~msaviz.MSA.__call__`.
+        
+        Parameters
+        ----------
+        coords : array
+            A 3xN array of shutter coordinates.
+        
+        Returns
+        -------
+        wavelengths : array
+            A 2xNx2048 array of wavelengths.
+        """
+        q, i, j = coords
+        return self._evaluate(self._coeffs[q, i, j], self._spans[q, i, j])
+    
+    def limits(self, coords):
+        """
+        Determine the wavelengths at the ends of each trace, as for
+        `~msaviz.MSA.limits`, without evaluating the whole trace.
+        
+        Parameters
+        ----------
+        coords : array
+            A 3xN array of shutter coordinates.
+        
+        Returns
+        -------
+        limits : array
+            A 2xNx2 array of the wavelengths at the first and last 
+            illuminated pixels; these are 0 for traces which don't fall
+            on a detector.
+        """
+        q, i, j = coords
+        coeffs = self._coeffs[q, i, j]
+        signs = (-1.) ** np.arange(coeffs.shape[-1])
+        first = coeffs[:, :, 0].dot(signs) #every T_k(-1) = (-1)**k
+        last = coeffs[:, :, -1].sum(axis=-1) #every T_k(1) = 1
+        limits = np.stack((first, last), axis=-1).transpose(1, 0, 2)
+        spans = self._spans[q, i, j]
+        limits[(spans[..., 0] > spans[..., 1]).T] = 0.
+        return limits
+    
+    @staticmethod
+    def _evaluate(coeffs, spans):
+        """
+        Evaluate Nx2 x nseg x order coefficients and Nx2x2 spans.
+        """
+        wavelengths = np.empty((2, coeffs.shape[0], 2048), dtype=float)
+        for n in (0,1):
+            evaluate_traces(coeffs[:, n], spans[:, n], out=wavelengths[n])
+        return wavelengths
+
+
+def load_trace_model(filtname, dispname):
+    """
+    Load the trace model for a filter + disperser, if one has been built
+    from the current calibration data and source files.
+    
+    Parameters
+    ----------
+    filtname, dispname : str
+        The filter and disperser.
+    
+    Returns
+    -------
+    model : `TraceModel` or None
+        The trace model, or None if it is missing or out of date.
+    """
+    filename = trace_files.format(filtname.lower(), dispname.lower())
+    if not os.path.exists(filename):
+        return None
+    try:
+        model = TraceModel(filename)
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    calibration = load_calibration()
+    if (model.calibration != calibration.version or
+        model.source != calibration.source_checksum(filtname, dispname)):
+        return None
+    return model
+
+
+if __name__ == "__main__":
+    for filtname, dispname in load_calibration().combos():
+        if dispname != "prism":
+            build_trace_model(filtname, dispname, verbose=True)
@@ -43,6 +43,9 @@ setup(
     entry_points={
         'gui_scripts': [
             'msaviz=msaviz:run',
-        ]
+        ],
+        'console_scripts': [
+            'msaviz-batch=msaviz.batch:main',
+        ],
     },
 )
\ No newline at end of file
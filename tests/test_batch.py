@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the msaviz-batch tool.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+import shutil
+
+import pytest
+
+from msaviz.batch import (expand_configs, output_names, parse_combos,
+                          run_batch)
+from msaviz.calibration import load_calibration
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(
+                                        os.path.abspath(__file__))),
+                        'msaviz', 'test')
+
+
+def copy_config(name, dest):
+    """
+    Copy one of the test config files to dest, creating its directory.
+    """
+    if not os.path.isdir(os.path.dirname(dest)):
+        os.makedirs(os.path.dirname(dest))
+    shutil.copy(os.path.join(TEST_DIR, name), dest)
+    return dest
+
+
+def test_expand_configs(tmp_path):
+    """
+    Patterns are expanded in order, without duplicates, and patterns which
+    match nothing are kept.
+    """
+    root = str(tmp_path)
+    b, a = [copy_config('single_shutter.csv', os.path.join(root, name))
+            for name in ('b.csv', 'a.csv')]
+    missing = os.path.join(root, 'missing.csv')
+    
+    assert expand_configs([b]) == [b]
+    assert expand_configs([os.path.join(root, '*.csv')]) == [a, b]
+    assert (expand_configs([b, os.path.join(root, '*.csv'), missing]) ==
+            [b, a, missing])
+    assert expand_configs([]) == []
+
+
+def test_parse_combos():
+    """
+    Combinations are lower-cased (filter, disperser) pairs, and "all" is
+    every combination in the calibration data.
+    """
+    assert (parse_combos(['F170LP/G235M', 'clear/prism']) ==
+            [('f170lp', 'g235m'), ('clear', 'prism')])
+    assert parse_combos(['f170lp/g235m', 'all']) == list(
+        load_calibration().combos())
+    for combo in ('f170lp', 'f170lp/', '/g235m', 'a/b/c'):
+        with pytest.raises(ValueError):
+            parse_combos([combo])
+
+
+def test_output_names():
+    """
+    Config files with the same name are told apart by as many parent
+    directories as needed.
+    """
+    join = os.path.join
+    assert output_names([join('a', 'x.csv'), join('a', 'y.csv')]) == ['x',
+                                                                      'y']
+    assert (output_names([join('a', 'x.csv'), join('b', 'x.csv'),
+                          join('b', 'y.csv')]) == ['a_x', 'b_x', 'y'])
+    assert (output_names([join('n1', 'a', 'x.csv'), join('n2', 'a', 'x.csv'),
+                          join('b', 'x.csv')]) ==
+            ['n1_a_x', 'n2_a_x', 'b_x'])
+    #a disambiguated name which clashes with another file's name
+    assert (output_names([join('a', 'x.csv'), join('b', 'x.csv'),
+                          join('c', 'a_x.csv')]) ==
+            ['a_x', 'b_x', 'c_a_x'])
+    with pytest.raises(ValueError):
+        output_names(['x.csv', os.path.join(os.curdir, 'x.csv')])
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_batch(tmp_path, jobs):
+    """
+    Every config file and combination gets its own tables, including config
+    files with the same name, and failures are counted.
+    """
+    root = str(tmp_path)
+    configs = [copy_config('single_shutter.csv',
+                           os.path.join(root, 'a', 'config.csv')),
+               copy_config('msa_config1.csv',
+                           os.path.join(root, 'b', 'config.csv')),
+               os.path.join(root, 'missing.csv')]
+    outdir = os.path.join(root, 'out')
+    os.makedirs(outdir)
+    combos = [('f170lp', 'g235m'), ('f100lp', 'g140m')]
+    stream = io.StringIO()
+    
+    nerrors = run_batch(configs, combos, wavelengths=[1.8], outdir=outdir,
+                        jobs=jobs, stream=stream)
+    assert nerrors == 1
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2 * len(combos) + 2
+    assert sum('FAILED' in line for line in lines) == 1
+    
+    expected = sorted("{}_config_{}_{}_{}.txt".format(d, f, g, kind)
+                      for d in 'ab' for f, g in combos
+                      for kind in ('wave', 'flags'))
+    assert sorted(os.listdir(outdir)) == expected
+    with open(os.path.join(outdir, 'a_config_f170lp_g235m_wave.txt')) as a:
+        with open(os.path.join(outdir, 'b_config_f170lp_g235m_wave.txt')) as b:
+            assert len(a.readlines()) < len(b.readlines())
+    
+    with pytest.raises(ValueError):
+        run_batch(configs[:1] * 2, combos, outdir=outdir, jobs=jobs,
+                  stream=stream)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the calibration data used by `~msaviz.MSA`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import msaviz.msa
+from msaviz.calibration import Calibration, ic_surface, load_calibration
+from msaviz.msa import MSA
+
+GRATINGS = [fg for fg in Calibration().combos() if fg[1] != 'prism']
+
+
+def test_import_without_astropy():
+    """
+    Importing msaviz.msa (e.g. in a worker process) doesn't import astropy,
+    which is only needed to read the source calibration files and to build
+    tables.
+    """
+    code = ("import sys, msaviz.msa; "
+            "print(any(m.split('.')[0] == 'astropy' for m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    assert out.decode().strip() == 'False'
+
+
+def test_msa_exports():
+    """
+    Everything which msaviz.msa exports (including the re-exported
+    QuadrantModel) exists.
+    """
+    for name in msaviz.msa.__all__:
+        assert hasattr(msaviz.msa, name)
+    assert msaviz.msa.QuadrantModel is msaviz.calibration.QuadrantModel
+
+
+@pytest.mark.parametrize('combo', GRATINGS)
+def test_ic_surfaces(combo):
+    """
+    The IC surfaces, and the ICs the MSA looks up in them, match the
+    original evaluation of each quadrant's astropy Polynomial2D model,
+    on all four quadrants.
+    """
+    from astropy.modeling import models
+    
+    quads = Calibration().quadrants(*combo)
+    assert sorted(quads) == [0, 1, 2, 3]
+    surfaces = [Calibration().ic_surfaces(*combo),
+                load_calibration().ic_surfaces(*combo)]
+    msa = MSA(*combo, solver='master')
+    rs = np.random.RandomState(0)
+    i0, j0 = rs.randint(0, 365, 50), rs.randint(0, 171, 50)
+    i, j = np.mgrid[0:365, 0:171]
+    
+    nmodels = 0
+    for q, quad in quads.items():
+        for n, (pix0, params) in enumerate([(quad.pix1, quad.param1),
+                                            (quad.pix2, quad.param2)]):
+            if pix0 is None:
+                for surface in surfaces:
+                    assert np.isnan(surface[q, n]).all()
+                continue
+            model = models.Polynomial2D(2)
+            model.parameters = params
+            expected = model(j, i)
+            
+            np.testing.assert_allclose(ic_surface(params), expected,
+                                       rtol=1e-14, atol=0)
+            for surface in surfaces:
+                np.testing.assert_allclose(surface[q, n], expected,
+                                           rtol=1e-14, atol=0)
+            
+            #one shutter at a time, as originally
+            shutters = [model(y, x) for x, y in zip(i0, j0)]
+            np.testing.assert_allclose(msa._grating_ic(q, n, i0, j0),
+                                       shutters, rtol=1e-14, atol=0)
+            nmodels += 1
+    assert nmodels >= 4
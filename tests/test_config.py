@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for parsing MSA config files, and for `~msaviz.MSAConfig`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import glob
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import msaviz.msa
+from msaviz.msa import (IN_GAP, NEAR_EDGE_PIXELS, NEAR_NRS1_EDGE,
+                        NEAR_NRS2_EDGE, ON_NRS1, ON_NRS2, OPEN, STATUS_FLAGS,
+                        STUCK_OPEN, MSA, Cancelled, DetectorRows, MSAConfig,
+                        ShutterChanges, _row_owners, parse_msa_config,
+                        parse_msa_status)
+from msaviz.shuttercoord import ShutterCoord
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(
+                                        os.path.abspath(__file__))),
+                        'msaviz', 'test')
+CONFIGS = [os.path.join(TEST_DIR, name)
+           for name in ('single_shutter.csv', 'msa_config1.csv')]
+
+
+def read_config(filename):
+    """
+    The comment line and the rows of shutter flags of a config file.
+    """
+    with open(filename) as csvfile:
+        rows = list(csv.reader(csvfile))
+    return rows[0], [list(row) for row in rows[1:]]
+
+
+def changed_config(tmp_path, seed=0, unstick=0):
+    """
+    Write a copy of msa_config1.csv with half of its open shutters closed,
+    some closed shutters opened, and the first `unstick` stuck-open
+    shutters closed, and return its path.
+    """
+    comment, rows = read_config(CONFIGS[1])
+    flags = np.array(rows)
+    opened = np.argwhere(flags == '0')
+    flags[tuple(opened[::2].T)] = '1'
+    closed = np.argwhere(flags == '1')
+    rs = np.random.RandomState(seed)
+    flags[tuple(closed[rs.choice(len(closed), 100, replace=False)].T)] = '0'
+    flags[tuple(np.argwhere(flags == 's')[:unstick].T)] = '1'
+    
+    filename = str(tmp_path.joinpath('changed_{}_{}.csv'.format(seed,
+                                                                unstick)))
+    with open(filename, 'w') as csvfile:
+        writer = csv.writer(csvfile, lineterminator='\n')
+        writer.writerow(comment)
+        writer.writerows(flags.tolist())
+    return filename
+
+
+def parse_shutters(filename, open_only=True):
+    """
+    The original, shutter-by-shutter `parse_msa_config`.
+    """
+    shutters = []
+    with open(filename) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader) #the first row is a comment
+        for x, column in enumerate(reader):
+            for y, shutter in enumerate(column):
+                cc = ShutterCoord.from_xy(x, y)
+                shutters.append((cc.qij, shutter))
+    if open_only:
+        return {qij: (status == 's') for (qij, status) in shutters
+                    if status in '0s'}
+    return dict(shutters)
+
+
+@pytest.mark.parametrize('filename', CONFIGS)
+def test_parse_msa_status(filename):
+    """
+    The status arrays hold the same shutters as the original parser.
+    """
+    reference = parse_shutters(filename, open_only=False)
+    parsed = parse_msa_status(filename)
+    
+    assert parsed.status.shape == (4, 365, 171)
+    assert len(reference) == parsed.status.size
+    flags = STATUS_FLAGS[parsed.status]
+    assert all(flags[qij] == status for qij, status in reference.items())
+    
+    expected_open = sorted(qij for qij, status in reference.items()
+                           if status == '0')
+    expected_stuck = sorted(qij for qij, status in reference.items()
+                            if status == 's')
+    assert list(zip(*parsed.open.tolist())) == expected_open
+    assert list(zip(*parsed.stuck.tolist())) == expected_stuck
+
+
+@pytest.mark.parametrize('filename', CONFIGS)
+@pytest.mark.parametrize('open_only', [True, False])
+def test_parse_msa_config(filename, open_only):
+    """
+    The compatibility wrapper gives the same dictionary as the original
+    parser.
+    """
+    assert (parse_msa_config(filename, open_only) ==
+            parse_shutters(filename, open_only))
+
+
+def searchsorted_flags(msaconf, targets):
+    """
+    The original, shutter-by-shutter `~msaviz.MSAConfig.verify_wavelength`
+    flags. Its near-edge flags were never set, so targets near an edge are
+    flagged as on that detector.
+    """
+    table = msaconf.wavelength_table
+    names = ['NRS{}-{}'.format(d, x) for d in '12' for x in ['min', 'max']]
+    flag = np.zeros((msaconf.nopen, targets.size), dtype=int)
+    fvalues = np.array([-1, 1, 0, 2, -2])
+    for i, row in enumerate(table):
+        bounds = np.array([row[name].value for name in names])
+        flag[i] = fvalues[np.searchsorted(bounds, targets, side='right')]
+    return flag
+
+
+@pytest.mark.parametrize('combo', [('f170lp', 'g235m'), ('f070lp', 'g140h'),
+                                   ('f290lp', 'g395m')])
+def test_wavelength_flags(combo):
+    """
+    The flags match the original per-shutter flags, apart from the
+    near-edge flags, and a detector which a spectrum misses never claims a
+    target.
+    """
+    msaconf = MSAConfig(*combo, config_file=CONFIGS[1], lazy=True)
+    targets, flags = msaconf.wavelength_flags(np.linspace(0.5, 5.5, 301))
+    assert flags.shape == (msaconf.nopen, targets.size)
+    assert np.all((targets >= msaconf.sci_range[0]) &
+                  (targets <= msaconf.sci_range[1]))
+    
+    table = msaconf.wavelength_table
+    limits = np.array([table[name].value for name in table.colnames[3:]]).T
+    finite = np.isfinite(limits).all(axis=1)
+    assert finite.any()
+    expected = searchsorted_flags(msaconf, targets)
+    onlines = flags.copy()
+    onlines[flags == NEAR_NRS1_EDGE] = ON_NRS1
+    onlines[flags == NEAR_NRS2_EDGE] = ON_NRS2
+    assert np.array_equal(onlines[finite], expected[finite])
+    
+    for n, (on, near) in enumerate([(ON_NRS1, NEAR_NRS1_EDGE),
+                                    (ON_NRS2, NEAR_NRS2_EDGE)]):
+        missed = np.isnan(limits[:, 2*n])
+        assert not np.isin(flags[missed], [on, near]).any()
+    
+    flag_table = msaconf.verify_wavelength(targets, verbose=False)
+    assert np.array_equal(np.array([flag_table[name] for name in
+                                    flag_table.colnames[3:]]).T, flags)
+
+
+def test_wavelength_flags_near_edge():
+    """
+    Targets within NEAR_EDGE_PIXELS pixels of the end of a spectrum on
+    either detector are flagged as near that edge.
+    """
+    msaconf = MSAConfig('f170lp', 'g235m', config_file=CONFIGS[1],
+                        lazy=True)
+    table = msaconf.wavelength_table
+    limits = np.array([table[name].value for name in table.colnames[3:]]).T
+    i = np.nonzero(np.isfinite(limits).all(axis=1))[0][0]
+    lo1, hi1, lo2, hi2 = limits[i]
+    assert hi1 < lo2
+    
+    dispersion = msaconf._msa.dispersion
+    inner, outer = NEAR_EDGE_PIXELS - 1, NEAR_EDGE_PIXELS + 1
+    cases = [(lo1 + inner * dispersion(lo1), NEAR_NRS1_EDGE),
+             (lo1 + outer * dispersion(lo1), ON_NRS1),
+             (hi1 - inner * dispersion(hi1), NEAR_NRS1_EDGE),
+             (hi1 - outer * dispersion(hi1), ON_NRS1),
+             ((hi1 + lo2) / 2., IN_GAP),
+             (lo2 + inner * dispersion(lo2), NEAR_NRS2_EDGE),
+             (lo2 + outer * dispersion(lo2), ON_NRS2),
+             (hi2 - inner * dispersion(hi2), NEAR_NRS2_EDGE),
+             (hi2 - outer * dispersion(hi2), ON_NRS2)]
+    targets, flags = msaconf.wavelength_flags([t for t, flag in cases])
+    assert targets.size == len(cases)
+    assert flags[i].tolist() == [flag for t, flag in cases]
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_update_config(tmp_path, compact, lazy):
+    """
+    Updating the config file of an MSAConfig gives the same results as a
+    new MSAConfig of the new config file, and reports the changed
+    shutters.
+    """
+    second = changed_config(tmp_path)
+    msaconf = MSAConfig('f290lp', 'g395m', CONFIGS[1], lazy=lazy,
+                        compact=compact)
+    if lazy: #calculated before the update, so updated incrementally
+        msaconf._calculate_spectra()
+    first = msaconf._status
+    changes = msaconf.update_config(second)
+    fresh = MSAConfig('f290lp', 'g395m', second, compact=compact)
+    
+    lit = [(status == OPEN) | (status == STUCK_OPEN)
+           for status in (first, parse_msa_status(second).status)]
+    assert isinstance(changes, ShutterChanges) and changes is msaconf.changes
+    assert np.array_equal(changes.opened, np.nonzero(lit[1] & ~lit[0]))
+    assert np.array_equal(changes.closed, np.nonzero(lit[0] & ~lit[1]))
+    assert changes.opened.shape[1] > 0 and changes.closed.shape[1] > 0
+    assert fresh.changes.opened.shape[1] == np.count_nonzero(lit[1])
+    assert fresh.changes.closed.shape[1] == 0
+    
+    assert msaconf.nopen == fresh.nopen
+    np.testing.assert_array_equal(msaconf._shutter_limits,
+                                  fresh._shutter_limits)
+    assert (msaconf.wavelength_table.pformat() ==
+            fresh.wavelength_table.pformat())
+    np.testing.assert_array_equal(msaconf._nrs, fresh._nrs)
+    np.testing.assert_array_equal(msaconf._stu, fresh._stu)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_stuck_cache(tmp_path, monkeypatch, compact):
+    """
+    Configs with the same filter, disperser, solver, storage and stuck-open
+    shutters share their stuck-open spectra, and any other config gets its
+    own.
+    """
+    monkeypatch.setattr(MSAConfig, '_stuck_cache', OrderedDict())
+    
+    def stuck(*args, **kwargs):
+        kwargs.setdefault('compact', compact)
+        return MSAConfig(*args, lazy=True, **kwargs)._calculate_spectra()[1]
+    
+    def dense(stu):
+        return stu.toarray() if isinstance(stu, DetectorRows) else stu
+    
+    first = stuck('f290lp', 'g395m', CONFIGS[1])
+    assert len(MSAConfig._stuck_cache) == 1
+    assert stuck('f290lp', 'g395m', changed_config(tmp_path)) is first
+    assert stuck('F290LP', 'G395M', CONFIGS[1]) is first
+    assert len(MSAConfig._stuck_cache) == 1
+    
+    storage = stuck('f290lp', 'g395m', CONFIGS[1], compact=not compact)
+    assert storage is not first
+    assert dense(storage).dtype != dense(first).dtype
+    others = [stuck('f290lp', 'g395h', CONFIGS[1]),
+              stuck('f290lp', 'g395m', changed_config(tmp_path, unstick=3))]
+    assert len(MSAConfig._stuck_cache) == 4
+    for other in others:
+        assert other is not first
+        assert not np.array_equal(dense(other), dense(first))
+    
+    #entries match a calculation from scratch
+    unstuck = others[1]
+    MSAConfig._stuck_cache.clear()
+    expected = stuck('f290lp', 'g395m', changed_config(tmp_path, unstick=3))
+    assert expected is not unstuck
+    np.testing.assert_array_equal(dense(unstuck), dense(expected))
+    
+    #the least recently used entries are dropped
+    monkeypatch.setattr(MSAConfig, 'stuck_cache_size', 1)
+    assert stuck('f290lp', 'g395m', CONFIGS[1]) is not first
+    assert len(MSAConfig._stuck_cache) == 1
+
+
+def test_compact_matches_dense():
+    """
+    Compact spectra are the dense spectra in single precision, and each
+    stored row holds the spectrum of the same shutter as the dense row.
+    """
+    dense = MSAConfig('f290lp', 'g395m', CONFIGS[1])
+    compact = MSAConfig('f290lp', 'g395m', CONFIGS[1], compact=True)
+    
+    for which, stuck in [(0, False), (1, True)]:
+        rows = compact._calculate_spectra()[which]
+        arr = dense._calculate_spectra()[which]
+        assert isinstance(rows, DetectorRows)
+        assert rows.waves.dtype == np.float32 and arr.dtype == float
+        
+        owners = _row_owners(dense._idx[dense._stuck == stuck])
+        assert np.array_equal(rows.rows, np.nonzero(owners >= 0)[0])
+        flat = arr.reshape(2, 2*171, 2048)
+        assert not flat[:, owners < 0].any()
+        
+        coords = np.array(np.unravel_index(owners[rows.rows],
+                                           (4, 365, 171)))
+        expected = MSA('f290lp', 'g395m')(coords)
+        np.testing.assert_array_equal(flat[:, rows.rows], expected)
+        np.testing.assert_allclose(rows.waves, expected, rtol=2**-24,
+                                   atol=0)
+        np.testing.assert_allclose(rows.toarray(), arr, rtol=2**-24, atol=0)
+    
+    np.testing.assert_array_equal(compact._nrs, dense._nrs.astype(np.float32))
+    np.testing.assert_array_equal(compact._stu, dense._stu.astype(np.float32))
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    """
+    Solve everything afresh with the master curve solver, rather than
+    from a trace model or the stuck-open shutter cache.
+    """
+    monkeypatch.setattr(msaviz.msa, 'load_trace_model', lambda f, d: None)
+    monkeypatch.setattr(MSA, '_cache', OrderedDict())
+    monkeypatch.setattr(MSAConfig, 'stuck_cache_size', 0)
+
+
+@pytest.mark.parametrize('executor', [None, 'threads', 'processes'])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_progress(uncached, executor, lazy):
+    """
+    Progress reports count up to the total, and end when all of the work
+    is done.
+    """
+    reports = []
+    msaconf = MSAConfig('f170lp', 'g235m', CONFIGS[1], lazy=lazy,
+                        executor=executor,
+                        progress=lambda *report: reports.append(report))
+    msaconf.raster
+    msaconf._calculate_spectra()
+    
+    done, total = np.array(reports).T
+    assert len(reports) > 2
+    assert np.all(np.diff(done) >= 0) and np.all(np.diff(total) >= 0)
+    assert np.all(done <= total)
+    assert done[-1] == total[-1] > 0
+    #the limits, spectra and raster are each reported
+    nlit = msaconf._idx.size
+    assert total[-1] >= msaconf.nopen + nlit
+    
+    #reports start again after an update
+    del reports[:]
+    msaconf.update_instrument('f290lp', 'g395m')
+    assert reports[-1][0] == reports[-1][1] > 0
+
+
+@pytest.mark.parametrize('executor', [None, 'threads', 'processes'])
+def test_cancel(uncached, executor):
+    """
+    Setting the cancel event abandons the calculation partway through,
+    without leaving shared memory behind.
+    """
+    blocks = set(glob.glob('/dev/shm/psm_*'))
+    cancel = threading.Event()
+    reports = []
+    
+    def progress(done, total):
+        reports.append((done, total))
+        cancel.set()
+    
+    with pytest.raises(Cancelled):
+        MSAConfig('f170lp', 'g235m', CONFIGS[1], executor=executor,
+                  cancel=cancel, progress=progress)
+    assert reports and reports[-1][0] < reports[-1][1]
+    assert set(glob.glob('/dev/shm/psm_*')) == blocks
+    
+    #an event which is set up front cancels before any work
+    del reports[:]
+    with pytest.raises(Cancelled):
+        MSAConfig('f170lp', 'g235m', CONFIGS[1], executor=executor,
+                  cancel=cancel, progress=progress)
+    assert not reports
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `~msaviz.MSA` solvers.
+
+The prism LUT is not distributed with the package, so these tests use a
+small synthetic LUT, with the real prism dispersion curve.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import glob
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import numpy.polynomial.polynomial as P
+import pytest
+
+import msaviz.msa
+from msaviz.calibration import PRISM_FIELDS, Calibration, read_dispersion
+from msaviz.msa import (MSA, MSAConfig, MasterCurve, PolynomialDispersion,
+                        TabulatedDispersion)
+from msaviz.raster import TraceRaster, trace_spans
+from msaviz.traces import evaluate_traces, fit_traces
+
+GRATINGS = [('f070lp', 'g140h'), ('f100lp', 'g140m'), ('f170lp', 'g235h'),
+            ('f170lp', 'g235m'), ('f290lp', 'g395h'), ('f290lp', 'g395m')]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, 'msaviz', 'test', 'msa_config1.csv')
+
+NAN2, NAN4 = [np.nan] * 2, [np.nan] * 4
+
+#(quadrant, i, j): (PIX491, WAV491, PAR491, PIX492, WAV492, PAR492)
+PRISM_SHUTTERS = {
+    (0, 10, 20): ([200.3, 700.1], 0.6, [1e-3, -1e-6, 0., 0.],
+                  NAN2, np.nan, NAN4),
+    #starts before the detector, at the red end of the ICs
+    (0, 11, 20): ([-40.2, 2100.3], 1.2, [1e-3, -1e-6, 0., 0.],
+                  NAN2, np.nan, NAN4),
+    (1, 50, 60): ([53.12, 1500.7], 0.9, [-2e-3, 1e-6, 1e-10, 0.],
+                  [-12.6, 600.2], 3.1, [1e-3, 0., 0., 0.]),
+    #misses both detectors
+    (2, 100, 30): ([-300.5, -20.2], 0.8, [0., 0., 0., 0.],
+                   [2080.4, 2400.9], 2.0, [0., 0., 0., 0.]),
+}
+
+
+@pytest.fixture
+def prism_lut(monkeypatch):
+    """
+    Replace the prism LUT with a synthetic one.
+    """
+    dtype = [(name.format(n), float, shape) for n in (1, 2)
+                                           for name, shape in PRISM_FIELDS]
+    lut = np.empty((4, 365, 171), dtype=dtype)
+    for name in lut.dtype.names:
+        lut[name] = np.nan
+    for coords, record in PRISM_SHUTTERS.items():
+        lut[coords] = record
+    monkeypatch.setattr(Calibration, 'prism_lut', lambda self: lut)
+    return lut
+
+
+@pytest.fixture
+def prism_coords(prism_lut):
+    return np.array(sorted(PRISM_SHUTTERS)).T
+
+
+def test_prism_master_negative_start(prism_coords):
+    """
+    The master solver agrees with ODEINT for shutters whose spectra start
+    before the first pixel of the detector.
+    """
+    reference = MSA('clear', 'prism', solver='odeint')(prism_coords)
+    master = MSA('clear', 'prism', solver='master')(prism_coords)
+    
+    assert np.array_equal(np.isnan(master), np.isnan(reference))
+    assert np.array_equal(master == 0, reference == 0)
+    np.testing.assert_allclose(master, reference, rtol=0, atol=1e-5)
+
+
+def dispersion_grid(wavelengths):
+    """
+    Wavelengths over (and a little beyond) a tabulated dispersion curve,
+    including the tabulated points themselves.
+    """
+    lo, hi = wavelengths[0], wavelengths[-1]
+    pad = 0.05 * (hi - lo)
+    return np.concatenate((np.linspace(lo - pad, hi + pad, 5001),
+                           wavelengths))
+
+
+@pytest.mark.parametrize('combo', GRATINGS)
+def test_polynomial_dispersion(combo):
+    """
+    The grating dispersion curves, and their derivatives, match the
+    original fitted astropy Polynomial1D models.
+    """
+    from astropy.modeling import fitting, models
+    
+    dwav, dlds = read_dispersion(combo[1])
+    model = fitting.LinearLSQFitter()(models.Polynomial1D(6), dwav, dlds)
+    grid = dispersion_grid(dwav)
+    expected = model(grid)
+    
+    for dispersion in (PolynomialDispersion(model.parameters),
+                       MSA(*combo, solver='master').dispersion):
+        assert isinstance(dispersion, PolynomialDispersion)
+        np.testing.assert_allclose(dispersion(grid), expected, rtol=1e-13,
+                                   atol=0)
+        assert np.ndim(dispersion(grid[0])) == 0
+    
+    dispersion = PolynomialDispersion(model.parameters)
+    assert np.array_equal(dispersion(grid), expected)
+    slope = P.polyval(grid, P.polyder(model.parameters))
+    np.testing.assert_allclose(dispersion.derivative(grid), slope,
+                               rtol=1e-12, atol=1e-12 * np.abs(slope).max())
+    h = 1e-5
+    np.testing.assert_allclose((model(grid + h) - model(grid - h)) / (2 * h),
+                               slope, rtol=0, atol=1e-6 * np.abs(slope).max())
+
+
+def test_tabulated_dispersion(prism_lut):
+    """
+    The prism dispersion curve matches the original linear interpolation
+    (and extrapolation) of the tabulated curve with scipy's interp1d.
+    """
+    from scipy.interpolate import interp1d
+    
+    dwav, dlds = read_dispersion('prism')
+    expected = interp1d(dwav, dlds, fill_value='extrapolate')
+    grid = dispersion_grid(dwav)
+    
+    for dispersion in (TabulatedDispersion(dwav, dlds),
+                       MSA('clear', 'prism', solver='master').dispersion):
+        assert isinstance(dispersion, TabulatedDispersion)
+        np.testing.assert_allclose(dispersion(grid), expected(grid),
+                                   rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(dispersion(dwav), dlds, rtol=1e-12,
+                                   atol=0)
+        assert np.ndim(dispersion(grid[0])) == 0
+
+
+def test_master_curve_out_of_range():
+    """
+    Looking up pixels beyond the tabulated master curve is an error.
+    """
+    master = MasterCurve(PolynomialDispersion([1e-3, 1e-5]), 1., 1.1,
+                         margin=(10, 20))
+    assert master.origin == -10
+    master.track(master.invert([1., 1.1]) + [-10, 12], npix=8)
+    with pytest.raises(ValueError):
+        master.track([master.origin - 1.])
+    with pytest.raises(ValueError):
+        master(master.origin + master.curve.shape[1] + 1.)
+    assert np.isnan(master(np.nan))
+
+
+def test_prism_limits_off_detector(prism_coords):
+    """
+    The limits of prism spectra which run off the detector are those of
+    the full solution.
+    """
+    reference = MSA('clear', 'prism', solver='odeint')(prism_coords)
+    reference[reference == 0] = np.nan
+    expected = np.stack((np.fmin.reduce(reference, axis=2),
+                         np.fmax.reduce(reference, axis=2)), axis=-1)
+    
+    limits = MSA('clear', 'prism', solver='master').limits(prism_coords)
+    np.testing.assert_allclose(limits, expected, rtol=0, atol=1e-5)
+
+
+def test_prism_spans_off_detector(prism_coords):
+    """
+    The preview and trace fits of prism spectra which run off the detector
+    illuminate the same pixels as the full solution.
+    """
+    msa = MSA('clear', 'prism', solver='odeint')
+    reference = msa(prism_coords)
+    
+    preview = msa.preview(prism_coords)
+    assert np.array_equal(preview == 0, reference == 0)
+    
+    for n in (0, 1):
+        coeffs, spans = fit_traces(msa, n, prism_coords, 16, 12)
+        traces = evaluate_traces(coeffs, spans)
+        assert np.array_equal(traces == 0, reference[n] == 0)
+        np.testing.assert_allclose(traces, reference[n], rtol=0, atol=1e-4)
+
+
+def check_pixel_round_trip(msa, coords, step=13, atol=1e-9):
+    """
+    Check that `~msaviz.MSA.pixels` finds the pixels of the wavelengths of
+    a solution, for each shutter on each detector, including the first and
+    last pixel of the spectrum.
+    """
+    waves = msa(coords)
+    nchecked = 0
+    for n in (0, 1):
+        for s in range(coords.shape[1]):
+            lit, = (waves[n, s] > 0).nonzero() #False for NaN
+            if lit.size == 0:
+                continue
+            pix = np.union1d(lit[::step], lit[[0, -1]])
+            found = msa.pixels(coords[:, s], waves[n, s, pix])[n, 0]
+            np.testing.assert_allclose(found, pix, rtol=0, atol=atol)
+            nchecked += 1
+    assert nchecked > 0
+
+
+def test_grating_pixels_round_trip():
+    """
+    Pixels map to wavelengths and back, for a grating, over every
+    quadrant.
+    """
+    rs = np.random.RandomState(0)
+    coords = np.array([np.repeat(np.arange(4), 3), rs.randint(0, 365, 12),
+                       rs.randint(0, 171, 12)])
+    check_pixel_round_trip(MSA('f170lp', 'g235m', solver='master'), coords)
+
+
+def test_prism_pixels_round_trip(prism_coords):
+    """
+    Pixels map to wavelengths and back, for the prism, whose pixels are
+    found by Newton's method.
+    """
+    check_pixel_round_trip(MSA('clear', 'prism', solver='master'),
+                           prism_coords, step=7)
+
+
+def check_raster_round_trip(raster, atol):
+    """
+    Check that `~msaviz.raster.TraceRaster.pixels` finds fractional pixels
+    along each trace from their wavelengths.
+    """
+    assert len(raster) > 0
+    traces = np.repeat(np.arange(len(raster)), 25)
+    frac = np.tile(np.linspace(0., 1., 25), len(raster))
+    pixels = raster.start[traces] + frac * (raster.stop[traces] - 1 -
+                                            raster.start[traces])
+    wavelengths = raster.wavelengths(traces, pixels)
+    assert np.isfinite(wavelengths).all()
+    found = raster.pixels(traces, wavelengths, chunk_size=50)
+    np.testing.assert_allclose(found, pixels, rtol=0, atol=atol)
+    
+    #wavelengths beyond the ends of the traces aren't found
+    ends = raster.wavelengths(np.arange(len(raster)), raster.stop - 1)
+    beyond = raster.pixels(np.arange(len(raster)), ends + 1e-3 * 
+                           np.sign(ends - wavelengths[::25]))
+    assert np.isnan(beyond).all()
+
+
+def test_raster_pixels_grating():
+    """
+    Raster pixels map to wavelengths and back, for a grating config.
+    """
+    check_raster_round_trip(MSAConfig('f170lp', 'g235m', CONFIG,
+                                      lazy=True).raster, atol=1e-4)
+
+
+def test_raster_pixels_prism(prism_coords):
+    """
+    Raster pixels map to wavelengths and back, for the prism.
+    """
+    msa = MSA('clear', 'prism', solver='master')
+    spans = trace_spans(msa, prism_coords, msa.sci_range)
+    check_raster_round_trip(TraceRaster(prism_coords, spans, msa=msa),
+                            atol=1e-4)
+
+
+def shared_blocks():
+    """
+    The POSIX shared memory blocks created by multiprocessing.
+    """
+    return set(glob.glob('/dev/shm/psm_*'))
+
+
+@pytest.mark.parametrize('solver', ['master', 'odeint'])
+def test_executors_match(solver):
+    """
+    The wavelengths are the same, bit for bit, solved serially, over
+    worker threads or over worker processes, and no shared memory is left
+    behind.
+    """
+    rs = np.random.RandomState(0)
+    coords = np.array([np.repeat(np.arange(4), 10), rs.randint(0, 365, 40),
+                       rs.randint(0, 171, 40)])
+    msa = MSA('f290lp', 'g395m', solver=solver)
+    blocks = shared_blocks()
+    
+    serial = msa(coords)
+    assert (serial > 0).any()
+    for executor in ('threads', 'processes'):
+        assert np.array_equal(msa(coords, executor=executor), serial,
+                              equal_nan=True)
+    assert shared_blocks() == blocks
+
+
+def test_config_executors_match(monkeypatch):
+    """
+    An MSAConfig gives the same results, bit for bit, whichever executor
+    it uses.
+    """
+    #solve everything afresh, rather than from a trace model or the
+    #stuck-open shutter cache
+    monkeypatch.setattr(msaviz.msa, 'load_trace_model', lambda f, d: None)
+    monkeypatch.setattr(MSA, '_cache', OrderedDict())
+    monkeypatch.setattr(MSAConfig, 'stuck_cache_size', 0)
+    blocks = shared_blocks()
+    
+    results = []
+    for executor in (None, 'threads', 'processes'):
+        msaconf = MSAConfig('f170lp', 'g235m', CONFIG, executor=executor)
+        assert msaconf._msa.solver == 'master'
+        raster = msaconf.raster
+        results.append([msaconf._shutter_limits, msaconf._nrs, msaconf._stu,
+                        raster.start, raster.stop, raster.shutter])
+    for result in results[1:]:
+        for a, b in zip(result, results[0]):
+            assert np.array_equal(a, b, equal_nan=True)
+    assert shared_blocks() == blocks
+
+
+def test_processes_leave_no_shared_memory():
+    """
+    A process which solves over worker processes exits without leaking
+    shared memory (which the resource tracker would warn about).
+    """
+    code = ("import numpy as np; from msaviz.msa import MSA; "
+            "coords = np.array([[0, 1, 2, 3], [10, 20, 30, 40], "
+            "[50, 60, 70, 80]]); "
+            "MSA('f290lp', 'g395m', solver='master')(coords, "
+            "executor='processes')")
+    blocks = shared_blocks()
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT,
+                            stderr=subprocess.PIPE)
+    err = proc.communicate()[1].decode()
+    assert proc.returncode == 0, err
+    assert 'leaked' not in err and 'shared_memory' not in err
+    assert shared_blocks() == blocks
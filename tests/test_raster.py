@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for `~msaviz.raster.TraceRaster`, against brute-force searches over
+small synthetic rasters.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+
+from msaviz.raster import NPIX, NROWS, TraceRaster
+
+
+def synthetic_raster(n=80, seed=0):
+    """
+    A raster of `n` shutters whose traces fall on only a few detector rows,
+    so that many share a row, with some empty and some abutting spans.
+    """
+    rs = np.random.RandomState(seed)
+    q = rs.randint(0, 4, n)
+    r = rs.choice([3, 40, 41], n)
+    c = rs.permutation(365)[:n] #no two shutters are the same
+    start = rs.randint(-50, NPIX, (2, n))
+    width = rs.choice([0, 1, 10, 300, 1500], (2, n))
+    stop = np.clip(start + width, 0, NPIX)
+    spans = np.stack((np.clip(start, 0, NPIX), stop), axis=-1)
+    
+    #the next five traces on NRS1 start where the first five stop
+    q[5:10], r[5:10] = (q[:5] + 2) % 4, r[:5]
+    spans[0, 5:10, 0] = spans[0, :5, 1]
+    spans[0, 5:10, 1] = np.minimum(spans[0, :5, 1] + 100, NPIX)
+    spans[spans[..., 0] == spans[..., 1]] = 0 #as from trace_spans
+    return TraceRaster(np.array([q, c, r]), spans)
+
+
+def brute_traces(raster):
+    """
+    Every trace of a raster, as a list of (detector, row, start, stop,
+    shutter), found shutter by shutter.
+    """
+    q, c, r = raster.coords
+    row = (1 - q % 2) * 171 + 170 - r
+    return [(d, row[s], raster.start[t], raster.stop[t], s)
+            for t, (d, s) in enumerate(zip(raster.detector,
+                                           raster.shutter))]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_traces(seed):
+    """
+    The raster holds exactly the non-empty spans, sorted by detector, row
+    and first pixel.
+    """
+    raster = synthetic_raster(seed=seed)
+    q, c, r = raster.coords
+    traces = brute_traces(raster)
+    assert len(traces) == len(raster) > 0
+    assert traces == sorted(traces, key=lambda t: t[:3])
+    assert all(start < stop for d, row, start, stop, s in traces)
+    for d, row, start, stop, s in traces:
+        assert raster.span(q[s], c[s], r[s])[d] == (start, stop)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_multiplicity(seed):
+    """
+    The counts on each pixel match adding up the traces one at a time.
+    """
+    raster = synthetic_raster(seed=seed)
+    expected = np.zeros((2, NROWS, NPIX), dtype=int)
+    for d, row, start, stop, s in brute_traces(raster):
+        expected[d, row, start:stop] += 1
+    assert expected.max() > 1 #some traces overlap
+    counts = raster.multiplicity()
+    assert counts.shape == (2, 2, 171, NPIX)
+    np.testing.assert_array_equal(counts.reshape(2, NROWS, NPIX), expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_overlaps(seed):
+    """
+    The overlapping pairs match comparing every pair of traces.
+    """
+    raster = synthetic_raster(seed=seed)
+    traces = brute_traces(raster)
+    expected = {}
+    for i, a in enumerate(traces):
+        for j, b in enumerate(traces[i+1:], i + 1):
+            start, stop = max(a[2], b[2]), min(a[3], b[3])
+            if a[:2] == b[:2] and start < stop:
+                expected[i, j] = (start, stop)
+    assert expected
+    
+    first, second, start, stop = raster.overlaps()
+    found = {(i, j): (a, b) for i, j, a, b in zip(first, second, start,
+                                                  stop)}
+    assert len(found) == first.size
+    assert found == expected
+    
+    #traces which only touch don't overlap
+    touching = [(i, j) for i, a in enumerate(traces)
+                       for j, b in enumerate(traces)
+                           if a[:2] == b[:2] and a[3] == b[2]]
+    assert touching
+    assert not set(touching) & set(found)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_find(seed):
+    """
+    The traces found on each pixel match checking every trace, one pixel
+    at a time and all at once.
+    """
+    raster = synthetic_raster(seed=seed)
+    traces = brute_traces(raster)
+    rows = sorted(set(t[1] for t in traces)) + [0, NROWS - 1]
+    points = [(d, row, p) for d in (0, 1) for row in rows
+                          for p in list(range(0, NPIX, 7)) + [NPIX - 1]]
+    
+    expected = []
+    for k, (d, row, p) in enumerate(points):
+        covering = [t for t, (td, trow, start, stop, s) in enumerate(traces)
+                        if (td, trow) == (d, row) and start <= p < stop]
+        assert raster.find(d, row, p).tolist() == covering
+        expected.extend((k, t) for t in covering)
+    assert expected
+    
+    point, found = raster.find_all(*np.array(points).T)
+    assert sorted(zip(point.tolist(), found.tolist())) == sorted(expected)
+
+
+def test_empty_raster():
+    """
+    A raster without any traces, whether it has no shutters or none of
+    its shutters' spectra fall on the detectors.
+    """
+    coords = np.array([[0, 1], [5, 6], [7, 8]])
+    for raster in (TraceRaster(np.zeros((3, 0), dtype=int),
+                               np.zeros((2, 0, 2), dtype=int)),
+                   TraceRaster(coords, np.zeros((2, 2, 2), dtype=int))):
+        assert len(raster) == 0
+        assert not raster.multiplicity().any()
+        for found in raster.overlaps():
+            assert found.size == 0
+        assert raster.find(0, 10, 100).size == 0
+        for found in raster.find_all([0, 1], [10, 20], [100, 200]):
+            assert found.size == 0
+        assert raster.intervals(1, 10)[0].size == 0
+    assert TraceRaster(coords, np.zeros((2, 2, 2), dtype=int)).span(
+        0, 5, 7) == [None, None]
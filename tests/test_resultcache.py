@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the on-disk `~msaviz.resultcache.ResultCache`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import numpy as np
+
+from msaviz.resultcache import MANIFEST, ResultCache
+
+STATUS = np.zeros((4, 365, 171), dtype=np.uint8)
+INPUTS = (STATUS, 'f170lp', 'g235m', 'master', 'source')
+
+
+def make_arrays(seed=0):
+    rs = np.random.RandomState(seed)
+    return {'rows': np.arange(10), 'waves': rs.uniform(1., 2., (2, 10, 64))}
+
+
+def test_round_trip(tmp_path):
+    """
+    Stored arrays are read back unchanged.
+    """
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.key(*INPUTS)
+    assert cache.get(key) is None
+    
+    arrays = make_arrays()
+    cache.put(key, arrays)
+    cached = cache.get(key)
+    assert sorted(cached) == sorted(arrays)
+    for name in arrays:
+        assert np.array_equal(cached[name], arrays[name])
+    
+    #a second cache on the same directory sees the entry
+    assert ResultCache(str(tmp_path)).get(key) is not None
+
+
+def test_key_inputs():
+    """
+    The key changes with every input of the calculation.
+    """
+    key = ResultCache.key(*INPUTS)
+    assert key == ResultCache.key(*INPUTS)
+    
+    status = STATUS.copy()
+    status[1, 20, 30] = 1
+    keys = {key, ResultCache.key(status, *INPUTS[1:])}
+    for i, value in [(1, 'f290lp'), (2, 'g395m'), (3, 'odeint'),
+                     (4, 'abc123')]:
+        inputs = list(INPUTS)
+        inputs[i] = value
+        keys.add(ResultCache.key(*inputs))
+    assert len(keys) == 6
+
+
+def test_partial_entry(tmp_path):
+    """
+    An entry which is missing any of its arrays (e.g. while another
+    process evicts it) is a miss.
+    """
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.key(*INPUTS)
+    cache.put(key, make_arrays())
+    
+    os.remove(os.path.join(str(tmp_path), key, 'waves.npy'))
+    assert cache.get(key) is None
+    
+    key = ResultCache.key(STATUS, 'f290lp', 'g395m', 'master', 'source')
+    cache.put(key, make_arrays())
+    os.remove(os.path.join(str(tmp_path), key, MANIFEST))
+    assert cache.get(key) is None
+
+
+def test_lru_eviction(tmp_path):
+    """
+    The least recently used entries are evicted to respect the size limit.
+    """
+    cache = ResultCache(str(tmp_path), max_bytes=None)
+    keys = [ResultCache.key(STATUS, 'f170lp', 'g235m', solver, 'source')
+            for solver in ('traces', 'master', 'odeint')]
+    for t, key in enumerate(keys):
+        cache.put(key, make_arrays(t))
+        path = os.path.join(str(tmp_path), key)
+        os.utime(path, (1000. + t, 1000. + t))
+    entry = cache.size() // 3
+    
+    #using the oldest entry makes the second one the least recent
+    assert cache.get(keys[0]) is not None
+    cache.evict(2 * entry)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.size() == 2 * entry
+    
+    #put enforces the cache's own limit
+    cache.max_bytes = entry
+    cache.put(keys[1], make_arrays(1))
+    assert cache.get(keys[1]) is not None
+    assert cache.get(keys[0]) is None and cache.get(keys[2]) is None
+    
+    cache.clear()
+    assert cache.size() == 0
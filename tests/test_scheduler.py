@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the GUI job `~msaviz._gui.scheduler.Scheduler`.
+
+The scheduler itself only needs threading, but the GUI package imports
+Kivy, so the module is loaded directly from its file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import importlib.util
+import os
+import threading
+
+from msaviz.msa import Cancelled
+
+SCHEDULER = os.path.join(os.path.dirname(os.path.dirname(
+                                         os.path.abspath(__file__))),
+                         'msaviz', '_gui', 'scheduler.py')
+TIMEOUT = 10.
+
+
+def load_scheduler():
+    """
+    Import the scheduler module without the rest of the GUI package.
+    """
+    spec = importlib.util.spec_from_file_location('msaviz._gui.scheduler',
+                                                  SCHEDULER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Scheduler
+
+
+Scheduler = load_scheduler()
+
+
+class Jobs(object):
+    """
+    Jobs which record their runs, and deliver their results only if they
+    are still current, as the GUI does.
+    """
+    
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.started = []
+        self.delivered = []
+        self.cancelled = []
+        self.finished = threading.Event()
+    
+    def job(self, generation, cancel, name, release=None):
+        self.started.append(name)
+        if release is not None:
+            assert release.wait(TIMEOUT)
+        if cancel.is_set():
+            self.cancelled.append(name)
+            raise Cancelled()
+        if self.scheduler.current(generation):
+            self.delivered.append(name)
+        self.finished.set()
+    
+    def submit(self, name, release=None):
+        return self.scheduler.submit(self.job, name, release)
+
+
+def wait_for(condition):
+    """
+    Wait (up to TIMEOUT seconds) for a condition to hold.
+    """
+    event = threading.Event()
+    for _ in range(int(TIMEOUT / 0.01)):
+        if condition():
+            return
+        event.wait(0.01)
+    raise AssertionError("timed out")
+
+
+def test_latest_job_delivered():
+    """
+    A job which is superseded while it runs is cancelled, a job which is
+    superseded before it runs never runs, and only the latest job's result
+    is delivered.
+    """
+    scheduler = Scheduler()
+    jobs = Jobs(scheduler)
+    release = threading.Event()
+    
+    assert jobs.submit('first', release) == 1
+    wait_for(lambda: jobs.started == ['first'])
+    assert jobs.submit('second') == 2
+    assert jobs.submit('third') == 3
+    assert not scheduler.current(1) and scheduler.current(3)
+    release.set()
+    
+    assert jobs.finished.wait(TIMEOUT)
+    assert jobs.started == ['first', 'third']
+    assert jobs.cancelled == ['first']
+    assert jobs.delivered == ['third']
+
+
+def test_stale_result_dropped():
+    """
+    A job which finishes without checking its cancel event doesn't deliver
+    its result once it has been superseded.
+    """
+    scheduler = Scheduler()
+    delivered = []
+    release = threading.Event()
+    started = threading.Event()
+    
+    def job(generation, cancel, name):
+        started.set()
+        assert release.wait(TIMEOUT)
+        if scheduler.current(generation):
+            delivered.append(name)
+    
+    first = scheduler.submit(job, 'first')
+    assert started.wait(TIMEOUT)
+    second = scheduler.submit(job, 'second')
+    assert second == first + 1 == scheduler.generation
+    release.set()
+    wait_for(lambda: delivered)
+    assert delivered == ['second']
+
+
+def test_worker_survives_errors():
+    """
+    The worker keeps running jobs after one is cancelled or fails.
+    """
+    scheduler = Scheduler()
+    
+    def fail(generation, cancel, error, ran):
+        ran.set()
+        raise error
+    
+    for error in (Cancelled(), ValueError("raised by this test")):
+        ran = threading.Event()
+        scheduler.submit(fail, error, ran)
+        assert ran.wait(TIMEOUT)
+    
+    done = threading.Event()
+    scheduler.submit(lambda generation, cancel: done.set())
+    assert done.wait(TIMEOUT)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the `~msaviz.shuttercoord.ShutterCoord` conversions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import os
+
+import numpy as np
+
+from msaviz.shuttercoord import ShutterCoord
+
+SINGLE_SHUTTER = os.path.join(os.path.dirname(os.path.dirname(
+                                              os.path.abspath(__file__))),
+                              'msaviz', 'test', 'single_shutter.csv')
+
+
+def all_shutters():
+    """
+    The MSA coordinates of every shutter, as three 1-based arrays.
+    """
+    return tuple(np.indices((4, 365, 171)).reshape(3, -1) + 1)
+
+
+def test_xy_round_trip():
+    """
+    _to_xy and _from_xy are inverses over the whole MSA.
+    """
+    qcr = all_shutters()
+    x, y = ShutterCoord._to_xy(*qcr)
+    assert x.min() == 0 and x.max() == 729
+    assert y.min() == 0 and y.max() == 341
+    assert np.unique(x * 342 + y).size == x.size
+    for a, b in zip(ShutterCoord._from_xy(x, y), qcr):
+        assert np.array_equal(a, b)
+    
+    x, y = np.indices((730, 342)).reshape(2, -1)
+    for a, b in zip(ShutterCoord._to_xy(*ShutterCoord._from_xy(x, y)),
+                    (x, y)):
+        assert np.array_equal(a, b)
+
+
+def test_xy_matches_config_file():
+    """
+    The x/y coordinates of a shutter are its row and column in an MSA
+    config file.
+    """
+    with open(SINGLE_SHUTTER) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader) #the first row is a comment
+        rows = list(reader)
+    
+    assert ShutterCoord.from_qij(0, 34, 29).xy == (34, 29)
+    assert rows[34][29] == '0'
+    assert ShutterCoord.from_xy(34, 29).qij == (0, 34, 29)
+
+
+def test_idx_round_trip():
+    """
+    The flat index conversions, and the idx setter, are inverses of each
+    other, for scalars and arrays.
+    """
+    qcr = all_shutters()
+    idx = ShutterCoord._to_idx(*qcr)
+    assert np.array_equal(idx, np.arange(4 * 365 * 171))
+    for a, b in zip(ShutterCoord._from_idx(idx), qcr):
+        assert np.array_equal(a, b)
+    
+    coord = ShutterCoord.from_idx(5843)
+    assert coord.qij == (0, 34, 29)
+    assert coord.idx == 5843
+    
+    coords = ShutterCoord.from_idx(np.array([0, 5843, 249659]))
+    assert np.array_equal(coords.quad, [1, 1, 4])
+    assert np.array_equal(coords.idx, [0, 5843, 249659])
+    
+    coord.idx = 249659
+    assert coord.qij == (3, 364, 170)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the precomputed `~msaviz.traces.TraceModel` and the 'traces'
+solver.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+
+import msaviz.traces
+from msaviz.calibration import Calibration, load_calibration
+from msaviz.msa import MSA
+from msaviz.traces import build_trace_model, load_trace_model
+
+TOL = 1e-8
+
+
+@pytest.fixture(scope='module')
+def trace_model(tmp_path_factory):
+    """
+    A trace model for f170lp/g235m, built in a temporary directory which
+    `load_trace_model` looks in.
+    """
+    files = str(tmp_path_factory.mktemp('traces').joinpath('{}_{}.traces'))
+    patch = pytest.MonkeyPatch()
+    patch.setattr(msaviz.traces, 'trace_files', files)
+    model = build_trace_model('f170lp', 'g235m', outfile=files.format(
+                              'f170lp', 'g235m'), tol=TOL)
+    yield model
+    patch.undo()
+
+
+def test_traces_match_master(trace_model):
+    """
+    The 'traces' solver agrees with the master curve solver to within the
+    tolerance the model was built to.
+    """
+    assert trace_model.max_error <= TOL
+    rs = np.random.RandomState(1)
+    coords = np.indices((4, 365, 171)).reshape(3, -1)
+    coords = coords[:, rs.choice(coords.shape[1], 3000, replace=False)]
+    
+    traces = MSA('f170lp', 'g235m', solver='traces')
+    master = MSA('f170lp', 'g235m', solver='master')
+    assert traces.solver == 'traces'
+    reference = master(coords)
+    wavelengths = traces(coords)
+    assert np.array_equal(np.isnan(wavelengths), np.isnan(reference))
+    assert np.array_equal(wavelengths == 0, reference == 0)
+    np.testing.assert_allclose(wavelengths, reference, rtol=0, atol=TOL)
+    np.testing.assert_allclose(traces.limits(coords), master.limits(coords),
+                               rtol=0, atol=TOL)
+
+
+def test_stale_trace_model(trace_model, monkeypatch):
+    """
+    A trace model is only loaded if it was built from the current
+    calibration version and source files.
+    """
+    calibration = load_calibration()
+    assert trace_model.calibration == calibration.version
+    assert trace_model.source == calibration.source_checksum('f170lp',
+                                                             'g235m')
+    assert load_trace_model('F170LP', 'G235M') is not None
+    assert load_trace_model('f290lp', 'g395m') is None
+    
+    monkeypatch.setattr(Calibration, 'source_checksum',
+                        lambda self, filtname, dispname: 'changed')
+    assert load_trace_model('f170lp', 'g235m') is None
+    assert MSA('f170lp', 'g235m').solver == 'master'
+    with pytest.raises(ValueError):
+        MSA('f170lp', 'g235m', solver='traces')
+    
+    monkeypatch.undo()
+    monkeypatch.setattr(Calibration, 'version', 'changed')
+    assert load_trace_model('f170lp', 'g235m') is None
+
+
+def test_source_checksum():
+    """
+    The source checksum depends on the disperser's own source files.
+    """
+    calibration = Calibration()
+    checksum = calibration.source_checksum('f170lp', 'g235m')
+    assert checksum == calibration.source_checksum('F170LP', 'G235M')
+    assert checksum != calibration.source_checksum('f170lp', 'g235h')